@@ -0,0 +1,56 @@
+# benchmarks/bench_crypto_pool.py
+# Usage: python -m benchmarks.bench_crypto_pool [n]
+import os
+import sys
+import time
+from eth_account import Account
+
+from utils.crypto_pool import CryptoPool, CRYPTO_WORKERS, _sign_batch, _encrypt_batch, _decrypt_batch
+from utils.encryption_utils import generate_random_password
+
+N = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("BENCH_N", "10000"))
+
+def timed(label, fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    print(f"[BENCH] {label:<28} {elapsed:8.3f}s ({N / elapsed:,.0f}/s)")
+    return result, elapsed
+
+def main():
+    sender = Account.create()
+    recipient = Account.create().address
+    key = "0x" + sender.key.hex().removeprefix("0x")
+    txs = [({
+        "nonce": i,
+        "to": recipient,
+        "value": 0,
+        "data": "0x",
+        "gas": 500000,
+        "gasPrice": 50 * 10 ** 9,
+        "chainId": 1337,
+    }, key) for i in range(N)]
+    secrets = [(key, generate_random_password()) for _ in range(N)]
+
+    pool = CryptoPool()
+    pool.create_accounts(CRYPTO_WORKERS * 2)  # warm up worker processes
+    print(f"[INFO] {N} items, {CRYPTO_WORKERS} workers")
+
+    signed_inline, t_inline = timed("sign inline", _sign_batch, txs)
+    signed_pool, t_pool = timed("sign pool", pool.sign_many, txs)
+    if signed_inline != signed_pool:
+        sys.exit("[FAIL] Pool signatures differ from inline signatures")
+    print(f"[BENCH] sign speedup {t_inline / t_pool:.1f}x")
+
+    encrypted, _ = timed("encrypt inline", _encrypt_batch, secrets)
+    timed("encrypt pool", pool.encrypt_many, secrets)
+    pairs = [(blob, password) for blob, (_, password) in zip(encrypted, secrets)]
+    timed("decrypt inline", _decrypt_batch, pairs)
+    decrypted, _ = timed("decrypt pool", pool.decrypt_many, pairs)
+    if decrypted != [k for k, _ in secrets]:
+        sys.exit("[FAIL] Pool decrypt round-trip mismatch")
+    timed("Account.create pool", pool.create_accounts, N)
+    pool.shutdown()
+
+if __name__ == "__main__":
+    main()
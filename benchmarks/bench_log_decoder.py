@@ -0,0 +1,86 @@
+# benchmarks/bench_log_decoder.py
+# Usage: python -m benchmarks.bench_log_decoder [n_logs]
+import os
+import sys
+import time
+import random
+from hexbytes import HexBytes
+from web3 import Web3
+from web3.datastructures import AttributeDict
+from web3.logs import DISCARD
+
+from utils.event_utils import TRANSFER_TOPIC, REFERRAL_REWARD_TOPIC, decode_transfer_logs
+
+N_LOGS = int(sys.argv[1]) if len(sys.argv) > 1 else int(os.getenv("BENCH_N_LOGS", "100000"))
+N_ADDRESSES = 2000
+CONTRACT = Web3.to_checksum_address("0x" + "ab" * 20)
+
+EVENTS_ABI = [
+    {
+        "anonymous": False,
+        "name": "Transfer",
+        "type": "event",
+        "inputs": [
+            {"indexed": True, "name": "from", "type": "address"},
+            {"indexed": True, "name": "to", "type": "address"},
+            {"indexed": False, "name": "value", "type": "uint256"},
+        ],
+    },
+    {
+        "anonymous": False,
+        "name": "ReferralReward",
+        "type": "event",
+        "inputs": [
+            {"indexed": True, "name": "referrer", "type": "address"},
+            {"indexed": True, "name": "referee", "type": "address"},
+            {"indexed": False, "name": "reward", "type": "uint256"},
+        ],
+    },
+]
+
+def synthetic_logs(n, seed=7):
+    rng = random.Random(seed)
+    addresses = [rng.randbytes(20) for _ in range(N_ADDRESSES)]
+    logs = []
+    for i in range(n):
+        topic0 = REFERRAL_REWARD_TOPIC if i % 10 == 9 else TRANSFER_TOPIC
+        a, b = rng.choice(addresses), rng.choice(addresses)
+        value = rng.randrange(0, 10 ** 6) * 10 ** 18 + rng.randrange(0, 10 ** 18)
+        logs.append(AttributeDict({
+            "address": CONTRACT,
+            "topics": [HexBytes(topic0), HexBytes(b"\x00" * 12 + a), HexBytes(b"\x00" * 12 + b)],
+            "data": HexBytes(value.to_bytes(32, "big")),
+            "blockNumber": i // 50,
+            "blockHash": HexBytes(b"\x00" * 32),
+            "transactionHash": HexBytes(i.to_bytes(32, "big")),
+            "transactionIndex": 0,
+            "logIndex": i,
+            "removed": False,
+        }))
+    return logs
+
+def main():
+    print(f"[INFO] Building {N_LOGS} synthetic logs")
+    receipt = AttributeDict({"logs": synthetic_logs(N_LOGS)})
+    token = Web3().eth.contract(address=CONTRACT, abi=EVENTS_ABI)
+
+    t0 = time.perf_counter()
+    with_web3 = token.events.Transfer().process_receipt(receipt, errors=DISCARD)
+    t_web3 = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with_decoder = decode_transfer_logs(receipt["logs"])
+    t_fast = time.perf_counter() - t0
+
+    expected = [(e["args"]["from"], e["args"]["to"], e["args"]["value"]) for e in with_web3]
+    got = [(r["from"], r["to"], r["value"]) for r in with_decoder]
+    if expected != got:
+        sys.exit("[FAIL] Decoder output differs from process_receipt")
+
+    print(f"[OK] {len(got)} Transfer records match process_receipt")
+    print(f"[BENCH] process_receipt : {t_web3:8.3f}s ({N_LOGS / t_web3:,.0f} logs/s)")
+    print(f"[BENCH] event_utils     : {t_fast:8.3f}s ({N_LOGS / t_fast:,.0f} logs/s)")
+    print(f"[BENCH] speedup         : {t_web3 / t_fast:8.1f}x")
+
+if __name__ == "__main__":
+    main()
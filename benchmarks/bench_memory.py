@@ -0,0 +1,80 @@
+# benchmarks/bench_memory.py
+# Resident and save-time memory of the user store: plain dicts (the old layout) vs slotted User/Wallet records.
+# Usage:
+#   python -m benchmarks.bench_memory [--sizes 10000,100000,1000000] [--output benchmarks/results/memory.json]
+import os
+import gc
+import io
+import json
+import time
+import argparse
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.run import synthetic_users
+from utils import models
+from utils.models import parse_users, dump_users
+
+def traced(build):
+    # Returns (result, bytes still allocated by build, peak bytes during build).
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current, peak
+
+def save_copy_then_dump(users, f):
+    # What save_users used to do: copy every wallet with its encrypted key, then json.dump(indent=4) the copy.
+    copy = {}
+    for user_id, info in users.items():
+        copy[user_id] = {"email": info["email"], "ip": info["ip"], "wallets": [dict(w) for w in info["wallets"]]}
+    json.dump(copy, f, indent=4)
+
+def bench(n, results):
+    records = synthetic_users(n)
+    buf = io.StringIO()
+    dump_users(records, buf)
+    text = buf.getvalue()
+    del records, buf
+
+    # Both layouts are built from the same file contents, the way load_users sees them.
+    models._addresses.clear()
+    _, dict_bytes, _ = traced(lambda: json.loads(text))
+    _, record_bytes, _ = traced(lambda: parse_users(json.loads(text)))
+    results[f"memory.resident.records.n={n}"] = record_bytes
+    results[f"memory.resident.dicts.n={n}"] = dict_bytes
+
+    # Discarding writer: measures what each save path holds, not the size of the output.
+    sink = type("Sink", (), {"write": lambda self, s: None})()
+    records = parse_users(json.loads(text))
+    dicts = json.loads(text)
+    _, _, results[f"memory.save_peak.copy_dump.n={n}"] = traced(lambda: save_copy_then_dump(dicts, sink))
+    del dicts
+    _, _, results[f"memory.save_peak.streamed.n={n}"] = traced(lambda: dump_users(records, sink))
+
+    print(f"[MEM ] n={n:<9} resident dicts {dict_bytes / 2**20:9.1f} MiB  records {record_bytes / 2**20:9.1f} MiB  "
+          f"({record_bytes / dict_bytes:.0%})")
+    print(f"[MEM ] n={n:<9} save peak  copy {results[f'memory.save_peak.copy_dump.n={n}'] / 2**20:9.1f} MiB  "
+          f"streamed {results[f'memory.save_peak.streamed.n={n}'] / 2**20:9.1f} MiB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Orvyn user store memory benchmark")
+    parser.add_argument("--sizes", default=os.getenv("BENCH_MEMORY_SIZES", "10000,100000,1000000"))
+    parser.add_argument("--output", default="benchmarks/results/memory.json")
+    args = parser.parse_args()
+
+    results = {}
+    for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        bench(n, results)
+
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    report = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}, "results": results}
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[MEM ] wrote {out}")
+
+if __name__ == "__main__":
+    main()
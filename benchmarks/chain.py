@@ -0,0 +1,138 @@
+# benchmarks/chain.py
+# Local chain bootstrap for offline benchmarks: an in-process eth-tester/py-evm chain (default)
+# or a throwaway Anvil node, with OrvynToken deployed and the runtime modules pointed at it.
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CONTRACT_PATH = ROOT / "deploy" / "OrvynToken.sol"
+CONTRACT_NAME = "OrvynToken"
+TOKEN_SUPPLY_WEI = 7_000_000 * 10 ** 18
+
+ETH_TESTER_CHAIN_ID = 131277322940537
+ANVIL_CHAIN_ID = 31337
+# Anvil's well-known first dev account.
+ANVIL_PRIVATE_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+class LocalChain:
+    def __init__(self, backend, w3, token, deployer_address, deployer_key, chain_id, workdir, process=None):
+        self.backend = backend
+        self.w3 = w3
+        self.token = token
+        self.deployer_address = deployer_address
+        self.deployer_key = deployer_key
+        self.chain_id = chain_id
+        self.workdir = workdir
+        self.process = process
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+            self.process = None
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _isolate_env(workdir: Path):
+    # Runtime modules read config at import; keep them off real data files and real Discord credentials.
+    defaults = {
+        "DISCORD_TOKEN": "bench",
+        "DISCORD_BOT_TOKEN": "bench",
+        "DISCORD_CLIENT_ID": "0",
+        "DISCORD_CLIENT_SECRET": "bench",
+        "DISCORD_REDIRECT_URI": "http://127.0.0.1/callback",
+        "DISCORD_CHANNEL_ID": "0",
+        "DISCORD_TX_CHANNEL_ID": "0",
+        "TRACE_EXPORTER": "none",
+    }
+    for k, v in defaults.items():
+        os.environ.setdefault(k, v)
+    os.environ["USERS_FILE"] = str(workdir / "users.json")
+    os.environ["TRANSACTIONS_FILE"] = str(workdir / "transactions.json")
+    os.environ["HISTORY_DB"] = str(workdir / "history.db")
+    os.environ["NOTIFICATIONS_FILE"] = str(workdir / "notifications.json")
+    os.environ["REFERRAL_CODES_FILE"] = str(workdir / "referral_codes.json")
+
+def load_compiled(workdir: Path) -> dict:
+    # Reuse an existing build if it has bytecode, otherwise compile exactly as deploy/deploy.py does.
+    existing = Path(os.getenv("BENCH_COMPILED_CODE_PATH", ROOT / "abi" / "compiled_code.json"))
+    compiled = None
+    if existing.is_file():
+        compiled = json.loads(existing.read_text(encoding="utf-8"))
+        try:
+            if not compiled["contracts"][CONTRACT_PATH.name][CONTRACT_NAME]["evm"]["bytecode"]["object"]:
+                compiled = None
+        except (KeyError, TypeError):
+            compiled = None
+    if compiled is None:
+        from deploy.deploy import compile_contract
+        compiled = compile_contract(CONTRACT_PATH)
+    out = workdir / "compiled_code.json"
+    out.write_text(json.dumps(compiled), encoding="utf-8")
+    os.environ["COMPILED_CODE_PATH"] = str(out)
+    os.environ["CONTRACT_SOURCE_FILE"] = CONTRACT_PATH.name
+    os.environ["CONTRACT_NAME"] = CONTRACT_NAME
+    return compiled
+
+def start_chain(backend: str = None) -> LocalChain:
+    backend = backend or os.getenv("BENCH_CHAIN", "eth-tester")
+    workdir = Path(tempfile.mkdtemp(prefix="orvyn-bench-"))
+    _isolate_env(workdir)
+
+    process = None
+    if backend == "anvil":
+        port = _free_port()
+        process = subprocess.Popen(
+            [os.getenv("ANVIL_BIN", "anvil"), "--port", str(port), "--silent"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        os.environ["WEB3_PROVIDER_URL"] = f"http://127.0.0.1:{port}"
+        os.environ["CHAIN_ID"] = str(ANVIL_CHAIN_ID)
+        deployer_key = ANVIL_PRIVATE_KEY
+    elif backend == "eth-tester":
+        os.environ["WEB3_PROVIDER_URL"] = "eth-tester"
+        os.environ["CHAIN_ID"] = str(ETH_TESTER_CHAIN_ID)
+        deployer_key = None
+    else:
+        sys.exit(f"[BENCH] Unknown chain backend: {backend}")
+
+    if process is not None:
+        from web3 import Web3
+        probe = Web3(Web3.HTTPProvider(os.environ["WEB3_PROVIDER_URL"]))
+        deadline = time.monotonic() + 15
+        while not probe.is_connected():
+            if time.monotonic() > deadline:
+                process.terminate()
+                sys.exit("[BENCH] Anvil did not start")
+            time.sleep(0.1)
+
+    from utils.eth_utils import w3
+    if deployer_key is None:
+        deployer_key = w3.provider.ethereum_tester.backend.account_keys[0].to_hex()
+    chain_id = w3.eth.chain_id
+    if chain_id != int(os.environ["CHAIN_ID"]):
+        sys.exit(f"[BENCH] Unexpected chain id {chain_id} for backend {backend}")
+
+    from eth_account import Account
+    from deploy.deploy import get_abi_and_bytecode, deploy_contract, write_runtime_artifact
+    deployer_address = Account.from_key(deployer_key).address
+    compiled = load_compiled(workdir)
+    abi, bytecode = get_abi_and_bytecode(compiled, CONTRACT_PATH.name, CONTRACT_NAME)
+    token = deploy_contract(w3, abi, bytecode, deployer_address, deployer_key, TOKEN_SUPPLY_WEI, chain_id=chain_id)
+    artifact = write_runtime_artifact(abi, token.address, chain_id, compiled.get("buildKey"),
+                                      path=workdir / f"{CONTRACT_NAME}.json", contract_name=CONTRACT_NAME)
+
+    os.environ["CONTRACT_ARTIFACT_PATH"] = str(artifact)
+    os.environ["CONTRACT_ADDRESS"] = token.address
+    os.environ["MAIN_ACCOUNT_ADDRESS"] = deployer_address
+    os.environ["MAIN_ACCOUNT_PRIVATE_KEY"] = deployer_key
+    return LocalChain(backend, w3, token, deployer_address, deployer_key, chain_id, workdir, process)
@@ -0,0 +1,157 @@
+# benchmarks/gas.py
+# Gas-usage regression harness for OrvynToken: compiles deploy/OrvynToken.sol through deploy/deploy.py,
+# deploys it on an in-process py-evm chain and records gasUsed per scenario.
+# Usage:
+#   python -m benchmarks.gas [--baseline benchmarks/gas_baseline.json] [--max-increase 0.02]
+#   python -m benchmarks.gas --update-baseline
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+CONTRACT_PATH = ROOT / "deploy" / "OrvynToken.sol"
+CONTRACT_NAME = "OrvynToken"
+DEFAULT_BASELINE = ROOT / "benchmarks" / "gas_baseline.json"
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+TOKEN = 10 ** 18
+SUPPLY_WEI = 7_000_000 * TOKEN
+
+# Functions that only read state; every other ABI function must be covered by a scenario below.
+VIEW_MUTABILITY = ("view", "pure")
+
+class GasMeter:
+    def __init__(self, w3, token):
+        self.w3 = w3
+        self.token = token
+        self.results = {}
+        self.covered = set()
+
+    def record(self, name, fn, sender, value=0):
+        tx_hash = fn.transact({"from": sender, "value": value})
+        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        if receipt.status != 1:
+            sys.exit(f"[GAS] Scenario reverted: {name}")
+        self.results[name] = receipt.gasUsed
+        self.covered.add(fn.fn_name)
+
+def run_scenarios(meter, accounts):
+    # Each scenario pins the storage state it runs against (fresh vs existing balances, referrer set or not),
+    # since cold/zero-to-nonzero SSTOREs dominate the numbers.
+    owner, alice, bob, carol = accounts[:4]
+    f = meter.token.functions
+    names = {item.get("name") for item in meter.token.abi}
+
+    meter.record("transfer.owner_to_new_holder", f.transfer(alice, 1000 * TOKEN), owner)
+    meter.record("transfer.owner_to_existing_holder", f.transfer(alice, 1000 * TOKEN), owner)
+    meter.record("buyTokens.no_referrer", f.buyTokens(ZERO_ADDRESS), bob, value=10 ** 18)
+    meter.record("buyTokens.registers_referrer", f.buyTokens(alice), carol, value=10 ** 18)
+    meter.record("buyTokens.existing_referrer", f.buyTokens(alice), carol, value=10 ** 18)
+    meter.record("transfer.no_referrer", f.transfer(bob, TOKEN), alice)
+    meter.record("transfer.with_referrer", f.transfer(bob, TOKEN // 10), carol)
+    meter.record("approve.new_allowance", f.approve(bob, TOKEN), alice)
+    meter.record("transferFrom.no_referrer", f.transferFrom(alice, carol, TOKEN // 2), bob)
+    # OpenZeppelin 4.x ships the allowance helpers; 5.x dropped them.
+    if "increaseAllowance" in names:
+        meter.record("increaseAllowance", f.increaseAllowance(bob, TOKEN), alice)
+    if "decreaseAllowance" in names:
+        meter.record("decreaseAllowance", f.decreaseAllowance(bob, TOKEN), alice)
+    meter.record("withdraw", f.withdraw(), owner)
+
+def uncovered_functions(abi, covered):
+    return sorted(
+        item["name"] for item in abi
+        if item.get("type") == "function"
+        and item.get("stateMutability") not in VIEW_MUTABILITY
+        and item["name"] not in covered
+    )
+
+def measure(compiled):
+    from web3 import Web3, EthereumTesterProvider
+    from deploy.deploy import get_abi_and_bytecode, deploy_contract
+
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    accounts = w3.eth.accounts
+    deployer_key = provider.ethereum_tester.backend.account_keys[0].to_hex()
+    abi, bytecode = get_abi_and_bytecode(compiled, CONTRACT_PATH.name, CONTRACT_NAME)
+    token = deploy_contract(w3, abi, bytecode, accounts[0], deployer_key, SUPPLY_WEI, chain_id=w3.eth.chain_id)
+
+    meter = GasMeter(w3, token)
+    deploy_tx = w3.eth.get_block("latest").transactions[0]
+    meter.results["deploy"] = w3.eth.get_transaction_receipt(deploy_tx).gasUsed
+    meter.results["deploy.runtime_bytes"] = len(w3.eth.get_code(token.address))
+    run_scenarios(meter, accounts)
+    return meter.results, uncovered_functions(abi, meter.covered)
+
+def compare(results, baseline, max_increase):
+    # -> (keys over max_increase, baseline keys no longer measured)
+    regressions = []
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            print(f"[NEW ] {key:<40} {value:>10,}")
+            continue
+        change = (value - base) / base if base else 0.0
+        flag = "FAIL" if change > max_increase else "OK"
+        print(f"[{flag:<4}] {key:<40} {value:>10,}  baseline {base:>10,}  {change:+7.2%}")
+        if flag == "FAIL":
+            regressions.append(key)
+    gone = sorted(set(baseline) - set(results))
+    for key in gone:
+        print(f"[GONE] {key:<40} baseline {baseline[key]:>10,}")
+    return regressions, gone
+
+def main():
+    parser = argparse.ArgumentParser(description="OrvynToken gas regression harness")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--max-increase", type=float, default=float(os.getenv("GAS_MAX_INCREASE", "0.02")))
+    parser.add_argument("--update-baseline", action="store_true", help="write the measured gas as the new baseline")
+    parser.add_argument("--compiled", help="use an existing solc standard-JSON output instead of compiling")
+    args = parser.parse_args()
+    baseline_path = Path(args.baseline)
+    # Without one every key would print [NEW ] and the check could never fail: the run records it and fails.
+    missing = not args.update_baseline and not baseline_path.is_file()
+
+    from deploy.deploy import compile_contract, SOLC_VERSION
+    if args.compiled:
+        compiled = json.loads(Path(args.compiled).read_text(encoding="utf-8"))
+    else:
+        compiled = compile_contract(CONTRACT_PATH)
+    results, uncovered = measure(compiled)
+
+    if args.update_baseline or missing:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "solc": SOLC_VERSION,
+                "contract": f"{CONTRACT_PATH.name}:{CONTRACT_NAME}",
+            },
+            "results": results,
+        }
+        baseline_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+        print(f"[GAS] wrote {baseline_path}")
+    if missing:
+        compare(results, {}, args.max_increase)
+        sys.exit(f"[GAS] No baseline at {baseline_path}: recorded this run's results there, review and commit it")
+
+    baseline = {}
+    if not args.update_baseline:
+        stored = json.loads(baseline_path.read_text(encoding="utf-8"))
+        if stored["meta"].get("solc") != SOLC_VERSION:
+            print(f"[WARN] Baseline was recorded with solc {stored['meta'].get('solc')}, measuring with {SOLC_VERSION}")
+        baseline = stored["results"]
+    regressions, gone = compare(results, baseline, args.max_increase)
+
+    if uncovered:
+        # New state-changing functions (e.g. batch payouts) need a scenario before they can be tracked.
+        sys.exit(f"[GAS] No gas scenario for: {', '.join(uncovered)} — add one to run_scenarios()")
+    if gone:
+        sys.exit(f"[GAS] Scenario(s) missing from this run: {', '.join(gone)} — restore them or --update-baseline")
+    if regressions:
+        sys.exit(f"[GAS] {len(regressions)} gas regression(s) over {args.max_increase:.0%}: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+# benchmarks/load_sim.py
+# Discord interaction load simulator: drives the real slash-command callbacks, views and modals with fake
+# interactions against a local chain and a mocked Discord REST layer, and reports latency percentiles.
+# Usage:
+#   python -m benchmarks.load_sim [--rates 1,2,5,10] [--duration 30] [--users 20]
+#                                 [--mix wallet=4,transaction=2,history=3,buy_tokens=1]
+#                                 [--rest-latency-ms 80] [--output benchmarks/results/load.json]
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import threading
+import contextlib
+from pathlib import Path
+
+from benchmarks.chain import start_chain
+
+DISCORD_ACK_DEADLINE = 3.0
+DEFAULT_MIX = "wallet=4,transaction=2,history=3,buy_tokens=1"
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        if name.strip() not in FLOWS:
+            sys.exit(f"[SIM] Unknown flow in mix: {name.strip()} (expected one of {', '.join(FLOWS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+class RestLatency:
+    # Mocked Discord REST round trip: uniform jitter around a mean.
+    def __init__(self, mean_ms, jitter=0.5, seed=7):
+        self.mean = mean_ms / 1000
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+
+    async def call(self):
+        if self.mean > 0:
+            await asyncio.sleep(self.mean * self.rng.uniform(1 - self.jitter, 1 + self.jitter))
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, name, first_response, completion):
+        self.samples.setdefault(name, []).append((first_response, completion))
+
+    def error(self, name):
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+class FakeUser:
+    def __init__(self, user_id, rest):
+        self.id = user_id
+        self.rest = rest
+        self.dms = 0
+
+    async def send(self, *args, **kwargs):
+        await self.rest.call()
+        self.dms += 1
+
+class FakeChannel:
+    def __init__(self, rest):
+        self.rest = rest
+        self.posts = 0
+
+    async def send(self, *args, **kwargs):
+        await self.rest.call()
+        self.posts += 1
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _ack(self, kind, kwargs):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+        await self._interaction.rest.call()
+        self._interaction._record(kind, kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._ack("send_message", dict(kwargs, content=content))
+
+    async def defer(self, **kwargs):
+        await self._ack("defer", kwargs)
+
+    async def edit_message(self, **kwargs):
+        await self._ack("edit_message", kwargs)
+
+    async def send_modal(self, modal):
+        await self._ack("send_modal", {"modal": modal})
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        if not self._interaction.response.is_done():
+            raise RuntimeError("Followup sent before the interaction was acknowledged")
+        await self._interaction.rest.call()
+        self._interaction._record("followup", dict(kwargs, content=content))
+
+class FakeInteraction:
+    def __init__(self, user_id, rest):
+        self.user = FakeUser(user_id, rest)
+        self.rest = rest
+        self.extras = {}
+        self.created_at = time.perf_counter()
+        self.first_response_at = None
+        self.messages = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    def _record(self, kind, kwargs):
+        now = time.perf_counter()
+        if self.first_response_at is None:
+            self.first_response_at = now
+        self.messages.append((kind, kwargs))
+
+    async def edit_original_response(self, **kwargs):
+        if not self.response.is_done():
+            raise RuntimeError("edit_original_response before the interaction was acknowledged")
+        await self.rest.call()
+        self._record("edit_original_response", kwargs)
+
+    def last(self, key):
+        for _, kwargs in reversed(self.messages):
+            if kwargs.get(key) is not None:
+                return kwargs[key]
+        return None
+
+class Simulator:
+    def __init__(self, user_ids, rest, recorder):
+        self.user_ids = user_ids
+        self.rest = rest
+        self.recorder = recorder
+
+    async def interact(self, name, user_id, callback, *args):
+        interaction = FakeInteraction(int(user_id), self.rest)
+        try:
+            await callback(*args, interaction)
+        except Exception:
+            self.recorder.error(name)
+            return interaction
+        done = time.perf_counter()
+        if interaction.first_response_at is None:
+            self.recorder.error(name)
+            return interaction
+        self.recorder.add(name, interaction.first_response_at - interaction.created_at, done - interaction.created_at)
+        return interaction
+
+    def peer_of(self, user_id):
+        from bot.bot import users
+        peer = self.user_ids[(self.user_ids.index(user_id) + 1) % len(self.user_ids)]
+        return users[peer].wallets[0].address
+
+def component(view, action):
+    # A panel component by the action segment of its custom_id ("orvyn:wallet:next:<user id>:<index>").
+    return next(c for c in view.children if c.custom_id.split(":")[2] == action)
+
+def press(item, values=()):
+    # What discord.py's view store does on a click: rebuild the DynamicItem from its custom_id, apply the
+    # component state, run the owner check, then the callback.
+    async def callback(interaction):
+        factory = type(item)
+        match = factory.__discord_ui_compiled_template__.fullmatch(item.custom_id)
+        live = await factory.from_custom_id(interaction, item.item, match)
+        live.item._refresh_state(interaction, {"values": list(values)})
+        if await live.interaction_check(interaction):
+            await live.callback(interaction)
+    return callback
+
+async def flow_wallet(sim, user_id, rng):
+    from bot.commands import wallet_command
+    interaction = await sim.interact("wallet", user_id, wallet_command.callback)
+    view = interaction.last("view")
+    if view is not None:
+        await sim.interact("wallet.next", user_id, press(component(view, "next")))
+
+async def flow_transaction(sim, user_id, rng):
+    from bot.commands import transaction_command
+    interaction = await sim.interact("transaction", user_id, transaction_command.callback)
+    view = interaction.last("view")
+    if view is None:
+        return
+    interaction = await sim.interact("transaction.select", user_id, press(component(view, "select"), ["0"]))
+    modal = interaction.last("modal")
+    if modal is None:
+        return
+    # Same state refresh discord.py applies before dispatching a modal submission.
+    modal.recipient._refresh_state(interaction, {"value": sim.peer_of(user_id)})
+    modal.amount._refresh_state(interaction, {"value": str(rng.choice((1, 2, 5)))})
+    await sim.interact("transaction.submit", user_id, modal.on_submit)
+
+async def flow_history(sim, user_id, rng):
+    from bot.commands import history_command
+    await sim.interact("history", user_id, history_command.callback)
+
+async def flow_buy_tokens(sim, user_id, rng):
+    from bot.commands import buy_tokens_command
+
+    async def callback(interaction):
+        await buy_tokens_command.callback(interaction, 0.001)
+    interaction = await sim.interact("buy_tokens", user_id, callback)
+    view = interaction.last("view")
+    if view is not None:
+        await sim.interact("buy_tokens.confirm", user_id, press(component(view, "confirm")))
+
+FLOWS = {
+    "wallet": flow_wallet,
+    "transaction": flow_transaction,
+    "history": flow_history,
+    "buy_tokens": flow_buy_tokens,
+}
+
+async def monitor_loop_lag(stop, interval=0.05):
+    worst = 0.0
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - t0 - interval)
+    return worst
+
+async def run_rate(sim, rate, duration, mix, seed):
+    rng = random.Random(seed)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(stop))
+    tasks = []
+    start = time.perf_counter()
+    deadline = start + duration
+    while True:
+        # Open-loop Poisson arrivals: a slow bot does not slow down its users.
+        await asyncio.sleep(rng.expovariate(rate))
+        if time.perf_counter() >= deadline:
+            break
+        flow = FLOWS[rng.choices(names, weights)[0]]
+        tasks.append(asyncio.create_task(flow(sim, rng.choice(sim.user_ids), rng)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return len(tasks), elapsed, await lag_task
+
+def summarize(recorder, arrivals, elapsed, loop_lag, job_stats):
+    per_flow = {}
+    for name, samples in sorted(recorder.samples.items()):
+        first = [s[0] for s in samples]
+        done = [s[1] for s in samples]
+        per_flow[name] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(name, 0),
+            "first_response": {f"p{int(q * 100)}": percentile(first, q) for q in (0.5, 0.95, 0.99)},
+            "completion": {f"p{int(q * 100)}": percentile(done, q) for q in (0.5, 0.95, 0.99)},
+            "over_ack_deadline": sum(1 for v in first if v > DISCORD_ACK_DEADLINE),
+        }
+    for name, count in recorder.errors.items():
+        per_flow.setdefault(name, {"count": 0, "errors": count})
+    all_first = [s[0] for samples in recorder.samples.values() for s in samples]
+    completed = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        "arrivals": arrivals,
+        "interactions": completed,
+        "elapsed_seconds": elapsed,
+        "throughput_per_second": completed / elapsed if elapsed else 0.0,
+        "first_response_p99": percentile(all_first, 0.99),
+        "max_loop_lag_seconds": loop_lag,
+        "jobs": job_stats,
+        "flows": per_flow,
+    }
+
+def print_summary(rate, summary):
+    print(f"\n[SIM] rate {rate}/s: {summary['arrivals']} flows, {summary['interactions']} interactions in "
+          f"{summary['elapsed_seconds']:.1f}s ({summary['throughput_per_second']:.1f}/s), "
+          f"max loop lag {summary['max_loop_lag_seconds'] * 1000:.0f}ms, jobs rejected {summary['jobs']['rejected']}")
+    print(f"  {'interaction':<20} {'n':>5} {'err':>4}  {'ack p50':>8} {'ack p95':>8} {'ack p99':>8}  "
+          f"{'done p50':>8} {'done p95':>8} {'done p99':>8}  {'>3s':>4}")
+    for name, stats in summary["flows"].items():
+        if not stats["count"]:
+            print(f"  {name:<20} {0:>5} {stats['errors']:>4}")
+            continue
+        ack = stats["first_response"]
+        done = stats["completion"]
+        print(f"  {name:<20} {stats['count']:>5} {stats['errors']:>4}  "
+              f"{ack['p50']:8.3f} {ack['p95']:8.3f} {ack['p99']:8.3f}  "
+              f"{done['p50']:8.3f} {done['p95']:8.3f} {done['p99']:8.3f}  {stats['over_ack_deadline']:>4}")
+
+def serialize_provider(w3):
+    # The in-process eth-tester chain is not thread-safe; job workers share it through a lock.
+    lock = threading.Lock()
+    make_request = w3.provider.make_request
+
+    def locked(method, params):
+        with lock:
+            return make_request(method, params)
+    w3.provider.make_request = locked
+
+def seed_users(count, history_per_user):
+    from bot.bot import users
+    from utils.contract_utils import generate_user_account
+    from benchmarks.run import synthetic_history
+    from utils.history_store import history_store
+
+    user_ids = []
+    for i in range(count):
+        user_id = str(10 ** 17 + i)
+        generate_user_account(user_id, users)
+        user_ids.append(user_id)
+    if history_per_user:
+        history = synthetic_history({uid: users[uid] for uid in user_ids}, per_user=history_per_user)
+        history_store.import_transactions(history)
+    return user_ids
+
+async def simulate(args, user_ids, mix):
+    from bot.bot import bot
+    from bot.jobs import jobs
+
+    rest = RestLatency(args.rest_latency_ms)
+    channel = FakeChannel(rest)
+    # Mocked gateway cache: every seeded user and the transaction channel resolve without a connection.
+    bot.loop = asyncio.get_running_loop()
+    bot.get_user = lambda user_id: FakeUser(user_id, rest)
+    bot.get_channel = lambda channel_id: channel
+    dispatch = asyncio.create_task(bot.dispatcher.run())
+
+    report = {}
+    for i, rate in enumerate(args.rates):
+        recorder = Recorder()
+        sim = Simulator(user_ids, rest, recorder)
+        before = jobs.snapshot()
+        sink = open(os.devnull, "w") if not args.verbose else None
+        with (contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()):
+            arrivals, elapsed, lag = await run_rate(sim, rate, args.duration, mix, args.seed + i)
+        if sink:
+            sink.close()
+        after = jobs.snapshot()
+        job_stats = dict(after, rejected=after["rejected"] - before["rejected"], failed=after["failed"] - before["failed"])
+        summary = summarize(recorder, arrivals, elapsed, lag, job_stats)
+        print_summary(rate, summary)
+        report[str(rate)] = summary
+    await bot.dispatcher.drain()
+    dispatch.cancel()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Orvyn Discord interaction load simulator")
+    parser.add_argument("--rates", default=os.getenv("SIM_RATES", "1,2,5,10"),
+                        help="comma-separated flow arrival rates per second; each is run for --duration")
+    parser.add_argument("--duration", type=float, default=float(os.getenv("SIM_DURATION", "30")))
+    parser.add_argument("--users", type=int, default=int(os.getenv("SIM_USERS", "20")))
+    parser.add_argument("--mix", default=os.getenv("SIM_MIX", DEFAULT_MIX))
+    parser.add_argument("--history-per-user", type=int, default=10)
+    parser.add_argument("--rest-latency-ms", type=float, default=float(os.getenv("SIM_REST_LATENCY_MS", "80")))
+    parser.add_argument("--chain", default=None, help="eth-tester (default) or anvil; see benchmarks/chain.py")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="benchmarks/results/load.json")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own stdout output")
+    args = parser.parse_args()
+    args.rates = [float(r) for r in args.rates.split(",") if r.strip()]
+    mix = parse_mix(args.mix)
+    if args.users < 2:
+        sys.exit("[SIM] --users must be at least 2 (transactions need a recipient)")
+
+    # Post transaction embeds to the mocked channel and give simulated users enough ETH for gas.
+    os.environ.setdefault("DISCORD_TX_CHANNEL_ID", "1")
+    os.environ.setdefault("INITIAL_ETH_GRANT", "10")
+    chain = start_chain(args.chain)
+    try:
+        if chain.backend == "eth-tester":
+            serialize_provider(chain.w3)
+        print(f"[SIM] seeding {args.users} users on {chain.backend}")
+        user_ids = seed_users(args.users, args.history_per_user)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        report = asyncio.run(simulate(args, user_ids, mix))
+    finally:
+        chain.stop()
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "chain_backend": chain.backend,
+            "users": args.users,
+            "mix": mix,
+            "duration": args.duration,
+            "rest_latency_ms": args.rest_latency_ms,
+        },
+        "rates": report,
+    }
+    healthy = [float(rate) for rate, s in report.items()
+               if s["first_response_p99"] is not None and s["first_response_p99"] <= DISCORD_ACK_DEADLINE]
+    print(f"\n[SIM] highest rate with p99 first response within {DISCORD_ACK_DEADLINE:.0f}s: "
+          f"{max(healthy) if healthy else 'none'}/s")
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    print(f"[SIM] wrote {out}")
+
+if __name__ == "__main__":
+    main()
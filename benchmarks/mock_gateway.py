@@ -0,0 +1,193 @@
+# benchmarks/mock_gateway.py
+# A minimal Discord REST + gateway stand-in for exercising cluster mode offline: login, application info,
+# command sync, /gateway/bot and the HELLO -> IDENTIFY -> READY handshake with heartbeats.
+# Usage:
+#   python -m benchmarks.mock_gateway [--shards 4] [--workers 2] [--timeout 60]
+# Starts bot/cluster.py's supervisor against the mock, waits for every shard to identify, kills one worker,
+# and checks that the supervisor restarts it and its shards identify again.
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import tempfile
+from pathlib import Path
+
+from aiohttp import web, WSMsgType
+
+from benchmarks.chain import _isolate_env
+
+APPLICATION_ID = "100000000000000001"
+BOT_USER = {"id": APPLICATION_ID, "username": "orvyn", "discriminator": "0", "global_name": None, "avatar": None, "bot": True}
+
+def _json(data):
+    # discord.py only decodes bodies whose Content-Type is exactly application/json (no charset).
+    return web.Response(body=json.dumps(data).encode(), content_type="application/json")
+
+class MockDiscord:
+    def __init__(self, shards=1, heartbeat_interval=41250):
+        self.shards = shards
+        self.heartbeat_interval = heartbeat_interval
+        self.identifies = []  # (monotonic time, shard id, shard count)
+        self.command_syncs = 0
+        self.base_url = None
+        self._runner = None
+
+    @property
+    def gateway_url(self):
+        return self.base_url.replace("http://", "ws://") + "/gateway"
+
+    def identified(self, shard_id):
+        return sum(1 for _, s, _ in self.identifies if s == shard_id)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get("/gateway", self.gateway)
+        app.router.add_get("/api/v10/gateway", self.get_gateway)
+        app.router.add_get("/api/v10/gateway/bot", self.get_gateway_bot)
+        app.router.add_get("/api/v10/users/@me", self.get_me)
+        app.router.add_get("/api/v10/oauth2/applications/@me", self.get_application)
+        app.router.add_put("/api/v10/applications/{application_id}/commands", self.put_commands)
+        return app
+
+    async def start(self, host="127.0.0.1", port=0):
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def get_gateway(self, request):
+        return _json({"url": self.gateway_url})
+
+    async def get_gateway_bot(self, request):
+        return _json({
+            "url": self.gateway_url,
+            "shards": self.shards,
+            "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0, "max_concurrency": 1},
+        })
+
+    async def get_me(self, request):
+        return _json(BOT_USER)
+
+    async def get_application(self, request):
+        return _json({
+            "id": APPLICATION_ID, "name": "Orvyn", "description": "", "icon": None, "bot_public": True,
+            "bot_require_code_grant": False, "owner": BOT_USER, "verify_key": "0" * 64, "flags": 0,
+        })
+
+    async def put_commands(self, request):
+        self.command_syncs += 1
+        return _json([])
+
+    async def gateway(self, request):
+        # Text frames only: discord.py parses them as plain JSON even when it asked for zlib-stream.
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        seq = 0
+        await ws.send_json({"op": 10, "d": {"heartbeat_interval": self.heartbeat_interval}, "s": None, "t": None})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                break
+            payload = json.loads(msg.data)
+            op = payload.get("op")
+            if op == 1:
+                await ws.send_json({"op": 11, "d": None, "s": None, "t": None})
+            elif op == 2:
+                shard_id, shard_count = payload["d"].get("shard", [0, 1])
+                self.identifies.append((time.monotonic(), shard_id, shard_count))
+                seq += 1
+                await ws.send_json({"op": 0, "t": "READY", "s": seq, "d": {
+                    "v": 10, "user": BOT_USER, "guilds": [], "session_id": f"mock-{shard_id}-{len(self.identifies)}",
+                    "resume_gateway_url": self.gateway_url, "shard": [shard_id, shard_count],
+                    "application": {"id": APPLICATION_ID, "flags": 0},
+                }})
+            elif op == 6:
+                seq += 1
+                await ws.send_json({"op": 0, "t": "RESUMED", "s": seq, "d": {}})
+        return ws
+
+def _stub_env(workdir, mock):
+    # No chain is needed to connect; the RPC preload just fails and logs.
+    _isolate_env(workdir)
+    compiled = workdir / "compiled_code.json"
+    compiled.write_text(json.dumps({"contracts": {"OrvynToken.sol": {"OrvynToken": {"abi": [], "evm": {"bytecode": {"object": "00"}}}}}}))
+    os.environ.update({
+        "COMPILED_CODE_PATH": str(compiled),
+        "WEB3_PROVIDER_URL": "http://127.0.0.1:1",
+        "CONTRACT_ADDRESS": "0x" + "11" * 20,
+        "MAIN_ACCOUNT_ADDRESS": "0x7E5F4552091A69125d5DfCd7b8C2659029395Bdf",
+        "MAIN_ACCOUNT_PRIVATE_KEY": "0x" + "00" * 31 + "01",
+        "COMMAND_SYNC_FILE": str(workdir / "command_sync.json"),
+        "LEADERBOARD_FILE": str(workdir / "leaderboards.json"),
+        "STATE_BACKEND": "sqlite",
+        "STATE_DB": str(workdir / "state.db"),
+        "DISCORD_API_BASE": mock.base_url + "/api/v10",
+        "DISCORD_GATEWAY_URL": mock.gateway_url,
+        "DISCORD_IDENTIFY_INTERVAL": os.getenv("DISCORD_IDENTIFY_INTERVAL", "0.2"),
+        "CLUSTER_RESTART_BACKOFF": os.getenv("CLUSTER_RESTART_BACKOFF", "0.5"),
+    })
+
+async def _wait(predicate, timeout, sup=None):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        if sup is not None:
+            sup.poll()
+        await asyncio.sleep(0.1)
+    return True
+
+async def run_cluster_check(shards, workers, timeout):
+    mock = await MockDiscord(shards).start()
+    _stub_env(Path(tempfile.mkdtemp(prefix="orvyn-cluster-")), mock)
+    from bot.cluster import Supervisor
+    sup = Supervisor(shards, workers)
+    ok = False
+    try:
+        sup.start()
+        started = time.monotonic()
+        if not await _wait(lambda: all(mock.identified(s) for s in range(shards)), timeout, sup):
+            print(f"[CLUSTER] only {len({s for _, s, _ in mock.identifies})}/{shards} shards identified")
+            return False
+        print(f"[CLUSTER] {shards} shards identified across {len(sup.workers)} workers in {time.monotonic() - started:.1f}s")
+        gaps = [b[0] - a[0] for a, b in zip(mock.identifies, mock.identifies[1:])]
+        print(f"[CLUSTER] min gap between identifies: {min(gaps, default=0):.2f}s")
+
+        victim = sup.workers[-1]
+        pid = victim.process.pid
+        victim.process.kill()
+        print(f"[CLUSTER] killed {victim.name} (pid {pid})")
+        if not await _wait(lambda: all(mock.identified(s) >= 2 for s in victim.shard_ids), timeout, sup):
+            print("[CLUSTER] restarted worker did not re-identify its shards")
+            return False
+        print(f"[CLUSTER] {victim.name} restarted as pid {victim.process.pid}; shards {victim.shard_ids} identified again")
+        others = [s for s in range(shards) if s not in victim.shard_ids]
+        ok = all(mock.identified(s) == 1 for s in others) and mock.command_syncs <= 1
+        print(f"[CLUSTER] other shards untouched: {all(mock.identified(s) == 1 for s in others)}; command syncs: {mock.command_syncs}")
+    finally:
+        sup.shutdown()
+        await mock.stop()
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the shard cluster against a mocked Discord gateway")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)-7s %(name)s %(message)s")
+    ok = asyncio.run(run_cluster_check(args.shards, args.workers, args.timeout))
+    print("[CLUSTER] OK" if ok else "[CLUSTER] FAILED")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+# benchmarks/run.py
+# Offline benchmark suite for storage, crypto and token operations.
+# Usage:
+#   python -m benchmarks.run [--sizes 1000,10000,100000] [--chain-iterations 20] [--skip-chain]
+#                            [--output benchmarks/results/latest.json]
+#                            [--baseline benchmarks/baseline.json --max-regression 0.25]
+# Timings only compare on the same machine, so no baseline is committed: record one there first with
+#   python -m benchmarks.run --output benchmarks/baseline.json
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import statistics
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.chain import start_chain
+from utils.models import User, Wallet
+
+def measure(fn, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+def synthetic_users(n, seed=1):
+    rng = random.Random(seed)
+    users = {}
+    for i in range(n):
+        users[str(10 ** 17 + i)] = User(f"user{i}@example.com", "127.0.0.1", [Wallet(
+            "0x" + rng.randbytes(20).hex(),
+            "0x" + rng.randbytes(32).hex(),
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(12)),
+        )])
+    return users
+
+def synthetic_history(users, per_user=3, seed=2):
+    rng = random.Random(seed)
+    return {
+        user_id: [{
+            "from": user.wallets[0].address,
+            "to": "0x" + rng.randbytes(20).hex(),
+            "value": rng.randrange(1, 10 ** 6) / 100,
+            "hash": "0x" + rng.randbytes(32).hex(),
+        } for _ in range(per_user)]
+        for user_id, user in users.items()
+    }
+
+def bench_storage(n, workdir: Path, results: dict):
+    from utils import data_utils
+    from utils.encryption_utils import encrypt, decrypt
+    from utils.history_store import HistoryStore
+
+    users = synthetic_users(n)
+    users_file = str(workdir / f"users_{n}.json")
+    notif_file = str(workdir / f"notifications_{n}.json")
+    repeat = max(3, min(20, 20000 // n))
+    rng = random.Random(4)
+
+    results[f"storage.save_users.n={n}"] = measure(lambda: data_utils.save_users(users, users_file))
+    results[f"storage.load_users.n={n}"] = measure(lambda: data_utils.load_users(users_file))
+
+    history = synthetic_history(users)
+    store = HistoryStore(str(workdir / f"history_{n}.db"))
+    store.import_transactions(history)
+    sample_ids = random.Random(3).sample(list(users), repeat)
+    ids = iter(sample_ids)
+    results[f"storage.history_record.n={n}"] = measure(lambda: store.record(
+        [(next(ids), "sent", "0x" + rng.randbytes(32).hex(), 0, "0x" + "11" * 20, "0x" + "22" * 20, 10 ** 18)]), repeat)
+    ids = iter(sample_ids)
+    results[f"storage.history_page.n={n}"] = measure(lambda: store.page(next(ids)), repeat)
+    store.close()
+
+    with open(notif_file, "w", encoding="utf-8") as f:
+        json.dump({uid: [t["hash"] for t in txs] for uid, txs in history.items()}, f)
+    ids = iter(sample_ids)
+    results[f"storage.has_user_been_notified.n={n}"] = measure(
+        lambda: data_utils.has_user_been_notified(next(ids), "0x" + "44" * 32, notif_file), repeat)
+
+    secrets = [(w.private_key, w.password) for user in users.values() for w in user.wallets]
+    encrypted = []
+    results[f"crypto.encrypt.n={n}"] = measure(lambda: encrypted.extend(encrypt(k, p) for k, p in secrets))
+    results[f"crypto.decrypt.n={n}"] = measure(lambda: [decrypt(e, p) for e, (_, p) in zip(encrypted, secrets)])
+
+def bench_chain(iterations: int, results: dict):
+    chain = start_chain()
+    try:
+        from utils import contract_utils
+        from utils.encryption_utils import decrypt
+
+        fake_bot = SimpleNamespace(get_user=lambda _id: None, loop=None)
+        users = {}
+        created = []
+
+        def create():
+            user_id = str(len(created) + 1)
+            created.append((user_id, contract_utils.generate_user_account(user_id, users)))
+        results["chain.generate_user_account"] = measure(create, iterations)
+
+        wallets = [(uid, w.address, decrypt(w.private_key, w.password)) for uid, w in created]
+        pairs = iter(range(iterations))
+
+        def transfer():
+            i = next(pairs)
+            uid, sender, key = wallets[i % len(wallets)]
+            _, recipient, _ = wallets[(i + 1) % len(wallets)]
+            interaction = SimpleNamespace(user=SimpleNamespace(id=int(uid)))
+            if not contract_utils.transfer_tokens(interaction, key, sender, recipient, 1, fake_bot):
+                raise RuntimeError("transfer_tokens failed")
+        results["chain.transfer_tokens"] = measure(transfer, iterations)
+
+        quotes = iter(range(iterations))
+
+        def quote():
+            _, buyer, _ = wallets[next(quotes) % len(wallets)]
+            if not contract_utils.quote_purchase(buyer, 10 ** 15).ok:
+                raise RuntimeError("quote_purchase rejected a purchase that should go through")
+        results["chain.quote_purchase"] = measure(quote, iterations)
+
+        buyers = iter(range(iterations))
+
+        def buy():
+            _, sender, key = wallets[next(buyers) % len(wallets)]
+            contract_utils.send_eth_to_contract(key, sender, 0.001, "0x0000000000000000000000000000000000000000")
+        results["chain.send_eth_to_contract"] = measure(buy, iterations)
+
+        holder = created[0][0]
+        for uid, _ in created[1:]:
+            users[holder].wallets.extend(users[uid].wallets)
+        results[f"chain.get_total_balances.wallets={len(users[holder].wallets)}"] = measure(
+            lambda: contract_utils.get_total_balances(holder, users), iterations)
+        return chain.backend
+    finally:
+        chain.stop()
+
+def compare(results, baseline, max_regression):
+    regressions = []
+    for key, value in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            print(f"[NEW ] {key:<48} {value:10.4f}s")
+            continue
+        change = (value - base) / base if base else 0.0
+        flag = "FAIL" if change > max_regression else "OK"
+        print(f"[{flag:<4}] {key:<48} {value:10.4f}s  baseline {base:10.4f}s  {change:+7.1%}")
+        if flag == "FAIL":
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Orvyn offline benchmark suite")
+    parser.add_argument("--sizes", default=os.getenv("BENCH_SIZES", "1000,10000,100000"))
+    parser.add_argument("--chain-iterations", type=int, default=int(os.getenv("BENCH_CHAIN_ITERATIONS", "20")))
+    parser.add_argument("--skip-chain", action="store_true")
+    parser.add_argument("--output", default="benchmarks/results/latest.json")
+    parser.add_argument("--baseline")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+    if args.baseline and not Path(args.baseline).is_file():
+        sys.exit(f"[BENCH] No baseline at {args.baseline}: record one on this machine with --output {args.baseline}")
+
+    results = {}
+    backend = None
+    if not args.skip_chain:
+        print(f"[BENCH] chain flows x{args.chain_iterations}")
+        backend = bench_chain(args.chain_iterations, results)
+
+    from utils.crypto_pool import crypto_pool, CRYPTO_INLINE_MAX
+    crypto_pool.create_accounts(CRYPTO_INLINE_MAX + 1)  # start worker processes outside the timed sections
+
+    workdir = Path(tempfile.mkdtemp(prefix="orvyn-bench-store-"))
+    for n in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"[BENCH] storage/crypto n={n}")
+        bench_storage(n, workdir, results)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "chain_backend": backend,
+        },
+        "results": results,
+    }
+    out = Path(args.output)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"[BENCH] wrote {out}")
+
+    baseline = {}
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))["results"]
+    regressions = compare(results, baseline, args.max_regression)
+    if regressions:
+        sys.exit(f"[BENCH] {len(regressions)} regression(s) over {args.max_regression:.0%}: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,16 @@
+import time
+_process_started = time.perf_counter()
+
 import os
+import json
+import asyncio
+import hashlib
+import logging
+import importlib
+from pathlib import Path
+import yarl
 import discord
+from discord import app_commands
 from discord.ext import commands
 from urllib.parse import urlencode, quote
 
@@ -9,8 +20,12 @@ try:
 except Exception:
     pass
 
-from utils.data_utils import load_referral_codes
 from utils.state_manager import state_manager
+from utils.referrals import referrals
+from utils.shared_store import shared_store
+from utils.dispatcher import Dispatcher
+from utils.metrics import registry, COMMAND_SECONDS, COMMAND_ERRORS, instrument_discord, serve_metrics
+from utils.log_utils import configure_logging
 
 def require_env(name: str) -> str:
     val = os.getenv(name)
@@ -23,19 +38,230 @@ DISCORD_CLIENT_ID    = require_env("DISCORD_CLIENT_ID")
 DISCORD_REDIRECT_URI = require_env("DISCORD_REDIRECT_URI")
 DISCORD_OAUTH_SCOPES = os.getenv("DISCORD_OAUTH_SCOPES", "identify guilds.join email")
 COMMAND_PREFIX       = os.getenv("DISCORD_COMMAND_PREFIX", "!")
+COMMAND_SYNC         = os.getenv("COMMAND_SYNC", "auto").lower()  # auto | always | never
+COMMAND_SYNC_FILE    = Path(os.getenv("COMMAND_SYNC_FILE", "data/command_sync.json"))
+# Sharding: empty -> a single unsharded connection; "auto" -> Discord's recommended count; N -> N shards in total,
+# of which this process runs SHARD_IDS (all of them when unset). bot/cluster.py sets both per worker.
+SHARD_COUNT          = os.getenv("SHARD_COUNT", "").strip().lower()
+SHARD_IDS            = [int(s) for s in os.getenv("SHARD_IDS", "").split(",") if s.strip()] or None
+# Discord allows one IDENTIFY per max_concurrency bucket every 5 seconds for the whole bot, not per process.
+IDENTIFY_CONCURRENCY = int(os.getenv("DISCORD_IDENTIFY_CONCURRENCY", "1"))
+IDENTIFY_INTERVAL    = float(os.getenv("DISCORD_IDENTIFY_INTERVAL", "5"))
+# Point REST and the gateway somewhere else (a local mock gateway in tests).
+DISCORD_API_BASE     = os.getenv("DISCORD_API_BASE", "")
+DISCORD_GATEWAY_URL  = os.getenv("DISCORD_GATEWAY_URL", "")
+# The bot's own /metrics listener (commands, jobs, RPC, dispatcher, chain events); 0 = off. The web app's
+# /metrics only covers the process it runs in. bot/cluster.py gives each worker METRICS_PORT + its index.
+METRICS_PORT         = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST         = os.getenv("METRICS_HOST", "0.0.0.0")
+
+# Modules that register slash commands and event handlers on `bot`; imported once from setup_hook.
+STARTUP_MODULES = ("bot.events", "bot.views", "bot.commands")
+
+class OrvynCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras["started_at"] = time.perf_counter()
+        if not state_manager.loaded:
+            # Only the first interactions after a restart can get here before the background preload finishes.
+            await asyncio.to_thread(state_manager.ensure_loaded)
+        if not referrals.loaded:
+            await asyncio.to_thread(referrals.reload_if_changed)
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        observe_command(interaction, name)
+        COMMAND_ERRORS.inc(name)
+        await super().on_error(interaction, error)
+
+def observe_command(interaction: discord.Interaction, name: str):
+    started_at = interaction.extras.get("started_at")
+    if started_at is not None:
+        COMMAND_SECONDS.observe(time.perf_counter() - started_at, name)
+
+def command_tree_hash(tree: app_commands.CommandTree) -> str:
+    payload = sorted((cmd.to_dict(tree) for cmd in tree.get_commands()), key=lambda c: (c.get("type", 1), c["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+class StartupReport:
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self.last = started_at
+        self.stages = []
+        self.background = {}
+        self.total = None
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self):
+        if self.total is not None:
+            return False
+        self.mark("gateway")
+        self.total = self.last - self.started_at
+        return True
+
+    def summary(self):
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in self.stages]
+        parts += [f"{name} {seconds:.2f}s (background)" for name, seconds in self.background.items()]
+        return f"{', '.join(parts)}; ready in {self.total:.2f}s"
+
+startup = StartupReport(_process_started)
+
+if DISCORD_API_BASE:
+    discord.http.Route.BASE = DISCORD_API_BASE.rstrip("/")
+if DISCORD_GATEWAY_URL:
+    from discord.gateway import DiscordWebSocket
+    DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(DISCORD_GATEWAY_URL)
+
+def shard_options():
+    if not SHARD_COUNT:
+        return {}
+    options = {"shard_count": None if SHARD_COUNT == "auto" else int(SHARD_COUNT)}
+    if SHARD_IDS is not None:
+        options["shard_ids"] = SHARD_IDS
+    return options
+
+BotBase = commands.AutoShardedBot if SHARD_COUNT else commands.Bot
+
+class OrvynBot(BotBase):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Transfer DMs and feed posts go through here instead of being sent ad hoc (utils/dispatcher.py).
+        self.dispatcher = Dispatcher(self)
+
+    async def login(self, token: str) -> None:
+        startup.mark("imports")
+        await super().login(token)
+
+    async def setup_hook(self):
+        # Runs once per process, before the first gateway connect; reconnects only fire on_ready again.
+        startup.mark("login")
+        if METRICS_PORT:
+            serve_metrics(METRICS_PORT, METRICS_HOST)
+            log.info("Serving metrics on %s:%d/metrics", METRICS_HOST, METRICS_PORT)
+        for module in STARTUP_MODULES:
+            importlib.import_module(module)
+        startup.mark("modules")
+        self._dispatch = asyncio.create_task(self.dispatcher.run())
+        self._preloads = [
+            asyncio.create_task(self._preload("users", state_manager.ensure_loaded)),
+            asyncio.create_task(self._preload("rpc", _connect_contract)),
+        ]
+        # First pass loads the codes; afterwards it picks up edits to REFERRAL_CODES_FILE without a restart.
+        self._referral_watch = asyncio.create_task(referrals.watch())
+        from utils.leaderboards import leaderboards
+        self._preloads.append(asyncio.create_task(self._preload("leaderboards", leaderboards.load)))
+        self._leaderboard_snapshots = asyncio.create_task(leaderboards.snapshot_loop())
+        # Signups arrive from the web tier (web.py, possibly another host process) through the queue.
+        from utils.signup_queue import signup_queue
+        self._signups = asyncio.create_task(signup_queue.consume(_process_signup))
+        from utils.chain_events import chain_events
+        if chain_events.enabled:
+            # Persistent newHeads/Transfer subscriptions: receipt waits wake per block, incoming transfers get DMs.
+            from utils.contract_utils import CONTRACT_ADDRESS
+            from bot.events import watch_transfers
+            self._chain_events = asyncio.create_task(chain_events.run(CONTRACT_ADDRESS))
+            self._transfer_watch = asyncio.create_task(watch_transfers())
+        if SHARD_IDS is None or 0 in SHARD_IDS:
+            # Commands are global: in a cluster only the worker running shard 0 syncs them.
+            await self.sync_commands_if_changed()
+        startup.mark("command_sync")
+
+    async def before_identify_hook(self, shard_id, *, initial=False):
+        if shared_store is None:
+            return await super().before_identify_hook(shard_id, initial=initial)
+        bucket = (shard_id or 0) % IDENTIFY_CONCURRENCY
+        await asyncio.to_thread(shared_store.wait_identify_slot, bucket, IDENTIFY_INTERVAL)
+
+    async def close(self):
+        from utils.leaderboards import leaderboards
+        await self.dispatcher.drain()
+        try:
+            if not leaderboards.shared:
+                await asyncio.to_thread(leaderboards.save)
+        except Exception as e:
+            log.error("Saving leaderboards on shutdown failed: %s", e)
+        await super().close()
+
+    async def _preload(self, name, fn):
+        started_at = time.perf_counter()
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            log.error("Preloading %s failed: %s", name, e)
+            return
+        startup.background[name] = time.perf_counter() - started_at
+
+    async def sync_commands_if_changed(self) -> bool:
+        digest = command_tree_hash(self.tree)
+        key = str(self.application_id)
+        try:
+            state = json.loads(COMMAND_SYNC_FILE.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            state = {}
+        if COMMAND_SYNC == "never" or (COMMAND_SYNC == "auto" and state.get(key) == digest):
+            log.info("Command tree unchanged (%s), skipping sync", digest[:12])
+            return False
+        synced = await self.tree.sync()
+        state[key] = digest
+        COMMAND_SYNC_FILE.parent.mkdir(parents=True, exist_ok=True)
+        COMMAND_SYNC_FILE.write_text(json.dumps(state, indent=2), encoding="utf-8")
+        log.info("Synced %d application commands (%s)", len(synced), digest[:12])
+        return True
+
+def _connect_contract():
+    from utils.contract_utils import Token, token_state
+    Token.resolve()
+    token_state.constants()  # first /buy_tokens quote then needs no extra round trip
+
+def _process_signup(signup):
+    # Runs in a worker thread, once per queued OAuth signup. Every step is recorded on the queue row before the
+    # next one starts, so a retry resumes: the wallet is saved before any grant is sent, a grant already sent
+    # is confirmed rather than sent again, and a missing or reverted one is (re)sent.
+    from utils.contract_utils import create_user_wallet, send_initial_eth, send_initial_orv
+    from utils.eth_utils import wait_for_receipt
+    user_id = signup.user_id
+    state_manager.ensure_loaded()
+    state_manager.refresh_user(user_id)
+    wallets = users[user_id].wallets if user_id in users else []
+    address = signup.steps.get("wallet_address")
+    if address is None and wallets:
+        return  # an account from before this signup: nothing to create or grant
+    if address is None or all(w.address != address for w in wallets):
+        # First attempt, or an earlier one died before its wallet was saved (so nothing was granted to it).
+        wallet = create_user_wallet(user_id, users, email=signup.email, ip=signup.ip)
+        signup.record("wallet_address", wallet.address)
+        state_manager.save_user(user_id)
+        address = wallet.address
+        log.info("Generated account for user %s: address %s", user_id, address)
+    for step, grant in (("eth_tx", send_initial_eth), ("orv_tx", send_initial_orv)):
+        if step not in signup.steps:
+            grant(address, on_sent=lambda h, step=step: signup.record(step, h.hex()))
+        tx_hash = signup.steps[step]
+        if wait_for_receipt(tx_hash)["status"] != 1:
+            signup.record(step, None)
+            raise RuntimeError(f"Grant {step} {tx_hash} reverted")
+
+def report_startup():
+    if startup.finish():
+        log.info("Startup: %s", startup.summary())
+
+configure_logging()
+instrument_discord()
+log = logging.getLogger(__name__)
 
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+bot = OrvynBot(command_prefix=COMMAND_PREFIX, intents=intents, tree_cls=OrvynCommandTree, **shard_options())
 
-users = state_manager.get_users()
-referral_codes = load_referral_codes()
+# Bound at import by the command/view modules; filled in place once the store is loaded.
+users = state_manager.users
 
-@bot.event
-async def on_ready():
-    await bot.tree.sync()
-    print(f"Bot connected as {bot.user}")
+registry.gauge_func("orvyn_startup_seconds", "Process start to first gateway READY.", lambda: startup.total or 0)
 
 @bot.tree.command(name="authorize")
 async def authorize(interaction: discord.Interaction):
@@ -61,4 +287,4 @@ async def authorize(interaction: discord.Interaction):
     )
 
 if __name__ == "__main__":
-    bot.run(DISCORD_TOKEN)
+    bot.run(DISCORD_TOKEN, log_handler=None)
@@ -0,0 +1,171 @@
+# bot/cluster.py
+# Cluster mode: a supervisor process that splits the bot's shards across worker processes, each running an
+# AutoShardedBot for its shard range, and restarts workers that exit. Workers share users, nonces and
+# notification dedupe through the SQLite state backend (utils/shared_store.py).
+# Usage:
+#   python -m bot.cluster [--workers 4] [--shards 16|auto] [--no-web]
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "2"))
+CLUSTER_SHARDS = os.getenv("CLUSTER_SHARDS", "auto")
+CLUSTER_WEB = os.getenv("CLUSTER_WEB", "true").lower() in ("1", "true", "yes", "on")
+# Restart backoff doubles per consecutive crash up to the max; a worker that stayed up this long resets it.
+CLUSTER_RESTART_BACKOFF = float(os.getenv("CLUSTER_RESTART_BACKOFF", "1"))
+CLUSTER_RESTART_BACKOFF_MAX = float(os.getenv("CLUSTER_RESTART_BACKOFF_MAX", "60"))
+CLUSTER_HEALTHY_SECONDS = float(os.getenv("CLUSTER_HEALTHY_SECONDS", "60"))
+
+log = logging.getLogger("bot.cluster")
+
+def shard_ranges(shard_count, workers):
+    # Contiguous, near-equal ranges: 10 shards over 3 workers -> [0..3], [4..6], [7..9].
+    workers = max(1, min(workers, shard_count))
+    base, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for i in range(workers):
+        size = base + (1 if i < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return ranges
+
+def recommended_shards():
+    import requests
+    base = os.getenv("DISCORD_API_BASE", "https://discord.com/api/v10").rstrip("/")
+    res = requests.get(f"{base}/gateway/bot", headers={"Authorization": f"Bot {os.environ['DISCORD_TOKEN']}"}, timeout=20)
+    res.raise_for_status()
+    return int(res.json()["shards"])
+
+def run_web():
+    # The OAuth web app, in the supervisor; signups reach the workers through the signup queue.
+    # For more web capacity, set CLUSTER_WEB=false and run web.py (or gunicorn web:app) on its own.
+    try:
+        import waitress  # noqa: F401
+    except ImportError:
+        from utils.flask_app import app
+        app.run(host=os.getenv("FLASK_HOST", "0.0.0.0"), port=int(os.getenv("FLASK_PORT", "5000")), use_reloader=False)
+        return
+    from web import serve
+    serve()
+
+def run_worker(shard_ids, shard_count, index=0):
+    # Entry point of a worker process (spawned, so bot.bot reads the shard env at its first import).
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    os.environ["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    metrics_port = int(os.getenv("METRICS_PORT", "0"))
+    if metrics_port:
+        os.environ["METRICS_PORT"] = str(metrics_port + index)  # one scrape target per worker
+    from bot.bot import bot
+    bot.run(os.environ["DISCORD_TOKEN"], log_handler=None)
+
+class Worker:
+    def __init__(self, shard_ids, shard_count, index=0):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.process = None
+        self.started_at = None
+        self.failures = 0
+        self.restart_at = None
+        self.restarts = 0
+
+    @property
+    def name(self):
+        return f"orvyn-shards-{self.shard_ids[0]}-{self.shard_ids[-1]}"
+
+    def start(self, ctx):
+        self.process = ctx.Process(target=run_worker, args=(self.shard_ids, self.shard_count, self.index), name=self.name)
+        self.process.start()
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        log.info("Started %s (pid %s)", self.name, self.process.pid)
+
+class Supervisor:
+    def __init__(self, shard_count, workers=CLUSTER_WORKERS):
+        self.shard_count = shard_count
+        self.workers = [Worker(ids, shard_count, i) for i, ids in enumerate(shard_ranges(shard_count, workers))]
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+
+    def start(self):
+        log.info("Starting %d shard(s) across %d worker(s)", self.shard_count, len(self.workers))
+        for worker in self.workers:
+            worker.start(self._ctx)
+
+    def poll(self):
+        # Restarts workers that exited; returns the number currently alive.
+        now = time.monotonic()
+        for worker in self.workers:
+            proc = worker.process
+            if proc.is_alive():
+                continue
+            if worker.restart_at is None:
+                if now - worker.started_at >= CLUSTER_HEALTHY_SECONDS:
+                    worker.failures = 0
+                delay = min(CLUSTER_RESTART_BACKOFF * 2 ** worker.failures, CLUSTER_RESTART_BACKOFF_MAX)
+                worker.failures += 1
+                worker.restart_at = now + delay
+                log.warning("%s exited with code %s; restarting in %.1fs", worker.name, proc.exitcode, delay)
+            elif now >= worker.restart_at and not self._stopping.is_set():
+                worker.restarts += 1
+                worker.start(self._ctx)
+        return sum(1 for w in self.workers if w.process.is_alive())
+
+    def run(self, interval=1.0):
+        self.start()
+        while not self._stopping.wait(interval):
+            self.poll()
+        self.shutdown()
+
+    def stop(self, *_):
+        self._stopping.set()
+
+    def shutdown(self, timeout=15.0):
+        self._stopping.set()
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                worker.process.kill()
+        log.info("Cluster stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Orvyn bot as a sharded multi-process cluster")
+    parser.add_argument("--workers", type=int, default=CLUSTER_WORKERS)
+    parser.add_argument("--shards", default=CLUSTER_SHARDS, help="total shard count, or 'auto' for Discord's recommendation")
+    parser.add_argument("--no-web", action="store_true", help="don't run the OAuth web app in the supervisor")
+    args = parser.parse_args()
+
+    # Workers and the web app must see each other's users, nonces and notifications.
+    os.environ["STATE_BACKEND"] = "sqlite"
+    if not os.getenv("DISCORD_TOKEN"):
+        raise RuntimeError("Missing env var: DISCORD_TOKEN")
+
+    from utils.log_utils import configure_logging
+    configure_logging()
+
+    shard_count = recommended_shards() if args.shards == "auto" else int(args.shards)
+    if CLUSTER_WEB and not args.no_web:
+        threading.Thread(target=run_web, name="orvyn-web", daemon=True).start()
+
+    supervisor = Supervisor(shard_count, args.workers)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    supervisor.run()
+
+if __name__ == "__main__":
+    sys.exit(main())
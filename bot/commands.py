@@ -1,43 +1,54 @@
 import discord
+from typing import Optional
 from discord import app_commands
-from bot.bot import bot, users, referral_codes
-from utils.contract_utils import transfer_tokens, send_eth_to_contract, get_balances, get_total_balances
-from utils.data_utils import log_transaction, load_transactions, save_users, load_users, reload_users
-from bot.views import WalletNavigationView, SettingsNavigationView, RenameWalletModal, ImportWalletModal, TransactionModal, SelectWalletView
-from utils.embed_utils import generate_wallet_embed, generate_settings_embed
-from utils.encryption_utils import decrypt
+from web3 import Web3
+from bot.bot import bot, users
+from utils.contract_utils import transfer_tokens, get_balances, get_total_balances, quote_purchase
+from utils.state_manager import state_manager
+from bot.views import WalletNavigationView, SettingsNavigationView, RenameWalletModal, ImportWalletModal, TransactionModal, SelectWalletView, HistoryView, PurchaseQuoteView, purchase_referrer
+from utils.embed_utils import generate_wallet_embed, generate_settings_embed, generate_leaderboard_embed, generate_history_embed, generate_stats_embed, generate_purchase_quote_embed
+from utils.leaderboards import BOARDS
+from utils.history_store import history_store, KINDS
+from utils.analytics import analytics, STATS_DEFAULT_DAYS
+from bot.jobs import jobs, JobQueueFull
+from utils.tracing import traced_interaction
 
 import logging
 
-logging.basicConfig(level=logging.DEBUG)
+log = logging.getLogger(__name__)
 
 def update_user_info(user_id):
-    global users
-    if user_id not in users or len(users[user_id]['wallets']) == 0:
-        reload_users()
-        logging.debug(f"Users loaded: {users}")
-        if user_id not in users or len(users[user_id]['wallets']) == 0:
+    if user_id not in users or len(users[user_id].wallets) == 0:
+        # The account may have been created by the web tier or another shard since this process loaded.
+        state_manager.refresh_user(user_id)
+        log.debug("Refreshed user %s from the store (%d accounts)", user_id, len(users))
+        if user_id not in users or len(users[user_id].wallets) == 0:
             return False
     return True
 
 @bot.tree.command(name="buy_tokens")
+@traced_interaction("command.buy_tokens")
 async def buy_tokens_command(interaction: discord.Interaction, amount_eth: float):
+    # Quotes first: the purchase is only sent from the Confirm button (PurchaseButton in bot/views.py).
     user_id = str(interaction.user.id)
     if update_user_info(user_id):
-        user_info = users[user_id]['wallets'][0]
-        sender_private_key = decrypt(user_info["private_key"], user_info["password"])
-        sender_address = user_info["address"]
-        referrer_id = user_info["referrer"]
-        referrer_address = users.get(referrer_id, {'wallets': [{'address': '0x0000000000000000000000000000000000000000'}]})['wallets'][0]['address']
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        wallet = users[user_id].wallets[0]
+        value_wei = Web3.to_wei(amount_eth, "ether")
         try:
-            tx_hash = send_eth_to_contract(sender_private_key, sender_address, amount_eth, referrer_address)
-            if tx_hash:
-                await interaction.response.send_message(
-                    f"You sent {amount_eth} ETH to purchase ORV. Transaction hash: {tx_hash.hex()}",
-                    ephemeral=True
-                )
+            quote = await jobs.run(user_id, quote_purchase, wallet.address, value_wei, purchase_referrer(wallet))
+        except JobQueueFull as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
         except Exception as e:
-            await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+            await interaction.followup.send(f"An error occurred: {e}", ephemeral=True)
+            return
+        if quote.ok:
+            await interaction.followup.send(
+                embed=generate_purchase_quote_embed(quote), view=PurchaseQuoteView(user_id, value_wei), ephemeral=True
+            )
+        else:
+            await interaction.followup.send(f"This purchase would fail: {quote.error}", ephemeral=True)
     else:
         await interaction.response.send_message(
             "No account found. Please authenticate via OAuth2 to create an account.",
@@ -45,21 +56,25 @@ async def buy_tokens_command(interaction: discord.Interaction, amount_eth: float
         )
 
 @bot.tree.command(name="history")
-async def history_command(interaction: discord.Interaction):
+@app_commands.describe(kind="Only show one kind of transaction")
+@app_commands.choices(kind=[app_commands.Choice(name=label, value=value) for value, label in KINDS.items()])
+@traced_interaction("command.history")
+async def history_command(interaction: discord.Interaction, kind: Optional[app_commands.Choice[str]] = None):
     user_id = str(interaction.user.id)
     if update_user_info(user_id):
-        transactions = load_transactions()
-        if user_id in transactions:
-            embed = discord.Embed(title="Transaction History", color=discord.Color.blue())
-            for tx in transactions[user_id]:
-                embed.add_field(
-                    name=f"Transaction {tx['hash']}",
-                    value=f"From: {tx['from']}\nTo: {tx['to']}\nValue: {tx['value']} ORV",
-                    inline=False
-                )
-            await interaction.response.send_message(embed=embed, ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        kind = kind.value if kind else None
+        try:
+            page = await jobs.run(user_id, history_store.page, user_id, kind)
+        except JobQueueFull as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
+        if page.entries or kind:
+            await interaction.followup.send(
+                embed=generate_history_embed(page, kind), view=HistoryView(user_id, page, kind), ephemeral=True
+            )
         else:
-            await interaction.response.send_message("No transactions found.", ephemeral=True)
+            await interaction.followup.send("No transactions found.", ephemeral=True)
     else:
         await interaction.response.send_message(
             "No account found. Please authenticate via OAuth2 to create an account.",
@@ -67,38 +82,41 @@ async def history_command(interaction: discord.Interaction):
         )
 
 @bot.tree.command(name="wallet")
+@traced_interaction("command.wallet")
 async def wallet_command(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
-    logging.debug(f"User ID: {user_id}")
+    log.debug("/wallet requested by %s", user_id)
     if update_user_info(user_id):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
-            logging.debug(f"User {user_id} found in data: {users[user_id]}")
-            embed = generate_wallet_embed(user_id, 0)
+            log.debug("User %s has %d wallet(s)", user_id, len(users[user_id].wallets))
+            embed = await jobs.run(user_id, generate_wallet_embed, user_id, 0)
             view = WalletNavigationView(user_id)
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+            await interaction.edit_original_response(embed=embed, view=view)
+        except JobQueueFull as e:
+            await interaction.edit_original_response(content=str(e))
         except KeyError as e:
-            logging.error(f"Error: Unable to find wallet information. {e}")
-            await interaction.response.send_message(
-                f"Error: Unable to find wallet information. {e} Please contact the administrator.",
-                ephemeral=True
+            log.error("Unable to find wallet information for %s: %s", user_id, e)
+            await interaction.edit_original_response(
+                content=f"Error: Unable to find wallet information. {e} Please contact the administrator."
             )
         except Exception as e:
-            logging.error(f"Unexpected error: {e}")
-            await interaction.response.send_message(
-                f"Unexpected error: {e}. Please contact the administrator.",
-                ephemeral=True
+            log.exception("Unexpected error in /wallet for %s", user_id)
+            await interaction.edit_original_response(
+                content=f"Unexpected error: {e}. Please contact the administrator."
             )
     else:
-        logging.warning(f"No account found for user {user_id}.")
+        log.info("No account found for user %s", user_id)
         await interaction.response.send_message(
             "No account found. Please authenticate via OAuth2 to create an account.",
             ephemeral=True
         )
 
 @bot.tree.command(name="transaction")
+@traced_interaction("command.transaction")
 async def transaction_command(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
-    if update_user_info(user_id) and len(users[user_id]['wallets']) > 0:
+    if update_user_info(user_id) and len(users[user_id].wallets) > 0:
         view = SelectWalletView(user_id)
         await interaction.response.send_message("Select the wallet for the transaction:", view=view, ephemeral=True)
     else:
@@ -108,6 +126,7 @@ async def transaction_command(interaction: discord.Interaction):
         )
 
 @bot.tree.command(name="settings")
+@traced_interaction("command.settings")
 async def settings_command(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     if update_user_info(user_id):
@@ -119,3 +138,29 @@ async def settings_command(interaction: discord.Interaction):
             "No account found. Please authenticate via OAuth2 to create an account.",
             ephemeral=True
         )
+
+@bot.tree.command(name="leaderboard")
+@app_commands.describe(board="Which ranking to show")
+@app_commands.choices(board=[app_commands.Choice(name=name.capitalize(), value=name) for name in BOARDS])
+@traced_interaction("command.leaderboard")
+async def leaderboard_command(interaction: discord.Interaction, board: app_commands.Choice[str]):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        embed = await jobs.run(str(interaction.user.id), generate_leaderboard_embed, board.value)
+    except JobQueueFull as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="stats")
+@app_commands.describe(days="How many days back, today included")
+@app_commands.default_permissions(manage_guild=True)
+@traced_interaction("command.stats")
+async def stats_command(interaction: discord.Interaction, days: app_commands.Range[int, 1, 365] = STATS_DEFAULT_DAYS):
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    try:
+        stats = await jobs.run(str(interaction.user.id), analytics.summary, days)
+    except JobQueueFull as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    await interaction.followup.send(embed=generate_stats_embed(stats), ephemeral=True)
@@ -1,15 +1,24 @@
+import asyncio
+import logging
 import discord
 from discord.ext import commands
-from bot.bot import bot, users, referral_codes
-from utils.data_utils import load_users, save_users, load_referral_codes, log_notification, has_user_been_notified
+from bot.bot import bot, users, observe_command, report_startup
+from utils.data_utils import claim_notification, get_user_ids_by_addresses
+from utils.state_manager import state_manager
+from utils.chain_events import chain_events
+from utils.contract_utils import TOKEN_DECIMALS, token_state
+
+log = logging.getLogger(__name__)
 
 @bot.event
 async def on_ready():
-    global users, referral_codes
-    users = load_users()
-    referral_codes = load_referral_codes()
-    await bot.tree.sync()
-    print(f"Bot connected as {bot.user}")
+    # Fires on every gateway (re)connect; one-time setup lives in OrvynBot.setup_hook.
+    log.info("Bot connected as %s", bot.user)
+    report_startup()
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command):
+    observe_command(interaction, command.qualified_name)
 
 @bot.event
 async def on_command_error(ctx: commands.Context, error: commands.CommandError):
@@ -20,7 +29,28 @@ async def on_command_error(ctx: commands.Context, error: commands.CommandError):
 
 @bot.event
 async def on_transaction_complete(tx_hash: str, sender_id: int, recipient_id: int, amount: float):
-    recipient = bot.get_user(recipient_id)
-    if recipient and not has_user_been_notified(recipient_id, tx_hash):
-        await recipient.send(f"You received {amount} ORV.")
-        log_notification(recipient_id, tx_hash)
+    if await asyncio.to_thread(claim_notification, recipient_id, tx_hash):
+        bot.dispatcher.notify_user(recipient_id, f"You received {amount} ORV.", tx_hash)
+
+def _claim_incoming(transfers):
+    # -> [(user_id, transfer)] for transfers to a known wallet that nobody has been notified about yet.
+    state_manager.ensure_loaded()
+    owners = get_user_ids_by_addresses({t["to"] for t in transfers}, dict(users))  # the loop may add users meanwhile
+    return [(owners[t["to"]], t) for t in transfers if owners.get(t["to"]) and claim_notification(owners[t["to"]], t["hash"])]
+
+async def watch_transfers():
+    # Every token Transfer to a player's wallet, including ones sent from outside the bot. The notification
+    # claim also dedupes against the bot's own transfers and against other cluster workers.
+    async with chain_events.transfers() as transfers:
+        async for transfer in transfers:
+            received = [transfer, *transfers.drain()]
+            token_state.observe(received)  # purchases and grants move the owner's stock; reorgs too
+            batch = [t for t in received if not t["removed"]]
+            try:
+                claimed = await asyncio.to_thread(_claim_incoming, batch)
+            except Exception as e:
+                log.error("Handling %d incoming transfer(s) failed: %s", len(batch), e)
+                continue
+            for user_id, t in claimed:
+                text = f"You received {t['value'] / 10 ** TOKEN_DECIMALS} ORV from {t['from']}."
+                bot.dispatcher.notify_user(user_id, text, t["hash"])
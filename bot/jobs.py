@@ -0,0 +1,104 @@
+import os
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import registry
+
+JOB_MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", "8"))
+JOB_MAX_PER_USER = int(os.getenv("JOB_MAX_PER_USER", "1"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "200"))
+
+JOB_WAIT_SECONDS = registry.histogram("orvyn_job_wait_seconds", "Time a job waited for a free slot.")
+JOB_RUN_SECONDS = registry.histogram("orvyn_job_run_seconds", "Time a job spent running.")
+JOB_REJECTED = registry.counter("orvyn_job_rejected_total", "Jobs rejected because the queue was full.")
+
+class JobQueueFull(Exception):
+    pass
+
+# Runs blocking chain/file work off the event loop, bounded globally and per user.
+class JobExecutor:
+    def __init__(self, max_concurrency=JOB_MAX_CONCURRENCY, max_per_user=JOB_MAX_PER_USER, max_queued=JOB_MAX_QUEUED):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_queued = max_queued
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="orvyn-job")
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._user_slots = {}
+        self._user_refs = {}
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _acquire_user_slot(self, user_id):
+        slot = self._user_slots.get(user_id)
+        if slot is None:
+            slot = self._user_slots[user_id] = asyncio.Semaphore(self.max_per_user)
+        self._user_refs[user_id] = self._user_refs.get(user_id, 0) + 1
+        return slot
+
+    def _release_user_slot(self, user_id):
+        self._user_refs[user_id] -= 1
+        if self._user_refs[user_id] == 0:
+            del self._user_refs[user_id]
+            del self._user_slots[user_id]
+
+    async def run(self, user_id, fn, *args, **kwargs):
+        if self.queued >= self.max_queued:
+            self.rejected += 1
+            JOB_REJECTED.inc()
+            raise JobQueueFull("Too many pending requests, please try again in a moment.")
+
+        enqueued_at = time.perf_counter()
+        self.queued += 1
+        waiting = True
+        slot = self._acquire_user_slot(user_id)
+        try:
+            async with slot, self._global:
+                waiting = False
+                self.queued -= 1
+                waited = time.perf_counter() - enqueued_at
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                JOB_WAIT_SECONDS.observe(waited)
+                self.running += 1
+                started_at = time.perf_counter()
+                try:
+                    loop = asyncio.get_running_loop()
+                    # run_in_executor does not carry contextvars over; copy them so trace spans nest under the interaction.
+                    ctx = contextvars.copy_context()
+                    result = await loop.run_in_executor(self._pool, functools.partial(ctx.run, fn, *args, **kwargs))
+                    self.completed += 1
+                    return result
+                except Exception:
+                    self.failed += 1
+                    raise
+                finally:
+                    self.running -= 1
+                    JOB_RUN_SECONDS.observe(time.perf_counter() - started_at)
+        finally:
+            if waiting:
+                self.queued -= 1
+            self._release_user_slot(user_id)
+
+    def snapshot(self):
+        started = self.completed + self.failed + self.running
+        return {
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_seconds_avg": self.wait_total / started if started else 0.0,
+            "wait_seconds_max": self.wait_max,
+        }
+
+jobs = JobExecutor()
+
+registry.gauge_func("orvyn_job_queue_depth", "Jobs waiting for a slot.", lambda: jobs.queued)
+registry.gauge_func("orvyn_job_running", "Jobs currently running.", lambda: jobs.running)
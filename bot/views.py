@@ -1,75 +1,151 @@
 import os
-import json
 import discord
-from discord.ui import View, Modal, Select, TextInput, Button
+from discord.ui import View, Modal, Select, TextInput, Button, DynamicItem
 from web3 import Account, Web3
 
-from utils.contract_utils import transfer_tokens, get_transaction_details
-from bot.bot import users, referral_codes, bot
-from utils.embed_utils import generate_wallet_embed, generate_settings_embed
-from utils.encryption_utils import decrypt, encrypt, generate_random_password
+from utils.contract_utils import transfer_tokens, get_transaction_details, send_eth_to_contract, quote_purchase, ZERO_ADDRESS
+from bot.bot import users, bot
+from utils.embed_utils import generate_wallet_embed, generate_settings_embed, generate_history_embed, format_orv
+from utils.encryption_utils import decrypt, generate_random_password
+from utils.crypto_pool import crypto_pool
+from utils.state_manager import state_manager
+from utils.referrals import referrals
+from utils.history_store import history_store, KINDS
+from utils.models import User, Wallet
+from bot.jobs import jobs, JobQueueFull
+from utils.tracing import traced_interaction, span
 
 TX_CHANNEL_ID = int(os.getenv("DISCORD_TX_CHANNEL_ID", "0"))
-
-class WalletNavigationView(View):
-    def __init__(self, user_id, wallet_index=0):
-        super().__init__()
+# Modals are the only per-interaction UI objects left; one the user dismissed is dropped after this long.
+MODAL_TIMEOUT = float(os.getenv("DISCORD_MODAL_TIMEOUT", "900"))
+
+# Panels carry their state in component custom_ids ("orvyn:<panel>:<action>:<user id>:..."). Each component
+# type below is a DynamicItem registered once at startup, so clicks are routed by matching the custom_id:
+# nothing is kept per open panel, and buttons on messages sent before a restart keep working.
+
+class StatelessView(View):
+    """A view made only of DynamicItems. It is stopped right away: a finished view still renders its
+    components but is never added to the view store."""
+
+    def __init__(self, *items):
+        super().__init__(timeout=None)
+        for item in items:
+            self.add_item(item)
+        self.stop()
+
+class OwnedItem:
+    # Panels are per user; anyone else clicking a copied/forwarded component gets a refusal.
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if str(interaction.user.id) == self.user_id:
+            return True
+        await interaction.response.send_message("This panel belongs to someone else.", ephemeral=True)
+        return False
+
+def _wallet_count(user_id):
+    user = users.get(user_id)
+    return len(user.wallets) if user else 0
+
+async def _no_account(interaction: discord.Interaction):
+    await interaction.response.send_message(
+        "No account found. Please authenticate via OAuth2 to create an account.", ephemeral=True)
+
+# action -> (label, style), in display order
+WALLET_ACTIONS = {
+    "prev": ("Previous", discord.ButtonStyle.secondary),
+    "next": ("Next", discord.ButtonStyle.secondary),
+    "rename": ("Rename", discord.ButtonStyle.primary),
+    "import": ("Import Wallet", discord.ButtonStyle.success),
+    "key": ("🔑", discord.ButtonStyle.danger),
+    "show": ("Show", discord.ButtonStyle.danger),
+    "close": ("Close", discord.ButtonStyle.secondary),
+}
+
+class WalletButton(OwnedItem, DynamicItem[Button],
+                   template=r"orvyn:wallet:(?P<action>[a-z]+):(?P<user_id>\d+):(?P<index>\d+)"):
+    def __init__(self, action, user_id, wallet_index):
+        label, style = WALLET_ACTIONS[action]
+        super().__init__(Button(label=label, style=style, custom_id=f"orvyn:wallet:{action}:{user_id}:{wallet_index}"))
+        self.action = action
         self.user_id = user_id
         self.wallet_index = wallet_index
 
-    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
-    async def previous_wallet(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.wallet_index = (self.wallet_index - 1) % len(users[self.user_id]['wallets'])
-        await interaction.response.edit_message(embed=generate_wallet_embed(self.user_id, self.wallet_index), view=self)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        if match["action"] not in WALLET_ACTIONS:
+            raise ValueError(f"Unknown wallet action {match['action']!r}")
+        return cls(match["action"], match["user_id"], int(match["index"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        count = _wallet_count(self.user_id)
+        if not count:
+            await _no_account(interaction)
+            return
+        await getattr(self, f"_{self.action}")(interaction, self.wallet_index % count, count)
+
+    async def _show_wallet(self, interaction: discord.Interaction, wallet_index):
+        await interaction.response.defer()
+        try:
+            embed = await jobs.run(self.user_id, generate_wallet_embed, self.user_id, wallet_index)
+        except JobQueueFull as e:
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
+        await interaction.edit_original_response(embed=embed, view=WalletNavigationView(self.user_id, wallet_index))
+
+    @traced_interaction("wallet_navigation_view.previous_wallet")
+    async def _prev(self, interaction: discord.Interaction, wallet_index, count):
+        await self._show_wallet(interaction, (wallet_index - 1) % count)
 
-    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
-    async def next_wallet(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.wallet_index = (self.wallet_index + 1) % len(users[self.user_id]['wallets'])
-        await interaction.response.edit_message(embed=generate_wallet_embed(self.user_id, self.wallet_index), view=self)
+    @traced_interaction("wallet_navigation_view.next_wallet")
+    async def _next(self, interaction: discord.Interaction, wallet_index, count):
+        await self._show_wallet(interaction, (wallet_index + 1) % count)
 
-    @discord.ui.button(label="Rename", style=discord.ButtonStyle.primary)
-    async def rename_wallet(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_modal(RenameWalletModal(self.user_id, self.wallet_index))
+    @traced_interaction("wallet_navigation_view.rename_wallet")
+    async def _rename(self, interaction: discord.Interaction, wallet_index, count):
+        await interaction.response.send_modal(RenameWalletModal(self.user_id, wallet_index))
 
-    @discord.ui.button(label="Import Wallet", style=discord.ButtonStyle.success)
-    async def import_wallet(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @traced_interaction("wallet_navigation_view.import_wallet")
+    async def _import(self, interaction: discord.Interaction, wallet_index, count):
         await interaction.response.send_modal(ImportWalletModal(self.user_id))
 
-    @discord.ui.button(label="🔑", style=discord.ButtonStyle.danger)
-    async def show_private_key(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @traced_interaction("wallet_navigation_view.show_private_key")
+    async def _key(self, interaction: discord.Interaction, wallet_index, count):
         await interaction.response.send_message(
-            embed=generate_private_key_warning_embed(self.user_id, self.wallet_index),
-            view=ShowPrivateKeyView(self.user_id, self.wallet_index),
+            embed=generate_private_key_warning_embed(self.user_id, wallet_index),
+            view=ShowPrivateKeyView(self.user_id, wallet_index),
             ephemeral=True
         )
 
-class ShowPrivateKeyView(View):
-    def __init__(self, user_id, wallet_index):
-        super().__init__()
-        self.user_id = user_id
-        self.wallet_index = wallet_index
-
-    @discord.ui.button(label="Show", style=discord.ButtonStyle.danger)
-    async def show(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.send_modal(ShowPrivateKeyModal(self.user_id, self.wallet_index))
+    @traced_interaction("show_private_key_view.show")
+    async def _show(self, interaction: discord.Interaction, wallet_index, count):
+        await interaction.response.send_modal(ShowPrivateKeyModal(self.user_id, wallet_index))
 
-    @discord.ui.button(label="Close", style=discord.ButtonStyle.secondary)
-    async def close(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @traced_interaction("show_private_key_view.close")
+    async def _close(self, interaction: discord.Interaction, wallet_index, count):
         await interaction.response.edit_message(content="Action canceled.", embed=None, view=None)
 
+class WalletNavigationView(StatelessView):
+    def __init__(self, user_id, wallet_index=0):
+        super().__init__(*(WalletButton(a, user_id, wallet_index) for a in ("prev", "next", "rename", "import", "key")))
+
+class ShowPrivateKeyView(StatelessView):
+    def __init__(self, user_id, wallet_index):
+        super().__init__(WalletButton("show", user_id, wallet_index), WalletButton("close", user_id, wallet_index))
+
 class ShowPrivateKeyModal(Modal, title="Show Private Key"):
     password = TextInput(label="Password", style=discord.TextStyle.short, required=True)
 
     def __init__(self, user_id, wallet_index):
-        super().__init__()
+        super().__init__(timeout=MODAL_TIMEOUT)
         self.user_id = user_id
         self.wallet_index = wallet_index
 
+    @traced_interaction("show_private_key_modal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
-        private_key_encrypted = users[self.user_id]['wallets'][self.wallet_index]['private_key']
-        stored_password = users[self.user_id]['wallets'][self.wallet_index]['password']
+        wallet = users[self.user_id].wallets[self.wallet_index]
+        private_key_encrypted = wallet.private_key
+        stored_password = wallet.password
         if self.password.value == stored_password:
-            private_key = decrypt(private_key_encrypted, stored_password)
+            private_key = await crypto_pool.decrypt(private_key_encrypted, stored_password)
             if private_key:
                 await interaction.response.edit_message(content=f"Private key: ||{private_key}||", embed=None, view=None)
             else:
@@ -81,54 +157,68 @@ class ImportWalletModal(Modal, title="Import Wallet"):
     private_key = TextInput(label="Private Key", style=discord.TextStyle.short)
 
     def __init__(self, user_id):
-        super().__init__()
+        super().__init__(timeout=MODAL_TIMEOUT)
         self.user_id = user_id
 
+    @traced_interaction("import_wallet_modal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         try:
             account = Account.from_key(self.private_key.value)
-            password = generate_random_password()
-            if self.user_id not in users:
-                users[self.user_id] = {'email': None, 'ip': None, 'wallets': []}
-            wallet_name = f"Wallet {len(users[self.user_id]['wallets']) + 1}"
-            users[self.user_id]['wallets'].append({
-                "private_key": encrypt(self.private_key.value, password),
-                "address": account.address,
-                "name": wallet_name,
-                "referrer": None,
-                "password": password
-            })
-            with open("data/users.json", "w") as file:
-                json.dump(users, file, indent=4)
-
-            await interaction.response.send_message(
-                f"Wallet imported successfully!\nAddress: {account.address}", ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"Error importing wallet: {e}", ephemeral=True)
+            await interaction.followup.send(f"Error importing wallet: {e}", ephemeral=True)
+            return
+        password = generate_random_password()
+        encrypted_private_key = await crypto_pool.encrypt(self.private_key.value, password)
+        user = users.get(self.user_id)
+        created = user is None
+        if created:
+            user = users[self.user_id] = User()
+        wallet = Wallet(account.address, encrypted_private_key, password, f"Wallet {len(user.wallets) + 1}")
+        user.wallets.append(wallet)
+        try:
+            await jobs.run(self.user_id, state_manager.save_user, self.user_id)
+        except Exception as e:
+            # Not persisted: drop it again rather than keep a wallet the user was told failed to import.
+            user.wallets.remove(wallet)
+            if created and not user.wallets:
+                users.pop(self.user_id, None)
+            message = str(e) if isinstance(e, JobQueueFull) else f"Error importing wallet: {e}"
+            await interaction.followup.send(message, ephemeral=True)
+            return
+        await interaction.followup.send(f"Wallet imported successfully!\nAddress: {account.address}", ephemeral=True)
 
 class RenameWalletModal(Modal, title="Rename Wallet"):
     new_name = TextInput(label="New name", style=discord.TextStyle.short)
 
     def __init__(self, user_id, wallet_index):
-        super().__init__()
+        super().__init__(timeout=MODAL_TIMEOUT)
         self.user_id = user_id
         self.wallet_index = wallet_index
 
+    @traced_interaction("rename_wallet_modal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True, thinking=True)
         new_name = self.new_name.value
-        users[self.user_id]['wallets'][self.wallet_index]['name'] = new_name
-        with open("data/users.json", "w") as file:
-            json.dump(users, file, indent=4)
-        await interaction.response.send_message(f"Wallet renamed to: {new_name}", ephemeral=True)
+        wallet = users[self.user_id].wallets[self.wallet_index]
+        old_name, wallet.name = wallet.name, new_name
+        try:
+            await jobs.run(self.user_id, state_manager.save_user, self.user_id)
+        except JobQueueFull as e:
+            wallet.name = old_name
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
+        await interaction.followup.send(f"Wallet renamed to: {new_name}", ephemeral=True)
 
 class TransactionModal(Modal, title="Make a Transaction"):
     recipient = TextInput(label="Recipient Address", style=discord.TextStyle.short)
     amount = TextInput(label="Amount to Send (ORV)", style=discord.TextStyle.short)
 
     def __init__(self, wallet_index):
-        super().__init__()
+        super().__init__(timeout=MODAL_TIMEOUT)
         self.wallet_index = wallet_index
 
+    @traced_interaction("transaction_modal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
         sender_id = str(interaction.user.id)
         if sender_id not in users:
@@ -138,23 +228,14 @@ class TransactionModal(Modal, title="Make a Transaction"):
             )
             return
 
-        sender_info = users[sender_id]['wallets'][self.wallet_index]
-        sender_private_key = decrypt(sender_info["private_key"], sender_info["password"])
-        sender_address = sender_info["address"]
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        sender_wallet = users[sender_id].wallets[self.wallet_index]
         recipient_address = self.recipient.value
-        amount = float(self.amount.value)
 
         try:
-            tx_hash = transfer_tokens(
-                interaction,
-                sender_private_key,
-                Web3.to_checksum_address(sender_address),
-                Web3.to_checksum_address(recipient_address),
-                amount,
-                bot
-            )
-            if tx_hash:
-                tx_details = get_transaction_details(tx_hash, bot, users)
+            amount = float(self.amount.value)
+            tx_details = await jobs.run(sender_id, _execute_transfer, interaction, sender_wallet, recipient_address, amount)
+            if tx_details:
                 embed = discord.Embed(title="Transaction Successful", color=discord.Color.green())
                 embed.add_field(name="Transaction Hash", value=tx_details['hash'], inline=False)
                 embed.add_field(name="From", value=tx_details['from'], inline=True)
@@ -167,63 +248,233 @@ class TransactionModal(Modal, title="Make a Transaction"):
                     channel = None
 
                 if channel:
-                    await channel.send(embed=embed)
+                    # Queued: during a busy payout it goes out with other transfers, up to ten embeds per message.
+                    bot.dispatcher.post_embed(channel.id, embed)
+                    await interaction.followup.send("Transaction succeeded and was posted to the channel.", ephemeral=True)
                 else:
                     await interaction.followup.send("Transaction succeeded, but the target channel was not found.", ephemeral=True)
-
-                await interaction.response.send_message("Transaction succeeded and was posted to the channel.", ephemeral=True)
             else:
-                await interaction.response.send_message("Transaction failed.", ephemeral=True)
+                await interaction.followup.send("Transaction failed.", ephemeral=True)
+        except JobQueueFull as e:
+            await interaction.followup.send(str(e), ephemeral=True)
         except Exception as e:
-            await interaction.response.send_message(f"An error occurred: {e}", ephemeral=True)
+            await interaction.followup.send(f"An error occurred: {e}", ephemeral=True)
+
+def _execute_transfer(interaction, sender_wallet, recipient_address, amount):
+    with span("decrypt"):
+        sender_private_key = decrypt(sender_wallet.private_key, sender_wallet.password)
+    tx_hash = transfer_tokens(
+        interaction,
+        sender_private_key,
+        sender_wallet.address,
+        Web3.to_checksum_address(recipient_address),
+        amount,
+        bot
+    )
+    if not tx_hash:
+        return None
+    return get_transaction_details(tx_hash, bot, users)
+
+class WalletSelect(OwnedItem, DynamicItem[Select], template=r"orvyn:transfer:select:(?P<user_id>\d+)"):
+    def __init__(self, user_id, options=None):
+        if options is None:
+            options = [
+                discord.SelectOption(label=wallet.name, value=str(index))
+                for index, wallet in enumerate(users[user_id].wallets)
+            ]
+        super().__init__(Select(
+            placeholder="Select a wallet",
+            min_values=1,
+            max_values=1,
+            options=options,
+            custom_id=f"orvyn:transfer:select:{user_id}"
+        ))
+        self.user_id = user_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Select, match):
+        return cls(match["user_id"], options=item.options)
+
+    @traced_interaction("select_wallet_view.select_wallet")
+    async def callback(self, interaction: discord.Interaction):
+        selected_wallet_index = int(self.item.values[0])
+        await interaction.response.send_modal(TransactionModal(selected_wallet_index))
 
-class SelectWalletView(View):
+class SelectWalletView(StatelessView):
     def __init__(self, user_id):
-        super().__init__()
+        super().__init__(WalletSelect(user_id))
+
+class HistoryButton(OwnedItem, DynamicItem[Button],
+                    template=r"orvyn:history:(?P<slot>prev|next):(?P<user_id>\d+):(?P<kind>[a-z_]+):(?P<cursor>[A-Za-z0-9_-]*)"):
+    # The cursor of the page this button leads to; empty (and the button disabled) at either end.
+    def __init__(self, slot, user_id, kind, cursor):
+        super().__init__(Button(
+            label="Previous" if slot == "prev" else "Next",
+            style=discord.ButtonStyle.secondary,
+            disabled=not cursor,
+            custom_id=f"orvyn:history:{slot}:{user_id}:{kind or 'all'}:{cursor or ''}",
+        ))
+        self.slot = slot
         self.user_id = user_id
-        self.select = Select(
-            placeholder="Select a wallet",
+        self.kind = kind
+        self.cursor = cursor
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        kind = None if match["kind"] == "all" else match["kind"]
+        return cls(match["slot"], match["user_id"], kind, match["cursor"] or None)
+
+    @traced_interaction("history_view.page")
+    async def callback(self, interaction: discord.Interaction):
+        await _show_history_page(interaction, self.user_id, self.kind, self.cursor)
+
+class HistoryFilter(OwnedItem, DynamicItem[Select], template=r"orvyn:history:filter:(?P<user_id>\d+)"):
+    def __init__(self, user_id, kind=None):
+        super().__init__(Select(
+            placeholder="Filter",
             min_values=1,
             max_values=1,
-            options=[
-                discord.SelectOption(label=wallet['name'], value=str(index))
-                for index, wallet in enumerate(users[self.user_id]['wallets'])
+            options=[discord.SelectOption(label="All", value="all", default=kind is None)] + [
+                discord.SelectOption(label=label, value=value, default=value == kind)
+                for value, label in KINDS.items()
             ],
-            custom_id="select_wallet"
+            custom_id=f"orvyn:history:filter:{user_id}",
+        ))
+        self.user_id = user_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Select, match):
+        return cls(match["user_id"])
+
+    @traced_interaction("history_view.select_filter")
+    async def callback(self, interaction: discord.Interaction):
+        value = self.item.values[0]
+        await _show_history_page(interaction, self.user_id, None if value == "all" else value)
+
+async def _show_history_page(interaction: discord.Interaction, user_id, kind, cursor=None):
+    await interaction.response.defer()
+    try:
+        page = await jobs.run(user_id, history_store.page, user_id, kind, cursor)
+    except JobQueueFull as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+    await interaction.edit_original_response(embed=generate_history_embed(page, kind), view=HistoryView(user_id, page, kind))
+
+class HistoryView(StatelessView):
+    def __init__(self, user_id, page, kind=None):
+        super().__init__(
+            HistoryButton("prev", user_id, kind, page.prev_cursor),
+            HistoryButton("next", user_id, kind, page.next_cursor),
+            HistoryFilter(user_id, kind),
         )
-        self.select.callback = self.select_wallet
-        self.add_item(self.select)
 
-    async def select_wallet(self, interaction: discord.Interaction):
-        selected_wallet_index = int(self.select.values[0])
-        await interaction.response.send_modal(TransactionModal(selected_wallet_index))
+def purchase_referrer(wallet):
+    referrer = users.get(wallet.referrer)
+    return referrer.wallets[0].address if referrer and referrer.wallets else ZERO_ADDRESS
+
+def _buy_tokens(wallet, value_wei):
+    # Quoted again at confirm time: the owner's stock or the buyer's ETH may have moved since the quote was shown.
+    referrer_address = purchase_referrer(wallet)
+    quote = quote_purchase(wallet.address, value_wei, referrer_address)
+    if not quote.ok:
+        return quote, None
+    with span("decrypt"):
+        sender_private_key = decrypt(wallet.private_key, wallet.password)
+    amount_eth = Web3.from_wei(value_wei, "ether")
+    return quote, send_eth_to_contract(sender_private_key, wallet.address, amount_eth, referrer_address)
+
+class PurchaseButton(OwnedItem, DynamicItem[Button],
+                     template=r"orvyn:buy:(?P<action>confirm|cancel):(?P<user_id>\d+):(?P<value>\d+)"):
+    # The quoted amount rides in the custom_id (wei); the purchase itself is re-checked when confirmed.
+    def __init__(self, action, user_id, value_wei):
+        super().__init__(Button(
+            label="Confirm" if action == "confirm" else "Cancel",
+            style=discord.ButtonStyle.success if action == "confirm" else discord.ButtonStyle.secondary,
+            custom_id=f"orvyn:buy:{action}:{user_id}:{value_wei}",
+        ))
+        self.action = action
+        self.user_id = user_id
+        self.value_wei = value_wei
 
-class SettingsNavigationView(View):
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        return cls(match["action"], match["user_id"], int(match["value"]))
+
+    @traced_interaction("purchase_view.press")
+    async def callback(self, interaction: discord.Interaction):
+        if self.action == "cancel":
+            await interaction.response.edit_message(content="Purchase canceled.", embed=None, view=None)
+            return
+        if not _wallet_count(self.user_id):
+            await _no_account(interaction)
+            return
+        # Buttons go first, so a double click cannot buy twice.
+        await interaction.response.edit_message(content="Submitting purchase…", view=None)
+        amount_eth = Web3.from_wei(self.value_wei, "ether")
+        try:
+            quote, tx_hash = await jobs.run(self.user_id, _buy_tokens, users[self.user_id].wallets[0], self.value_wei)
+        except JobQueueFull as e:
+            await interaction.edit_original_response(content=str(e), embed=None)
+            return
+        except Exception as e:
+            await interaction.edit_original_response(content=f"An error occurred: {e}", embed=None)
+            return
+        if not quote.ok:
+            content = f"Purchase canceled, it would fail now: {quote.error}"
+        elif tx_hash:
+            content = f"You sent {amount_eth} ETH and received {format_orv(quote.tokens)} ORV. Transaction hash: {tx_hash.hex()}"
+        else:
+            content = "Purchase failed."
+        await interaction.edit_original_response(content=content, embed=None)
+
+class PurchaseQuoteView(StatelessView):
+    def __init__(self, user_id, value_wei):
+        super().__init__(PurchaseButton("confirm", user_id, value_wei), PurchaseButton("cancel", user_id, value_wei))
+
+class SettingsButton(OwnedItem, DynamicItem[Button], template=r"orvyn:settings:referrer:(?P<user_id>\d+)"):
     def __init__(self, user_id):
-        super().__init__()
+        super().__init__(Button(
+            label="Change Referrer", style=discord.ButtonStyle.primary, custom_id=f"orvyn:settings:referrer:{user_id}"))
         self.user_id = user_id
 
-    @discord.ui.button(label="Change Referrer", style=discord.ButtonStyle.primary)
-    async def modify_settings(self, interaction: discord.Interaction, button: discord.ui.Button):
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: Button, match):
+        return cls(match["user_id"])
+
+    @traced_interaction("settings_navigation_view.modify_settings")
+    async def callback(self, interaction: discord.Interaction):
+        if not _wallet_count(self.user_id):
+            await _no_account(interaction)
+            return
         await interaction.response.send_modal(UpdateReferrerModal(self.user_id))
 
+class SettingsNavigationView(StatelessView):
+    def __init__(self, user_id):
+        super().__init__(SettingsButton(user_id))
+
 class UpdateReferrerModal(Modal, title="Update Referrer"):
     new_referrer = TextInput(label="New Referrer Code", style=discord.TextStyle.short)
 
     def __init__(self, user_id):
-        super().__init__()
+        super().__init__(timeout=MODAL_TIMEOUT)
         self.user_id = user_id
 
+    @traced_interaction("update_referrer_modal.on_submit")
     async def on_submit(self, interaction: discord.Interaction):
-        new_referrer_code = self.new_referrer.value
-        if new_referrer_code in referral_codes:
-            new_referrer_id = referral_codes[new_referrer_code]
-            users[self.user_id]['wallets'][0]['referrer'] = new_referrer_id
-            with open("data/users.json", "w") as file:
-                json.dump(users, file, indent=4)
-            await interaction.response.send_message("Referrer successfully updated.", ephemeral=True)
-        else:
+        new_referrer_id = referrals.user_for(self.new_referrer.value.strip())
+        if new_referrer_id is None:
             await interaction.response.send_message("The provided referrer code is invalid.", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        wallet = users[self.user_id].wallets[0]
+        old_referrer, wallet.referrer = wallet.referrer, new_referrer_id
+        try:
+            await jobs.run(self.user_id, state_manager.save_user, self.user_id)
+        except JobQueueFull as e:
+            wallet.referrer = old_referrer
+            await interaction.followup.send(str(e), ephemeral=True)
+            return
+        await interaction.followup.send("Referrer successfully updated.", ephemeral=True)
 
 def generate_private_key_warning_embed(user_id, wallet_index):
     embed = discord.Embed(
@@ -232,3 +483,6 @@ def generate_private_key_warning_embed(user_id, wallet_index):
         color=discord.Color.red()
     )
     return embed
+
+# One dispatcher per component type, for every panel ever sent.
+bot.add_dynamic_items(WalletButton, WalletSelect, HistoryButton, HistoryFilter, SettingsButton, PurchaseButton)
@@ -1,8 +1,9 @@
-from solcx import compile_standard, install_solc, set_solc_version
+from solcx import compile_standard, install_solc, set_solc_version, get_installed_solc_versions
 from web3 import Web3
 from pathlib import Path
 import json
 import os
+import hashlib
 import sys
 
 try:
@@ -51,17 +52,16 @@ GAS_LIMIT_TRANSFER   = as_int("GAS_LIMIT_TRANSFER", default=500_000)
 GAS_PRICE_GWEI       = as_int("GAS_PRICE_GWEI", default=50)
 TOKEN_SUPPLY         = as_int("TOKEN_SUPPLY", default=7_000_000)
 TRANSFER_AMOUNT      = as_int("TRANSFER_AMOUNT", default=1_000)
-SENDER_ADDRESS       = checksum_addr(require_env("SENDER_ADDRESS"))
-SENDER_PRIVATE_KEY   = normalize_privkey(require_env("SENDER_PRIVATE_KEY"))
-RECIPIENT_ADDRESS    = checksum_addr(require_env("RECIPIENT_ADDRESS"))
 
 COMPILED_CODE_PATH   = Path(os.getenv("COMPILED_CODE_PATH", "abi/compiled_code.json"))
-COMPILED_CODE_PATH.parent.mkdir(parents=True, exist_ok=True)
+BUILD_CACHE_DIR      = Path(os.getenv("BUILD_CACHE_DIR", "abi/.cache"))
 
 CONTRACT_FILENAME    = os.getenv("CONTRACT_FILENAME", "OrvynToken.sol")
 CONTRACT_PATH        = Path(CONTRACT_FILENAME)
+CONTRACT_NAME        = os.getenv("CONTRACT_NAME", "OrvynToken")
 
 NODE_MODULES_PATH    = Path(os.getenv("NODE_MODULES_PATH", Path.cwd() / "node_modules")).resolve()
+CONTRACT_ARTIFACT_PATH = Path(os.getenv("CONTRACT_ARTIFACT_PATH", f"abi/{CONTRACT_NAME}.json"))
 
 OPENZEPPELIN_PATHS = {
     "@openzeppelin/contracts/token/ERC20/ERC20.sol": "contracts/token/ERC20/ERC20.sol",
@@ -72,30 +72,33 @@ OPENZEPPELIN_PATHS = {
 }
 
 
-print(f"[INFO] Using solc {SOLC_VERSION}")
-install_solc(SOLC_VERSION)
-set_solc_version(SOLC_VERSION)
+def load_sources(contract_path: Path = CONTRACT_PATH, node_modules_path: Path = NODE_MODULES_PATH) -> dict:
+    if not contract_path.is_file():
+        sys.exit(f"[FS] Solidity contract not found: {contract_path}")
+    token_source_code = contract_path.read_text(encoding="utf-8")
 
-if not CONTRACT_PATH.is_file():
-    sys.exit(f"[FS] Solidity contract not found: {CONTRACT_PATH}")
-token_source_code = CONTRACT_PATH.read_text(encoding="utf-8")
+    sources = {}
+    for import_path, rel_file in OPENZEPPELIN_PATHS.items():
+        full_path = node_modules_path / "@openzeppelin" / rel_file
+        if not full_path.is_file():
+            print(f"[WARN] File not found: {full_path}")
+        else:
+            print(f"[OK] Found: {full_path}")
+            sources[import_path] = {"content": full_path.read_text(encoding="utf-8")}
 
-openzeppelin_sources = {}
-for import_path, rel_file in OPENZEPPELIN_PATHS.items():
-    full_path = NODE_MODULES_PATH / "@openzeppelin" / rel_file
-    if not full_path.is_file():
-        print(f"[WARN] File not found: {full_path}")
-    else:
-        print(f"[OK] Found: {full_path}")
-        openzeppelin_sources[import_path] = {"content": full_path.read_text(encoding="utf-8")}
+    sources[contract_path.name] = {"content": token_source_code}
+    return sources
 
-openzeppelin_sources[CONTRACT_PATH.name] = {"content": token_source_code}
+def build_key(standard_input: dict, solc_version: str) -> str:
+    # Content address of a build: the exact solc standard-JSON input (sources + settings) and compiler version.
+    blob = json.dumps({"solc": solc_version, "input": standard_input}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
 
-print("[INFO] Compiling…")
-compiled_sol = compile_standard(
-    {
+def compile_contract(contract_path: Path = CONTRACT_PATH, solc_version: str = SOLC_VERSION,
+                     node_modules_path: Path = NODE_MODULES_PATH, cache_dir: Path = BUILD_CACHE_DIR) -> dict:
+    standard_input = {
         "language": "Solidity",
-        "sources": openzeppelin_sources,
+        "sources": load_sources(contract_path, node_modules_path),
         "settings": {
             "outputSelection": {
                 "*": {
@@ -103,57 +106,79 @@ compiled_sol = compile_standard(
                 }
             }
         },
-    },
-    solc_version=SOLC_VERSION
-)
-
-COMPILED_CODE_PATH.write_text(json.dumps(compiled_sol), encoding="utf-8")
-print(f"[INFO] Compiled code saved to: {COMPILED_CODE_PATH}")
-
-w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
-if w3.is_connected():
-    print(f"[INFO] Connected to provider: {GANACHE_URL}")
-else:
-    sys.exit("[NET] Connection to provider failed")
+    }
+    key = build_key(standard_input, solc_version)
+    cached = cache_dir / f"{key}.json" if cache_dir else None
+    if cached is not None and cached.is_file():
+        print(f"[INFO] Build cache hit: {key[:12]} (solc {solc_version})")
+        compiled_sol = json.loads(cached.read_text(encoding="utf-8"))
+        compiled_sol["buildKey"] = key
+        return compiled_sol
+
+    print(f"[INFO] Using solc {solc_version}")
+    if solc_version not in {str(v) for v in get_installed_solc_versions()}:
+        install_solc(solc_version)
+    set_solc_version(solc_version)
+
+    print("[INFO] Compiling…")
+    compiled_sol = compile_standard(standard_input, solc_version=solc_version)
+    if cached is not None:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = cached.with_suffix(".tmp")
+        tmp.write_text(json.dumps(compiled_sol), encoding="utf-8")
+        tmp.replace(cached)
+        print(f"[INFO] Cached build {key[:12]} in {cache_dir}")
+    compiled_sol["buildKey"] = key
+    return compiled_sol
+
+def get_abi_and_bytecode(compiled_sol: dict, contract_file: str = CONTRACT_PATH.name, contract_name: str = CONTRACT_NAME):
+    try:
+        contract = compiled_sol['contracts'][contract_file][contract_name]
+        return contract['abi'], contract['evm']['bytecode']['object']
+    except KeyError:
+        sys.exit("[BUILD] Could not find ABI/bytecode in compiled output — check CONTRACT_NAME and file names.")
+
+def write_runtime_artifact(abi, address: str = None, chain_id: int = None, build_key: str = None,
+                           path: Path = CONTRACT_ARTIFACT_PATH, contract_name: str = CONTRACT_NAME) -> Path:
+    # The runtime only needs the ABI and where the contract lives; bytecode, metadata and source maps stay in the build.
+    artifact = {
+        "contractName": contract_name,
+        "address": address,
+        "chainId": chain_id,
+        "buildKey": build_key,
+        "abi": abi,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(artifact, separators=(",", ":")), encoding="utf-8")
+    print(f"[INFO] Runtime artifact saved to: {path}")
+    return path
+
+def deploy_contract(w3: Web3, abi, bytecode, sender_address: str, sender_private_key: str,
+                    initial_supply_wei: int, chain_id: int = CHAIN_ID, gas_limit: int = GAS_LIMIT_DEPLOY,
+                    gas_price_gwei: int = GAS_PRICE_GWEI):
+    Token = w3.eth.contract(abi=abi, bytecode=bytecode)
+
+    print("[TX] Building deployment tx…")
+    deploy_tx = Token.constructor(initial_supply_wei).build_transaction({
+        "chainId": chain_id,
+        "gas": gas_limit,
+        "gasPrice": w3.to_wei(gas_price_gwei, "gwei"),
+        "nonce": w3.eth.get_transaction_count(sender_address),
+    })
 
-try:
-    CONTRACT_NAME = os.getenv("CONTRACT_NAME", "OrvynToken")
-    bytecode = compiled_sol['contracts'][CONTRACT_PATH.name][CONTRACT_NAME]['evm']['bytecode']['object']
-    abi = compiled_sol['contracts'][CONTRACT_PATH.name][CONTRACT_NAME]['abi']
-except KeyError:
-    sys.exit("[BUILD] Could not find ABI/bytecode in compiled output — check CONTRACT_NAME and file names.")
-
-Token = w3.eth.contract(abi=abi, bytecode=bytecode)
-initial_supply_wei = TOKEN_SUPPLY * (10 ** 18)
-
-print("[TX] Building deployment tx…")
-deploy_tx = Token.constructor(initial_supply_wei).build_transaction({
-    "chainId": CHAIN_ID,
-    "gas": GAS_LIMIT_DEPLOY,
-    "gasPrice": w3.to_wei(GAS_PRICE_GWEI, "gwei"),
-    "nonce": w3.eth.get_transaction_count(SENDER_ADDRESS),
-})
-
-print("[TX] Signing…")
-signed_deploy = w3.eth.account.sign_transaction(deploy_tx, SENDER_PRIVATE_KEY)
-print("[TX] Sending…")
-tx_hash = w3.eth.send_raw_transaction(signed_deploy.raw_transaction)
-print(f"[TX] Deploy hash: {tx_hash.hex()}")
-
-print("[TX] Waiting for receipt…")
-tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-contract_address = tx_receipt.contractAddress
-print(f"[OK] Contract deployed at: {contract_address}")
-
-Token = w3.eth.contract(address=contract_address, abi=abi)
+    print("[TX] Signing…")
+    signed_deploy = w3.eth.account.sign_transaction(deploy_tx, sender_private_key)
+    print("[TX] Sending…")
+    tx_hash = w3.eth.send_raw_transaction(signed_deploy.raw_transaction)
+    print(f"[TX] Deploy hash: {tx_hash.hex()}")
 
-try:
-    total_supply = Token.functions.totalSupply().call()
-    print(f"[INFO] Total Supply: {total_supply / (10 ** 18)} tokens")
-except Exception as e:
-    print(f"[WARN] Could not read totalSupply: {e}")
+    print("[TX] Waiting for receipt…")
+    tx_receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    contract_address = tx_receipt.contractAddress
+    print(f"[OK] Contract deployed at: {contract_address}")
+    return w3.eth.contract(address=contract_address, abi=abi)
 
-def transfer_tokens(sender_private_key: str, sender_address: str, recipient_address: str, amount_tokens: int):
+def transfer_tokens(w3: Web3, Token, sender_private_key: str, sender_address: str, recipient_address: str, amount_tokens: int):
     amount_wei = amount_tokens * (10 ** 18)
     tx = Token.functions.transfer(recipient_address, amount_wei).build_transaction({
         "chainId": CHAIN_ID,
@@ -166,7 +191,36 @@ def transfer_tokens(sender_private_key: str, sender_address: str, recipient_addr
     receipt = w3.eth.wait_for_transaction_receipt(sent)
     print(f"[OK] Transfer tx: {receipt.transactionHash.hex()}")
 
-try:
-    transfer_tokens(SENDER_PRIVATE_KEY, SENDER_ADDRESS, RECIPIENT_ADDRESS, TRANSFER_AMOUNT)
-except Exception as e:
-    print(f"[WARN] Transfer failed: {e}")
+def main():
+    sender_address = checksum_addr(require_env("SENDER_ADDRESS"))
+    sender_private_key = normalize_privkey(require_env("SENDER_PRIVATE_KEY"))
+    recipient_address = checksum_addr(require_env("RECIPIENT_ADDRESS"))
+
+    compiled_sol = compile_contract()
+    COMPILED_CODE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    COMPILED_CODE_PATH.write_text(json.dumps(compiled_sol), encoding="utf-8")
+    print(f"[INFO] Compiled code saved to: {COMPILED_CODE_PATH}")
+
+    w3 = Web3(Web3.HTTPProvider(GANACHE_URL))
+    if w3.is_connected():
+        print(f"[INFO] Connected to provider: {GANACHE_URL}")
+    else:
+        sys.exit("[NET] Connection to provider failed")
+
+    abi, bytecode = get_abi_and_bytecode(compiled_sol)
+    Token = deploy_contract(w3, abi, bytecode, sender_address, sender_private_key, TOKEN_SUPPLY * (10 ** 18))
+    write_runtime_artifact(abi, Token.address, CHAIN_ID, compiled_sol.get("buildKey"))
+
+    try:
+        total_supply = Token.functions.totalSupply().call()
+        print(f"[INFO] Total Supply: {total_supply / (10 ** 18)} tokens")
+    except Exception as e:
+        print(f"[WARN] Could not read totalSupply: {e}")
+
+    try:
+        transfer_tokens(w3, Token, sender_private_key, sender_address, recipient_address, TRANSFER_AMOUNT)
+    except Exception as e:
+        print(f"[WARN] Transfer failed: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,24 @@
 import os
 import threading
-from bot.bot import bot
-from utils.flask_app import app
 
-def run_flask():
+# The bot and web app are imported under __main__, not at the top: crypto pool workers are spawned processes
+# that re-import this module first, and should not load either of them.
+
+def run_flask(app):
     host = os.getenv("FLASK_HOST", "0.0.0.0")
     port = int(os.getenv("FLASK_PORT", "5000"))
     debug = os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true", "yes", "on")
     app.run(host=host, port=port, debug=debug, use_reloader=False)
 
 if __name__ == "__main__":
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
+    from bot.bot import bot
+    # Development setup: the web app in a thread of the bot process. In production run web.py separately.
+    if os.getenv("WEB_EMBEDDED", "true").lower() in ("1", "true", "yes", "on"):
+        from utils.flask_app import app
+        flask_thread = threading.Thread(target=run_flask, args=(app,), daemon=True)
+        flask_thread.start()
     token = os.getenv("DISCORD_TOKEN")
     if not token:
         raise RuntimeError("Missing env var: DISCORD_TOKEN")
-    bot.run(token)
+    # Logging is configured by utils.log_utils; keep discord.py from installing its own stderr handler.
+    bot.run(token, log_handler=None)
@@ -0,0 +1,278 @@
+# orvyn.py
+# Admin CLI. Each subcommand imports only the modules it needs: nothing here loads the bot, validates Discord
+# env vars or decrypts wallet keys, and the user store is read one user at a time.
+# Usage:
+#   python orvyn.py balances [--user ID ...] [--format table|csv|jsonl]
+#   python orvyn.py grant (ID ... | --all) [--eth N] [--orv N] [--all-wallets] [--if-empty] [--dry-run]
+#   python orvyn.py export [--out FILE] [--format jsonl|csv]
+#   python orvyn.py reindex [--from-chain] [--from-block N]
+#   python orvyn.py stats [--days N] [--format table|csv|jsonl]
+#   python orvyn.py referral add CODE USER_ID
+#   python orvyn.py migrate-store --to sqlite|json
+import os
+import sys
+import csv
+import json
+import argparse
+from collections import deque
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# Balance batches in flight at once; each is one JSON-RPC batch request of RPC_BATCH_SIZE calls.
+ADMIN_RPC_CONCURRENCY = int(os.getenv("ADMIN_RPC_CONCURRENCY", "4"))
+
+def _iter_wallets(user_ids=None, all_wallets=True):
+    # (user_id, stored user dict, stored wallet dict) straight from the store, without decrypting anything.
+    from utils.state_manager import state_manager
+    wanted = set(user_ids) if user_ids else None
+    for user_id, data in state_manager.iter_stored():
+        if wanted is not None:
+            if user_id not in wanted:
+                continue
+            wanted.discard(user_id)
+        for wallet in data.get("wallets", [])[:None if all_wallets else 1]:
+            yield user_id, data, wallet
+        if wanted is not None and not wanted:
+            return  # every requested user found; don't read the rest of the store
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _with_balances(wallets, block):
+    # Streams (user_id, data, wallet, orv, eth), looking balances up in JSON-RPC batches with a few in flight.
+    from concurrent.futures import ThreadPoolExecutor
+    from utils.eth_utils import RPC_BATCH_SIZE
+    from utils.token_reads import get_balances_many
+    size = max(1, RPC_BATCH_SIZE // 2)  # two calls per wallet
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=ADMIN_RPC_CONCURRENCY, thread_name_prefix="orvyn-admin") as pool:
+        for chunk in _chunks(wallets, size):
+            pending.append((chunk, pool.submit(get_balances_many, [w["address"] for _, _, w in chunk], block)))
+            if len(pending) >= ADMIN_RPC_CONCURRENCY:
+                yield from _ready(*pending.popleft())
+        while pending:
+            yield from _ready(*pending.popleft())
+
+def _ready(chunk, future):
+    for (user_id, data, wallet), (orv, eth) in zip(chunk, future.result()):
+        yield user_id, data, wallet, orv, eth
+
+def _writer(fmt, out, fields):
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(fields)
+        return writer.writerow
+    if fmt == "jsonl":
+        return lambda row: out.write(json.dumps(dict(zip(fields, row))) + "\n")
+    out.write("  ".join(f"{f:<{w}}" for f, w in zip(fields, (20, 14, 42, 18, 14))).rstrip() + "\n")
+    return lambda row: out.write(
+        f"{row[0]:<20}  {row[1][:14]:<14}  {row[2]:<42}  {row[3]:>18,.4f}  {row[4]:>14,.6f}\n")
+
+def cmd_balances(args):
+    from utils.eth_utils import w3
+    block = hex(w3.eth.block_number)  # one block for the whole dump, however many batches it takes
+    write = _writer(args.format, sys.stdout, ("user_id", "wallet", "address", "orv", "eth"))
+    wallets = total_orv = total_eth = 0
+    for user_id, _, wallet, orv, eth in _with_balances(_iter_wallets(args.user), block):
+        write((user_id, wallet.get("name") or "", wallet["address"], orv, eth))
+        wallets += 1
+        total_orv += orv
+        total_eth += eth
+    print(f"{wallets} wallets at block {int(block, 16)}: {total_orv:,.4f} ORV, {total_eth:,.6f} ETH", file=sys.stderr)
+
+def cmd_grant(args):
+    if not args.user_ids and not args.all:
+        raise SystemExit("grant: name at least one user id, or pass --all")
+    from utils.eth_utils import w3, batch_send_eth
+    from utils.models import parse_users
+    from utils.contract_utils import (
+        MAIN_ACCOUNT_ADDRESS, MAIN_ACCOUNT_PRIVATE_KEY, INITIAL_ETH_GRANT, INITIAL_TOKEN_GRANT,
+        batch_transfer_tokens, record_history,
+    )
+    eth = INITIAL_ETH_GRANT if args.eth is None else args.eth
+    orv = INITIAL_TOKEN_GRANT if args.orv is None else args.orv
+    wallets = _iter_wallets(None if args.all else args.user_ids, args.all_wallets)
+    if args.if_empty:
+        # Re-running a signup grant that failed part-way: skip wallets that already hold anything.
+        wallets = (
+            (user_id, data, wallet)
+            for user_id, data, wallet, o, e in _with_balances(wallets, hex(w3.eth.block_number)) if not o and not e
+        )
+    targets = list(wallets)
+    for user_id, _, wallet in targets:
+        print(f"{user_id:<20}  {wallet['address']}  +{eth} ETH  +{orv} ORV")
+    print(f"{len(targets)} wallet(s){' (dry run)' if args.dry_run else ''}", file=sys.stderr)
+    if args.dry_run or not targets:
+        return
+    addresses = [wallet["address"] for _, _, wallet in targets]
+    if eth:
+        batch_send_eth(MAIN_ACCOUNT_PRIVATE_KEY, MAIN_ACCOUNT_ADDRESS, [(a, eth) for a in addresses])
+    if orv:
+        tx_hashes = batch_transfer_tokens(MAIN_ACCOUNT_PRIVATE_KEY, MAIN_ACCOUNT_ADDRESS, [(a, orv) for a in addresses])
+        # History only needs addresses to find the owner, so the granted users are parsed with keys still encrypted.
+        owners = parse_users({user_id: data for user_id, data, _ in targets})
+        for tx_hash in tx_hashes:
+            record_history(w3.eth.get_transaction_receipt(tx_hash), owners)
+    print(f"Granted {eth} ETH and {orv} ORV to {len(addresses)} wallet(s)", file=sys.stderr)
+
+def cmd_export(args):
+    # Account data without secrets: wallet keys and their passwords are never written.
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    try:
+        write = _writer(args.format, out, ("user_id", "email", "ip", "wallet", "address", "referrer"))
+        count = 0
+        for user_id, data, wallet in _iter_wallets():
+            write((user_id, data.get("email"), data.get("ip"), wallet.get("name"), wallet["address"], wallet.get("referrer")))
+            count += 1
+    finally:
+        if args.out:
+            out.close()
+    print(f"Exported {count} wallet(s)", file=sys.stderr)
+
+def cmd_reindex(args):
+    from utils.leaderboards import leaderboards
+    if args.from_chain:
+        from utils.eth_utils import w3
+        from utils.token_reads import CONTRACT_ADDRESS
+        leaderboards.rebuild_from_chain(w3, CONTRACT_ADDRESS, args.from_block)
+    else:
+        leaderboards.rebuild_from_history()
+    leaderboards.save()
+    print(f"Wrote {leaderboards.filepath}", file=sys.stderr)
+
+def cmd_stats(args):
+    from utils.analytics import analytics
+    stats = analytics.summary(args.days)
+    fields = ("date", "volume", "transfers", "purchases", "rewards", "active_wallets")
+    if args.format == "table":
+        print(f"{'date':<10}  {'volume':>16}  {'transfers':>9}  {'purchases':>14}  {'rewards':>12}  {'active':>7}")
+        for d in stats["daily"]:
+            print(f"{d['date']:<10}  {d['volume']:>16,.4f}  {d['transfers']:>9,}  {d['purchases']:>14,.4f}"
+                  f"  {d['rewards']:>12,.4f}  {d['active_wallets']:>7,}")
+    else:
+        write = _writer(args.format, sys.stdout, fields)
+        for d in stats["daily"]:
+            write(tuple(d[f] for f in fields))
+    print(
+        f"{args.days} day(s): {stats['volume']:,.4f} ORV over {stats['transfers']:,} transfers"
+        f" (median {stats['median_transfer']:,.4f}), {stats['purchase_inflow']:,.4f} ORV purchased,"
+        f" referral payouts {stats['referral_rewards']:,.4f} ORV ({stats['referral_share']:.2%}),"
+        f" {stats['active_wallets']:,} active wallets",
+        file=sys.stderr,
+    )
+
+def cmd_referral_add(args):
+    # Running bots pick the code up from the file within REFERRAL_RELOAD_SECONDS.
+    from utils.referrals import referrals
+    try:
+        added = referrals.add(args.code, args.user_id)
+    except ValueError as e:
+        raise SystemExit(f"referral add: {e}")
+    print(f"{'Added' if added else 'Already present:'} {args.code} -> {args.user_id} in {referrals.filepath}", file=sys.stderr)
+
+def cmd_migrate_store(args):
+    from utils.shared_store import SharedStore, STATE_DB
+    from utils.data_utils import USERS_FILE, NOTIFICATIONS_FILE, _ensure_parent
+    store = SharedStore(args.db or STATE_DB)
+    users_file = args.users_file or USERS_FILE
+    if args.to == "sqlite":
+        from utils.models import iter_stored_users
+        if not os.path.exists(users_file):
+            raise SystemExit(f"Nothing to migrate: {users_file} not found")
+        count = 0
+        with open(users_file, "r", encoding="utf-8") as f:
+            rows = ((u, json.dumps(d, separators=(",", ":"))) for u, d in iter_stored_users(f))
+            for chunk in _chunks(rows, 1000):
+                count += store.save_users(chunk)
+        notified = 0
+        if os.path.exists(NOTIFICATIONS_FILE):
+            with open(NOTIFICATIONS_FILE, "r", encoding="utf-8") as f:
+                notifications = json.load(f)
+            notified = store.save_notifications((u, h) for u, hashes in notifications.items() for h in hashes)
+        print(f"Copied {count} user(s) and {notified} notification(s) into {store.filepath}; set STATE_BACKEND=sqlite",
+              file=sys.stderr)
+        return
+    # sqlite -> json: rows already hold each user's stored JSON, so they are written through untouched.
+    _ensure_parent(users_file)
+    tmp = f"{users_file}.tmp"
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("{")
+        for user_id, data in store.iter_users():
+            f.write(f'{"," if count else ""}\n{json.dumps(user_id)}:{data}')
+            count += 1
+        f.write("\n}\n")
+    os.replace(tmp, users_file)
+    _ensure_parent(NOTIFICATIONS_FILE)
+    with open(NOTIFICATIONS_FILE, "w", encoding="utf-8") as f:
+        json.dump(store.load_notifications(), f, indent=4)
+    print(f"Wrote {count} user(s) to {users_file}; set STATE_BACKEND=json", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="orvyn", description="Orvyn admin tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("balances", help="ORV/ETH balance of every wallet, via batched RPC")
+    p.add_argument("--user", action="append", help="only this user id (repeatable)")
+    p.add_argument("--format", choices=("table", "csv", "jsonl"), default="table")
+    p.set_defaults(func=cmd_balances)
+
+    p = sub.add_parser("grant", help="send ETH/ORV from the main account, e.g. to redo a failed signup grant")
+    p.add_argument("user_ids", nargs="*")
+    p.add_argument("--all", action="store_true", help="every user in the store")
+    p.add_argument("--eth", type=float, help="ETH per wallet (default INITIAL_ETH_GRANT)")
+    p.add_argument("--orv", type=float, help="ORV per wallet (default INITIAL_TOKEN_GRANT)")
+    p.add_argument("--all-wallets", action="store_true", help="every wallet of each user, not just the first")
+    p.add_argument("--if-empty", action="store_true", help="skip wallets that already hold ETH or ORV")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=cmd_grant)
+
+    p = sub.add_parser("export", help="users and wallet addresses, without keys")
+    p.add_argument("--out", help="file to write (default stdout)")
+    p.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("reindex", help="rebuild the leaderboard snapshot")
+    p.add_argument("--from-chain", action="store_true", help="replay Transfer/ReferralReward logs instead of the history store")
+    p.add_argument("--from-block", type=int, default=0)
+    p.set_defaults(func=cmd_reindex)
+
+    p = sub.add_parser("stats", help="daily volume, purchases, referral payouts and active wallets from history")
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--format", choices=("table", "csv", "jsonl"), default="table")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("referral", help="manage referral codes")
+    referral = p.add_subparsers(dest="action", required=True)
+    p = referral.add_parser("add", help="give USER_ID the referral code CODE")
+    p.add_argument("code")
+    p.add_argument("user_id")
+    p.set_defaults(func=cmd_referral_add)
+
+    p = sub.add_parser("migrate-store", help="copy users and notifications between users.json and the SQLite store")
+    p.add_argument("--to", choices=("sqlite", "json"), required=True)
+    p.add_argument("--db", help="SQLite file (default STATE_DB)")
+    p.add_argument("--users-file", help="users JSON file (default USERS_FILE)")
+    p.set_defaults(func=cmd_migrate_store)
+
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except BrokenPipeError:
+        # Output piped into head/less that exited early.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+# utils/analytics.py
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from utils.history_store import history_store, KINDS
+from utils.metrics import registry, timed_storage
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# /stats re-reads new history rows at most this often; everything already loaded stays in memory.
+STATS_REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "30"))
+STATS_DEFAULT_DAYS = int(os.getenv("STATS_DEFAULT_DAYS", "7"))
+
+# Amounts are held as int64 nano-ORV: sums stay exact (float64 would round past ~9M ORV in nano units) and
+# the whole token supply fits with room to spare, which uint256 wei would not in a NumPy column.
+UNIT = 10 ** 9
+DAY = 86400
+TOKEN_DECIMALS = int(os.getenv("TOKEN_DECIMALS", "18"))
+
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+SENT, RECEIVED, PURCHASE, REWARD = (KIND_CODES[k] for k in ("sent", "received", "purchase", "referral_reward"))
+
+log = logging.getLogger(__name__)
+
+class _Columns:
+    # Append-only typed columns with capacity doubling, so an incremental load only touches the new rows.
+    def __init__(self, dtypes, capacity=1024):
+        self.size = 0
+        self._data = {name: np.empty(capacity, dtype) for name, dtype in dtypes.items()}
+
+    def append(self, arrays):
+        need = self.size + len(next(iter(arrays.values())))
+        capacity = len(next(iter(self._data.values())))
+        if need > capacity:
+            capacity = max(need, capacity * 2)
+            for name, column in self._data.items():
+                grown = np.empty(capacity, column.dtype)
+                grown[:self.size] = column[:self.size]
+                self._data[name] = grown
+        for name, values in arrays.items():
+            self._data[name][self.size:need] = values
+        self.size = need
+
+    def __getitem__(self, name):
+        return self._data[name][:self.size]
+
+def _sum_by(index, values, n):
+    # Exact per-bucket int64 sums; np.bincount would go through float64 weights.
+    out = np.zeros(n, np.int64)
+    if len(index):
+        order = np.argsort(index, kind="stable")
+        index, values = index[order], values[order]
+        starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+        out[index[starts]] = np.add.reduceat(values, starts)
+    return out
+
+class HistoryAnalytics:
+    """Aggregates over the history store for /stats: volume, purchases, referral payouts, active wallets.
+
+    History rows are loaded once into columns (UTC day, kind, nano-ORV amount, interned wallet id) and
+    after that only rows newer than the last one seen are read. Per-day aggregates are cached and a day
+    is recomputed only when new rows land in it, so a query over closed days is a few dict lookups plus
+    one vectorized pass for the range-wide unique-wallet count and median.
+    """
+
+    def __init__(self, store=None, refresh_seconds=STATS_REFRESH_SECONDS):
+        self.store = store or history_store
+        self.refresh_seconds = refresh_seconds
+        self._cols = _Columns({"day": np.int32, "kind": np.int8, "amount": np.int64, "wallet": np.int32, "counted": np.bool_})
+        self._wallet_ids = {}
+        self._last_id = 0
+        self._refreshed_at = float("-inf")
+        self._days = {}  # UTC day number -> (volume, transfers, purchases, rewards, active wallets)
+        self._lock = threading.RLock()
+
+    @property
+    def rows(self):
+        return self._cols.size
+
+    @timed_storage("analytics.refresh")
+    def refresh(self, force=False):
+        with self._lock:
+            if not force and time.monotonic() - self._refreshed_at < self.refresh_seconds:
+                return 0
+            added = 0
+            for rows in self.store.batches_since(self._last_id):
+                self._append(rows)
+                added += len(rows)
+            self._refreshed_at = time.monotonic()
+            if added:
+                log.debug("Loaded %d history rows into analytics (%d total)", added, self.rows)
+            return added
+
+    def _append(self, rows):
+        last_id = rows[-1][0]
+        # Entries imported from transactions.json carry no time and belong to no day.
+        rows = [r for r in rows if r[5] is not None]
+        if not rows:
+            self._last_id = last_id
+            return
+        ids, kinds, senders, recipients, values, created, counted = zip(*rows)
+        n = len(rows)
+        wallet_ids = self._wallet_ids
+        # The player's own wallet on each row: the sender for "sent", the recipient for everything else.
+        own = ((s if k == "sent" else r) or "" for k, s, r in zip(kinds, senders, recipients))
+        day = (np.fromiter(created, np.float64, n) // DAY).astype(np.int32)
+        self._cols.append({
+            "day": day,
+            "kind": np.fromiter((KIND_CODES.get(k, -1) for k in kinds), np.int8, n),
+            "amount": np.fromiter((v * UNIT // 10 ** TOKEN_DECIMALS for v in values), np.int64, n),
+            "wallet": np.fromiter((wallet_ids.setdefault(a.lower(), len(wallet_ids)) for a in own), np.int32, n),
+            "counted": np.fromiter(counted, np.bool_, n),
+        })
+        for d in np.unique(day).tolist():
+            self._days.pop(d, None)
+        self._last_id = last_id
+
+    def _compute_days(self, first, last):
+        cols = self._cols
+        day = cols["day"]
+        mask = (day >= first) & (day <= last)
+        d, kind, amount = day[mask] - first, cols["kind"][mask], cols["amount"][mask]
+        n = last - first + 1
+        volume_rows = ((kind == SENT) | (kind == RECEIVED)) & cols["counted"][mask]
+        purchase_rows, reward_rows = kind == PURCHASE, kind == REWARD
+        volume = _sum_by(d[volume_rows], amount[volume_rows], n)
+        transfers = np.bincount(d[volume_rows], minlength=n)
+        purchases = _sum_by(d[purchase_rows], amount[purchase_rows], n)
+        rewards = _sum_by(d[reward_rows], amount[reward_rows], n)
+        # One entry per (day, wallet) pair, then counted per day.
+        pairs = np.unique((d.astype(np.int64) << 32) | cols["wallet"][mask])
+        active = np.bincount((pairs >> 32).astype(np.intp), minlength=n)
+        for i in range(n):
+            self._days.setdefault(first + i, (
+                int(volume[i]), int(transfers[i]), int(purchases[i]), int(rewards[i]), int(active[i])))
+
+    def daily(self, first, last):
+        # [(day, volume, transfers, purchases, rewards, active wallets)] for UTC days first..last, amounts in nano-ORV.
+        with self._lock:
+            missing = [d for d in range(first, last + 1) if d not in self._days]
+            if missing:
+                self._compute_days(missing[0], missing[-1])
+            return [(d, *self._days[d]) for d in range(first, last + 1)]
+
+    def summary(self, days=STATS_DEFAULT_DAYS):
+        self.refresh()
+        today = int(time.time() // DAY)
+        first = today - days + 1
+        with self._lock:
+            daily = self.daily(first, today)
+            cols = self._cols
+            mask = cols["day"] >= first
+            kind = cols["kind"][mask]
+            sizes = cols["amount"][mask][((kind == SENT) | (kind == RECEIVED)) & cols["counted"][mask]]
+            median = float(np.median(sizes)) if len(sizes) else 0.0
+            active = len(np.unique(cols["wallet"][mask]))
+        volume = sum(row[1] for row in daily)
+        purchases = sum(row[3] for row in daily)
+        rewards = sum(row[4] for row in daily)
+        moved = volume + purchases
+        return {
+            "days": days,
+            "since": datetime.fromtimestamp(first * DAY, tz=timezone.utc),
+            "volume": volume / UNIT,
+            "transfers": sum(row[2] for row in daily),
+            "median_transfer": median / UNIT,
+            "purchase_inflow": purchases / UNIT,
+            "referral_rewards": rewards / UNIT,
+            # Referral payouts as a share of all ORV moved (transfers and purchases), the flows that pay them.
+            "referral_share": rewards / moved if moved else 0.0,
+            "active_wallets": active,
+            "daily": [
+                {
+                    "date": datetime.fromtimestamp(d * DAY, tz=timezone.utc).date().isoformat(),
+                    "volume": v / UNIT, "transfers": t, "purchases": p / UNIT, "rewards": r / UNIT, "active_wallets": a,
+                }
+                for d, v, t, p, r, a in daily
+            ],
+        }
+
+analytics = HistoryAnalytics()
+
+registry.gauge_func("orvyn_analytics_rows", "History rows loaded into the /stats columns.", lambda: analytics.rows)
@@ -0,0 +1,339 @@
+# utils/chain_events.py
+import os
+import json
+import codecs
+import asyncio
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from utils.event_utils import TRANSFER_TOPIC, decode_transfer_logs
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# ws://, wss:// or an IPC socket path. Empty: WEB3_PROVIDER_URL when that is one of those, else subscriptions are off.
+WEB3_SUBSCRIBE_URL = os.getenv("WEB3_SUBSCRIBE_URL", "")
+CHAIN_RECONNECT_SECONDS = float(os.getenv("CHAIN_RECONNECT_SECONDS", "1"))
+CHAIN_RECONNECT_MAX_SECONDS = float(os.getenv("CHAIN_RECONNECT_MAX_SECONDS", "30"))
+CHAIN_REQUEST_TIMEOUT = float(os.getenv("CHAIN_REQUEST_TIMEOUT", "30"))
+# Events buffered per stream consumer; a consumer that falls this far behind loses the oldest.
+CHAIN_STREAM_QUEUE = int(os.getenv("CHAIN_STREAM_QUEUE", "1000"))
+# After a reconnect, Transfer logs are replayed from the last block seen, at most this many blocks back.
+CHAIN_BACKFILL_BLOCKS = int(os.getenv("CHAIN_BACKFILL_BLOCKS", "5000"))
+CHAIN_BACKFILL_STEP = int(os.getenv("CHAIN_BACKFILL_STEP", "2000"))
+# Delivered Transfer logs remembered for deduplication (live/backfill overlap, repeats after a reconnect).
+CHAIN_SEEN_LOGS = int(os.getenv("CHAIN_SEEN_LOGS", "50000"))
+
+CHAIN_EVENTS = registry.counter("orvyn_chain_events_total", "Heads and Transfer logs received over subscriptions.", ("kind",))
+CHAIN_DROPPED = registry.counter("orvyn_chain_events_dropped_total", "Events dropped for a stream consumer that fell behind.", ("kind",))
+CHAIN_RECONNECTS = registry.counter("orvyn_chain_reconnects_total", "Subscription connections lost and retried.")
+
+log = logging.getLogger(__name__)
+
+def is_websocket_url(url: str) -> bool:
+    return url.startswith(("ws://", "wss://"))
+
+def is_ipc_path(url: str) -> bool:
+    return url.endswith(".ipc") or url.startswith("/")
+
+def subscribe_url() -> str:
+    url = WEB3_SUBSCRIBE_URL or os.getenv("WEB3_PROVIDER_URL", "")
+    return url if is_websocket_url(url) or is_ipc_path(url) else ""
+
+def _int(value):
+    return int(value, 16) if isinstance(value, str) else value
+
+class _WebSocket:
+    def __init__(self, url):
+        self.url = url
+        self._ws = None
+
+    async def connect(self):
+        import websockets  # installed with web3
+        self._ws = await websockets.connect(self.url, max_size=None, ping_interval=20)
+
+    async def send(self, message):
+        await self._ws.send(json.dumps(message))
+
+    async def recv(self):
+        return json.loads(await self._ws.recv())
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+
+class _IPC:
+    # A node's IPC socket carries a bare stream of JSON values, not lines; each is decoded once complete.
+    def __init__(self, path):
+        self.path = path
+        self._reader = self._writer = None
+        self._buffer = ""
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=1 << 24)
+
+    async def send(self, message):
+        self._writer.write(json.dumps(message).encode())
+        await self._writer.drain()
+
+    async def recv(self):
+        while True:
+            text = self._buffer.lstrip()
+            if text:
+                try:
+                    value, end = self._json.raw_decode(text)
+                    self._buffer = text[end:]
+                    return value
+                except json.JSONDecodeError:
+                    pass
+            chunk = await self._reader.read(1 << 16)
+            if not chunk:
+                raise ConnectionError("IPC connection closed")
+            self._buffer = text + self._utf8.decode(chunk)
+
+    async def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+class Stream:
+    """One consumer's view of a subscription: `async for event in stream`, `close()` to stop receiving.
+
+    Each stream has its own bounded queue, so a slow consumer only ever loses its own oldest events.
+    """
+
+    def __init__(self, kind, streams, maxsize):
+        self.kind = kind
+        self._streams = streams
+        self._queue = asyncio.Queue(maxsize)
+        streams.add(self)
+
+    def _put(self, event):
+        if self._queue.full():
+            self._queue.get_nowait()
+            CHAIN_DROPPED.inc(self.kind)
+        self._queue.put_nowait(event)
+
+    def drain(self):
+        # Events already queued, without waiting; lets a consumer handle a burst in one go.
+        events = []
+        while not self._queue.empty():
+            events.append(self._queue.get_nowait())
+        return events
+
+    def close(self):
+        self._streams.discard(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return await self._queue.get()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+class ChainEvents:
+    """newHeads and token Transfer logs over one persistent WebSocket or IPC connection.
+
+    run() keeps the connection up: on a drop it reconnects with backoff, subscribes again and replays the
+    Transfer logs from the last block it had seen (deduplicated by block hash and log index), so consumers
+    see every transfer once even across reconnects, and the replacement logs of a reorged block as new ones.
+    Heads jump straight to the current block after a gap.
+    Worker threads can block on wait_for_head() instead of polling the node.
+    """
+
+    def __init__(self, url=None):
+        self.url = subscribe_url() if url is None else url
+        self.token_address = None
+        self.head = None
+        self.connected = False
+        self._seen = OrderedDict()  # (block hash, log index) of recently delivered Transfers, oldest first
+        self._held = None  # live logs parked while a backfill runs
+        self._streams = {"heads": set(), "transfers": set()}
+        self._subscriptions = {}
+        self._pending = {}
+        self._ids = itertools.count(1)
+        self._transport = None
+        self._head_changed = threading.Condition()
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    def heads(self, maxsize=CHAIN_STREAM_QUEUE):
+        # Yields {"number", "hash", "timestamp", ...} block headers with integer number/timestamp.
+        return Stream("heads", self._streams["heads"], maxsize)
+
+    def transfers(self, maxsize=CHAIN_STREAM_QUEUE):
+        # Yields decoded Transfer logs: {"from", "to", "value", "hash", "logIndex", "blockNumber", "removed"}.
+        return Stream("transfers", self._streams["transfers"], maxsize)
+
+    def wait_for_head(self, after, timeout):
+        # From a worker thread: True once a block newer than `after` has been seen.
+        with self._head_changed:
+            return self._head_changed.wait_for(lambda: self.head is not None and (after is None or self.head > after), timeout)
+
+    async def run(self, token_address=None):
+        if token_address is not None:
+            self.token_address = token_address
+        delay = CHAIN_RECONNECT_SECONDS
+        while True:
+            try:
+                await self._session()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected:
+                    delay = CHAIN_RECONNECT_SECONDS  # it was up; start the backoff over
+                log.warning("Chain subscription to %s lost (%s); reconnecting in %.1fs", self.url, e, delay)
+            finally:
+                self.connected = False
+                if self._transport is not None:
+                    try:
+                        await self._transport.close()
+                    except Exception:
+                        pass
+                    self._transport = None
+            CHAIN_RECONNECTS.inc()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CHAIN_RECONNECT_MAX_SECONDS)
+
+    async def _session(self):
+        transport = _IPC(self.url) if is_ipc_path(self.url) else _WebSocket(self.url)
+        await transport.connect()
+        self._transport = transport
+        self._subscriptions = {}
+        reader = asyncio.create_task(self._read(transport))
+        reader.add_done_callback(self._fail_pending)
+        try:
+            self._subscriptions[await self._request("eth_subscribe", ["newHeads"])] = "heads"
+            if self.token_address:
+                self._held = []
+                topics = ["0x" + TRANSFER_TOPIC.hex()]
+                subscription = await self._request("eth_subscribe", ["logs", {"address": self.token_address, "topics": topics}])
+                self._subscriptions[subscription] = "transfers"
+            resume_from = self.head
+            latest = await self._request("eth_getBlockByNumber", ["latest", False])
+            self.connected = True
+            log.info("Subscribed to chain events at %s (block %d)", self.url, _int(latest["number"]))
+            if self.token_address and resume_from is not None:
+                await self._backfill(resume_from, _int(latest["number"]))
+            self._on_head(latest)
+            held, self._held = self._held, None
+            if held:
+                self._on_logs(held)
+            await reader  # until the connection drops
+        finally:
+            self._held = None
+            reader.cancel()
+
+    async def _backfill(self, start, end):
+        if end - start > CHAIN_BACKFILL_BLOCKS:
+            log.warning("Chain subscription was down for %d blocks; replaying only the last %d",
+                        end - start, CHAIN_BACKFILL_BLOCKS)
+            start = end - CHAIN_BACKFILL_BLOCKS
+        topics = ["0x" + TRANSFER_TOPIC.hex()]
+        for first in range(start, end + 1, CHAIN_BACKFILL_STEP):
+            last = min(first + CHAIN_BACKFILL_STEP - 1, end)
+            logs = await self._request("eth_getLogs", [{
+                "address": self.token_address, "topics": topics, "fromBlock": hex(first), "toBlock": hex(last),
+            }])
+            self._on_logs(logs, live=False)
+
+    async def _request(self, method, params):
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._transport.send({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+            return await asyncio.wait_for(future, CHAIN_REQUEST_TIMEOUT)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _fail_pending(self, _task):
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("chain subscription connection closed"))
+
+    async def _read(self, transport):
+        while True:
+            message = await transport.recv()
+            for m in message if isinstance(message, list) else (message,):
+                self._on_message(m)
+
+    def _on_message(self, message):
+        if message.get("method") == "eth_subscription":
+            params = message["params"]
+            kind = self._subscriptions.get(params["subscription"])
+            if kind == "heads":
+                self._on_head(params["result"])
+            elif kind == "transfers":
+                if self._held is not None:
+                    self._held.append(params["result"])
+                else:
+                    self._on_logs([params["result"]])
+            return
+        future = self._pending.get(message.get("id"))
+        if future is not None and not future.done():
+            error = message.get("error")
+            if error:
+                future.set_exception(ValueError(f"{error.get('message', error)}"))
+            else:
+                future.set_result(message.get("result"))
+
+    def _on_head(self, header):
+        header = dict(header, number=_int(header["number"]), timestamp=_int(header.get("timestamp", 0)))
+        with self._head_changed:
+            if self.head is None or header["number"] > self.head:
+                self.head = header["number"]
+            self._head_changed.notify_all()
+        CHAIN_EVENTS.inc("heads")
+        for stream in list(self._streams["heads"]):
+            stream._put(header)
+
+    def _on_logs(self, logs, live=True):
+        fresh = []
+        for entry in logs:
+            entry = dict(entry, blockNumber=_int(entry["blockNumber"]), logIndex=_int(entry["logIndex"]))
+            # Keyed by block hash: a reorg reuses block numbers and log indexes for different logs.
+            key = (entry.get("blockHash") or entry.get("transactionHash"), entry["logIndex"])
+            if entry.get("removed"):
+                self._seen.pop(key, None)
+                fresh.append(entry)  # reorged out: passed on so consumers can undo
+                continue
+            if key in self._seen:
+                continue
+            self._seen[key] = None
+            fresh.append(entry)
+        while len(self._seen) > CHAIN_SEEN_LOGS:
+            self._seen.popitem(last=False)
+        if not fresh:
+            return
+        # Decoded apart, undos first: a reorg's removed log and its replacement can share block number and index.
+        records = []
+        for removed in (True, False):
+            for record in decode_transfer_logs([e for e in fresh if bool(e.get("removed")) == removed]):
+                record["removed"] = removed
+                records.append(record)
+        CHAIN_EVENTS.inc("transfers", amount=len(records))
+        if not live:
+            log.info("Replayed %d Transfer log(s) missed while disconnected", len(records))
+        for stream in list(self._streams["transfers"]):
+            for record in records:
+                stream._put(record)
+
+chain_events = ChainEvents()
+
+registry.gauge_func("orvyn_chain_head_block", "Latest block seen over the newHeads subscription.",
+                    lambda: chain_events.head or 0)
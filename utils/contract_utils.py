@@ -1,11 +1,27 @@
 # wallet_and_token_ops.py
 import os
 import json
+import time
+import logging
+import threading
 from web3 import Web3, Account
-from bot.bot import users
-from utils.data_utils import log_transaction, get_user_id_by_address, log_notification, has_user_been_notified
-from utils.eth_utils import send_eth
+from web3.exceptions import ContractLogicError
+from utils.state_manager import state_manager
+from utils.data_utils import get_user_id_by_address, get_user_ids_by_addresses, claim_notification
+from utils.eth_utils import w3, send_eth, next_nonce, rpc_batch, wait_for_receipt, LazyProxy
+from utils.event_utils import decode_receipt_transfers, decode_receipt_events
+from utils.token_reads import CONTRACT_ADDRESS, BALANCE_OF_SELECTOR, _artifact, _quantity, get_balances_many
 from utils.encryption_utils import encrypt, decrypt, generate_random_password
+from utils.crypto_pool import crypto_pool
+from utils.models import User, Wallet
+from utils.leaderboards import leaderboards
+from utils.history_store import history_store
+from utils.tracing import span
+from utils.metrics import registry
+
+log = logging.getLogger(__name__)
+
+users = state_manager.users
 
 try:
     from dotenv import load_dotenv
@@ -44,7 +60,6 @@ def normalize_privkey(pk: str) -> str:
         raise SystemExit("MAIN_ACCOUNT_PRIVATE_KEY must be 32-byte hex")
     return pk
 
-WEB3_PROVIDER_URL = os.getenv("WEB3_PROVIDER_URL", "http://127.0.0.1:7545")
 CHAIN_ID = as_int("CHAIN_ID", 1337)
 GAS_PRICE_GWEI = as_int("GAS_PRICE_GWEI", 50)
 GAS_LIMIT_BUY = as_int("GAS_LIMIT_BUY", 210000)
@@ -57,63 +72,85 @@ CONTRACT_SOURCE_FILE = os.getenv("CONTRACT_SOURCE_FILE", "OrvynToken.sol")
 CONTRACT_NAME = os.getenv("CONTRACT_NAME", "OrvynToken")
 MAIN_ACCOUNT_ADDRESS = checksum_addr(require_env("MAIN_ACCOUNT_ADDRESS"))
 MAIN_ACCOUNT_PRIVATE_KEY = normalize_privkey(require_env("MAIN_ACCOUNT_PRIVATE_KEY"))
-CONTRACT_ADDRESS = checksum_addr(require_env("CONTRACT_ADDRESS"))
+# The ethToEuro literal in deploy/OrvynToken.sol buyTokens (not readable on-chain); change both together.
+TOKEN_ETH_TO_EURO = 3549
+# The owner's balance (the stock purchases are paid from) is re-read after this long even without a Transfer.
+TOKEN_STATE_TTL_SECONDS = float(os.getenv("TOKEN_STATE_TTL_SECONDS", "30"))
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
 
-w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER_URL))
-if not w3.is_connected():
-    raise SystemExit("Connection to provider failed")
+QUOTE_REJECTS = registry.counter(
+    "orvyn_purchase_quotes_rejected_total", "Purchases refused before sending, by where the check ran.", ("stage",))
 
-with open(COMPILED_CODE_PATH, "r") as f:
-    compiled_sol = json.load(f)
-try:
-    abi = compiled_sol["contracts"][CONTRACT_SOURCE_FILE][CONTRACT_NAME]["abi"]
-except Exception:
-    raise SystemExit("ABI not found in compiled output; check CONTRACT_SOURCE_FILE and CONTRACT_NAME")
+def load_abi():
+    if _artifact is not None and _artifact.get("abi"):
+        return _artifact["abi"]
+    with open(COMPILED_CODE_PATH, "r") as f:
+        compiled_sol = json.load(f)
+    try:
+        return compiled_sol["contracts"][CONTRACT_SOURCE_FILE][CONTRACT_NAME]["abi"]
+    except Exception:
+        raise RuntimeError("ABI not found in compiled output; check CONTRACT_SOURCE_FILE and CONTRACT_NAME")
 
-Token = w3.eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+def load_token():
+    return w3.eth.contract(address=CONTRACT_ADDRESS, abi=load_abi())
+
+Token = LazyProxy(load_token)
 
 def send_eth_to_contract(sender_private_key, sender_address, amount_eth, referrer_address=None):
     tx = Token.functions.buyTokens(referrer_address).build_transaction({
-        "nonce": w3.eth.get_transaction_count(sender_address),
+        "nonce": next_nonce(sender_address),
         "value": w3.to_wei(amount_eth, "ether"),
         "gas": GAS_LIMIT_BUY,
         "gasPrice": w3.to_wei(GAS_PRICE_GWEI, "gwei"),
         "chainId": CHAIN_ID
     })
-    signed = w3.eth.account.sign_transaction(tx, sender_private_key)
+    with span("sign"):
+        signed = w3.eth.account.sign_transaction(tx, sender_private_key)
     tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"Sent {amount_eth} ETH to contract {CONTRACT_ADDRESS}")
+    with span("receipt_wait"):
+        receipt = wait_for_receipt(tx_hash)
+    leaderboards.observe_receipt(receipt)
+    record_history(receipt, users, purchase=True)
+    log.info("Sent %s ETH to contract %s", amount_eth, CONTRACT_ADDRESS)
     return tx_hash
 
-def generate_user_account(user_id, users_dict, email=None, ip=None):
+def create_user_wallet(user_id, users_dict, email=None, ip=None):
+    # A new wallet for the user, no grants yet.
     account = Account.create()
     password = generate_random_password()
-    user_data = {
-        "private_key": encrypt("0x" + account.key.hex(), password),
-        "address": account.address,
-        "name": "Wallet 1",
-        "referrer": None,
-        "password": password
-    }
+    wallet = Wallet(account.address, encrypt("0x" + account.key.hex(), password), password)
     if user_id not in users_dict:
-        users_dict[user_id] = {"email": email, "ip": ip, "wallets": []}
-    users_dict[user_id]["wallets"].append(user_data)
-    send_eth(MAIN_ACCOUNT_PRIVATE_KEY, MAIN_ACCOUNT_ADDRESS, account.address, INITIAL_ETH_GRANT)
-    send_initial_orv(account.address)
-    return user_data
+        users_dict[user_id] = User(email, ip)
+    users_dict[user_id].wallets.append(wallet)
+    return wallet
+
+def send_initial_eth(recipient_address, on_sent=None):
+    return send_eth(MAIN_ACCOUNT_PRIVATE_KEY, MAIN_ACCOUNT_ADDRESS, recipient_address, INITIAL_ETH_GRANT, on_sent)
+
+def generate_user_account(user_id, users_dict, email=None, ip=None):
+    wallet = create_user_wallet(user_id, users_dict, email, ip)
+    send_initial_eth(wallet.address)
+    send_initial_orv(wallet.address)
+    return wallet
 
-def send_initial_orv(recipient_address):
+def send_initial_orv(recipient_address, on_sent=None):
+    # on_sent(tx_hash) runs once the transfer is broadcast, before the receipt wait.
     tx = Token.functions.transfer(recipient_address, INITIAL_TOKEN_GRANT * (10 ** TOKEN_DECIMALS)).build_transaction({
         "chainId": CHAIN_ID,
         "gas": GAS_LIMIT_TRANSFER,
         "gasPrice": w3.to_wei(GAS_PRICE_GWEI, "gwei"),
-        "nonce": w3.eth.get_transaction_count(MAIN_ACCOUNT_ADDRESS),
+        "nonce": next_nonce(MAIN_ACCOUNT_ADDRESS),
     })
-    signed = w3.eth.account.sign_transaction(tx, MAIN_ACCOUNT_PRIVATE_KEY)
+    with span("sign"):
+        signed = w3.eth.account.sign_transaction(tx, MAIN_ACCOUNT_PRIVATE_KEY)
     tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"Sent {INITIAL_TOKEN_GRANT} tokens to {recipient_address}, tx: {receipt.transactionHash.hex()}")
+    if on_sent is not None:
+        on_sent(tx_hash)
+    with span("receipt_wait"):
+        receipt = wait_for_receipt(tx_hash)
+    record_history(receipt, users)
+    log.info("Sent %s tokens to %s, tx: %s", INITIAL_TOKEN_GRANT, recipient_address, receipt.transactionHash.hex())
+    return tx_hash
 
 def get_balances(address):
     orv = Token.functions.balanceOf(address).call() / (10 ** TOKEN_DECIMALS)
@@ -121,50 +158,211 @@ def get_balances(address):
     return orv, eth
 
 def get_total_balances(user_id, users_dict):
-    total_orv = 0.0
-    total_eth = 0.0
-    for wallet in users_dict[user_id]["wallets"]:
-        o, e = get_balances(wallet["address"])
-        total_orv += o
-        total_eth += e
-    return total_orv, total_eth
+    balances = get_balances_many([wallet.address for wallet in users_dict[user_id].wallets])
+    return sum(o for o, _ in balances), sum(e for _, e in balances)
+
+def _word_address(value):
+    # An address returned in a 32-byte eth_call word.
+    return Web3.to_checksum_address("0x" + hex(_quantity(value))[2:].rjust(40, "0"))
+
+def _revert_reason(error):
+    # ContractLogicError carries "execution reverted: <reason>"; node errors arrive as a {"code", "message"} dict.
+    detail = error.args[0] if error.args else error
+    message = str(detail.get("message", detail) if isinstance(detail, dict) else detail)
+    return message.split("execution reverted:", 1)[-1].strip() or "Transaction would revert"
+
+# Token parameters for purchase quotes: rate/referralRewardPercent/owner have no setters, so they are read once;
+# the owner's balance is dropped on any Transfer touching the owner and re-read after TOKEN_STATE_TTL_SECONDS.
+class TokenState:
+    def __init__(self, ttl=TOKEN_STATE_TTL_SECONDS):
+        self.ttl = ttl
+        self._constants = None
+        self._owner_balance = None
+        self._read_at = 0.0
+        self._generation = 0  # bumped on invalidation, so a read racing with it is not cached
+        self._lock = threading.Lock()
+
+    def constants(self):
+        # -> (rate, referral reward percent, owner address)
+        if self._constants is None:
+            with self._lock:
+                if self._constants is None:
+                    names = ("rate", "referralRewardPercent", "owner")
+                    rate, percent, owner = rpc_batch(
+                        ("eth_call", [{"to": CONTRACT_ADDRESS, "data": Token.encodeABI(fn_name=name)}, "latest"])
+                        for name in names
+                    )
+                    self._constants = (_quantity(rate), _quantity(percent), _word_address(owner))
+                    log.info("Token constants: rate %d, referral reward %d%%, owner %s", *self._constants)
+        return self._constants
+
+    def owner_balance(self):
+        # Token base units; a pending-state read, cached until invalidated or stale.
+        balance = self._owner_balance
+        if balance is not None and time.monotonic() - self._read_at < self.ttl:
+            return balance
+        owner = self.constants()[2]
+        generation = self._generation
+        data = BALANCE_OF_SELECTOR + owner[2:].lower().rjust(64, "0")
+        balance = _quantity(rpc_batch([("eth_call", [{"to": CONTRACT_ADDRESS, "data": data}, "pending"])])[0])
+        with self._lock:
+            if generation == self._generation:
+                self._owner_balance, self._read_at = balance, time.monotonic()
+        return balance
+
+    def observe(self, transfers):
+        # Decoded Transfer records (from a receipt or the log subscription).
+        owner = self._constants[2] if self._constants else None
+        if owner and any(owner in (t["from"], t["to"]) for t in transfers):
+            with self._lock:
+                self._owner_balance = None
+                self._generation += 1
+
+token_state = TokenState()
+
+class PurchaseQuote:
+    __slots__ = ("value", "tokens", "reward", "referrer", "error")
+
+    def __init__(self, value, tokens=0, reward=0, referrer=None, error=None):
+        self.value = value  # wei sent
+        self.tokens = tokens  # ORV base units the buyer receives
+        self.reward = reward  # ORV base units paid to the referrer on top, from the owner's stock
+        self.referrer = referrer
+        self.error = error  # why buyTokens would revert or fail to pay for itself; None if it goes through
+
+    @property
+    def ok(self):
+        return self.error is None
+
+def quote_purchase(buyer_address, value_wei, referrer_address=ZERO_ADDRESS):
+    # What buyTokens(referrer) would do, without sending it: local checks first, then one batched read and an
+    # eth_call of buyTokens against pending state to surface any other revert reason.
+    rate, percent, _ = token_state.constants()
+    if value_wei <= 0:
+        QUOTE_REJECTS.inc("local")
+        return PurchaseQuote(value_wei, error="Send ETH to buy ORV.")
+    tokens = value_wei * TOKEN_ETH_TO_EURO // rate
+    if tokens == 0:
+        QUOTE_REJECTS.inc("local")
+        return PurchaseQuote(value_wei, error="That amount is too small to buy any ORV.")
+    stock = token_state.owner_balance()
+    if stock < tokens:
+        QUOTE_REJECTS.inc("local")
+        return PurchaseQuote(value_wei, tokens, error="Not enough tokens available.")
+
+    gas_price = w3.to_wei(GAS_PRICE_GWEI, "gwei")
+    with span("quote_reads"):
+        current, eth_balance = rpc_batch([
+            ("eth_call", [{"to": CONTRACT_ADDRESS, "data": Token.encodeABI(fn_name="referrals", args=[buyer_address])}, "pending"]),
+            ("eth_getBalance", [buyer_address, "pending"]),
+        ])
+    # Same rule as the contract: a referrer is registered once, on the first purchase naming someone else.
+    referrer = _word_address(current)
+    if referrer == ZERO_ADDRESS and referrer_address not in (None, ZERO_ADDRESS) and referrer_address.lower() != buyer_address.lower():
+        referrer = Web3.to_checksum_address(referrer_address)
+    reward = tokens * percent // 100 if referrer != ZERO_ADDRESS else 0
+    quote = PurchaseQuote(value_wei, tokens, reward, None if referrer == ZERO_ADDRESS else referrer)
+    if _quantity(eth_balance) < value_wei + GAS_LIMIT_BUY * gas_price:
+        quote.error = f"Not enough ETH for {Web3.from_wei(value_wei, 'ether')} ETH plus gas."
+    elif stock < tokens + reward:
+        quote.error = "Not enough tokens available to pay the referral reward."
+    if quote.error:
+        QUOTE_REJECTS.inc("local")
+        return quote
+
+    tx = {
+        "from": buyer_address, "to": CONTRACT_ADDRESS, "value": value_wei, "gas": GAS_LIMIT_BUY, "gasPrice": gas_price,
+        "data": Token.encodeABI(fn_name="buyTokens", args=[referrer_address or ZERO_ADDRESS]),
+    }
+    try:
+        with span("simulate"):
+            w3.eth.call(tx, "pending")
+    except (ContractLogicError, ValueError) as e:  # a revert, or the node refusing the call (funds, gas)
+        quote.error = _revert_reason(e)
+    if quote.error:
+        QUOTE_REJECTS.inc("simulation")
+        log.info("Purchase of %s wei by %s would fail: %s", value_wei, buyer_address, quote.error)
+    return quote
 
 def transfer_tokens(interaction, sender_private_key, sender_address, recipient_address, amount, bot):
     tx = Token.functions.transfer(recipient_address, int(amount * (10 ** TOKEN_DECIMALS))).build_transaction({
         "chainId": CHAIN_ID,
         "gas": GAS_LIMIT_TRANSFER,
         "gasPrice": w3.to_wei(GAS_PRICE_GWEI, "gwei"),
-        "nonce": w3.eth.get_transaction_count(sender_address),
+        "nonce": next_nonce(sender_address),
     })
-    signed = w3.eth.account.sign_transaction(tx, sender_private_key)
+    with span("sign"):
+        signed = w3.eth.account.sign_transaction(tx, sender_private_key)
     try:
         tx_hash = w3.eth.send_raw_transaction(signed.raw_transaction)
-        receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
-        print(f"Transfer successful: {receipt.transactionHash.hex()}")
-        details = get_transaction_details(receipt.transactionHash.hex(), bot, users)
-        log_transaction(str(interaction.user.id), details)
+        with span("receipt_wait"):
+            receipt = wait_for_receipt(tx_hash)
+        log.info("Transfer successful: %s", receipt.transactionHash.hex())
+        leaderboards.observe_receipt(receipt)
+        record_history(receipt, users)
+        get_transaction_details(receipt.transactionHash.hex(), bot, users)
         return receipt.transactionHash.hex()
     except ValueError as e:
-        print(f"Transfer error: {e}")
+        log.warning("Transfer error: %s", e)
         return None
 
+def batch_transfer_tokens(sender_private_key, sender_address, payouts):
+    # payouts: [(recipient_address, amount_orv)]; nonces are assigned locally and signing fans out over the crypto pool.
+    nonce = next_nonce(sender_address, len(payouts))
+    gas_price = w3.to_wei(GAS_PRICE_GWEI, "gwei")
+    txs = []
+    for i, (recipient_address, amount) in enumerate(payouts):
+        tx = Token.functions.transfer(recipient_address, int(amount * (10 ** TOKEN_DECIMALS))).build_transaction({
+            "chainId": CHAIN_ID,
+            "gas": GAS_LIMIT_TRANSFER,
+            "gasPrice": gas_price,
+            "nonce": nonce + i,
+            "from": sender_address,
+        })
+        txs.append((tx, sender_private_key))
+    with span("sign", count=len(txs)):
+        signed = crypto_pool.sign_many(txs)
+    tx_hashes = [w3.eth.send_raw_transaction(raw) for raw, _ in signed]
+    with span("receipt_wait", count=len(tx_hashes)):
+        receipts = [wait_for_receipt(h) for h in tx_hashes]
+    log.info("Batch transfer: %d payouts from %s", len(receipts), sender_address)
+    return [r.transactionHash.hex() for r in receipts]
+
 def get_transaction_details(tx_hash, bot, users_dict):
     receipt = w3.eth.get_transaction_receipt(tx_hash)
-    logs = Token.events.Transfer().process_receipt(receipt)
-    value = logs[0]["args"]["value"] / (10 ** TOKEN_DECIMALS) if logs else 0
-    from_address = logs[0]["args"]["from"] if logs else ""
-    to_address = logs[0]["args"]["to"] if logs else ""
-    recipient_user_id = get_user_id_by_address(to_address, users_dict)
-    if recipient_user_id:
-        recipient = bot.get_user(int(recipient_user_id))
-        if recipient:
-            bot.loop.create_task(send_notification(recipient, from_address, value, tx_hash))
+    with span("decode_logs"):
+        logs = decode_receipt_transfers(receipt)
+    value = logs[0]["value"] / (10 ** TOKEN_DECIMALS) if logs else 0
+    from_address = logs[0]["from"] if logs else ""
+    to_address = logs[0]["to"] if logs else ""
+    recipient_user_id = get_user_id_by_address(to_address, dict(users_dict))
+    if recipient_user_id and claim_notification(recipient_user_id, tx_hash):
+        # May run on a job worker thread; the dispatcher takes it from here on the bot loop.
+        bot.dispatcher.notify_user_threadsafe(recipient_user_id, f"You received {value} ORV from {from_address}.", tx_hash)
     return {"from": from_address, "to": to_address, "value": value, "hash": receipt.transactionHash.hex()}
 
-async def send_notification(user, from_address, amount, tx_hash):
-    try:
-        if not has_user_been_notified(user.id, tx_hash):
-            await user.send(f"You received {amount} ORV from {from_address}.")
-            log_notification(user.id, tx_hash)
-    except Exception as e:
-        print(f"DM failed for {user}: {e}")
+def record_history(receipt, users_dict, purchase=False):
+    # One history row per side a known user is on: sender ("sent"), recipient ("received", or "purchase" for
+    # tokens bought from the contract) and referrer ("referral_reward" for the payout leg).
+    transfers, _ = decode_receipt_events(receipt["logs"])
+    token_state.observe(transfers)
+    # Runs on job threads while the loop may add users: scan a copy, not the live dict.
+    owners = get_user_ids_by_addresses({a for t in transfers for a in (t["from"], t["to"])}, dict(users_dict))
+    tx_hash = receipt["transactionHash"].hex()
+    rows = []
+    for t in transfers:
+        value = t["value"]
+        sender, recipient = owners.get(t["from"]), owners.get(t["to"])
+        if t["reward"]:
+            if recipient:
+                rows.append((recipient, "referral_reward", tx_hash, t["logIndex"], t["from"], t["to"], value))
+            continue
+        if purchase:
+            if recipient:
+                rows.append((recipient, "purchase", tx_hash, t["logIndex"], t["from"], t["to"], value))
+            continue
+        if sender:
+            rows.append((sender, "sent", tx_hash, t["logIndex"], t["from"], t["to"], value))
+        if recipient:
+            rows.append((recipient, "received", tx_hash, t["logIndex"], t["from"], t["to"], value))
+    history_store.record(rows)
@@ -0,0 +1,165 @@
+# utils/crypto_pool.py
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from eth_account import Account
+from utils.encryption_utils import encrypt, decrypt
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+CRYPTO_WORKERS = int(os.getenv("CRYPTO_WORKERS", str(os.cpu_count() or 2)))
+CRYPTO_BATCH_SIZE = int(os.getenv("CRYPTO_BATCH_SIZE", "256"))
+CRYPTO_BATCH_DELAY_MS = float(os.getenv("CRYPTO_BATCH_DELAY_MS", "2"))
+# Below this many items a bulk call runs inline; process round-trips would cost more than they save.
+CRYPTO_INLINE_MAX = int(os.getenv("CRYPTO_INLINE_MAX", "32"))
+
+# Set in pool workers: they run every batch inline and never start a pool of their own.
+_in_worker = False
+
+def _init_worker():
+    global _in_worker
+    _in_worker = True
+
+# Batch functions executed inside worker processes (module-level so they pickle).
+
+def _decrypt_batch(items):
+    return [decrypt(data, password) for data, password in items]
+
+def _encrypt_batch(items):
+    return [encrypt(data, password) for data, password in items]
+
+def _sign_batch(items):
+    signed = []
+    for tx, private_key in items:
+        s = Account.sign_transaction(tx, private_key)
+        signed.append((bytes(s.raw_transaction), bytes(s.hash)))
+    return signed
+
+def _create_batch(items):
+    created = []
+    for _ in items:
+        account = Account.create()
+        created.append(("0x" + account.key.hex(), account.address))
+    return created
+
+_BATCH_FUNCS = {
+    "decrypt": _decrypt_batch,
+    "encrypt": _encrypt_batch,
+    "sign": _sign_batch,
+    "create": _create_batch,
+}
+
+class CryptoPool:
+    def __init__(self, workers=CRYPTO_WORKERS, batch_size=CRYPTO_BATCH_SIZE, batch_delay_ms=CRYPTO_BATCH_DELAY_MS):
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self.batch_delay = batch_delay_ms / 1000.0
+        self._executor = None
+        self._pending = {}
+        self._flush_handles = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn: never fork a process that is running the bot loop and job threads. A spawned worker
+            # re-imports the parent's __main__ first, so entry points (main.py, orvyn.py, bot.cluster) keep
+            # their heavy imports inside their __main__ blocks and functions.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _chunks(self, items):
+        # Spread large batches over all workers instead of filling one worker's chunk first.
+        size = min(self.batch_size, max(1, -(-len(items) // self.workers)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _run_many(self, op, items):
+        items = list(items)
+        if len(items) <= CRYPTO_INLINE_MAX or _in_worker:
+            return _BATCH_FUNCS[op](items)
+        results = []
+        for chunk in self._get_executor().map(_BATCH_FUNCS[op], self._chunks(items)):
+            results.extend(chunk)
+        return results
+
+    # Blocking bulk API, for Flask threads, job workers and admin scripts.
+
+    def decrypt_many(self, items):
+        return self._run_many("decrypt", items)
+
+    def encrypt_many(self, items):
+        return self._run_many("encrypt", items)
+
+    def sign_many(self, items):
+        return self._run_many("sign", items)
+
+    def create_accounts(self, count):
+        return self._run_many("create", [None] * count)
+
+    # Async API: single requests from the event loop are coalesced into batches.
+
+    def _submit(self, op, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(op, [])
+        pending.append((item, future))
+        if len(pending) >= self.batch_size:
+            self._flush(op)
+        elif op not in self._flush_handles:
+            self._flush_handles[op] = loop.call_later(self.batch_delay, self._flush, op)
+        return future
+
+    def _flush(self, op):
+        handle = self._flush_handles.pop(op, None)
+        if handle is not None:
+            handle.cancel()
+        batch = self._pending.pop(op, [])
+        if not batch:
+            return
+        items = [item for item, _ in batch]
+        futures = [future for _, future in batch]
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(self._get_executor(), _BATCH_FUNCS[op], items)
+        task.add_done_callback(lambda t: self._resolve(t, futures))
+
+    @staticmethod
+    def _resolve(task, futures):
+        if task.cancelled():
+            for future in futures:
+                if not future.done():
+                    future.cancel()
+            return
+        error = task.exception()
+        for i, future in enumerate(futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(task.result()[i])
+
+    def decrypt(self, data, password):
+        return self._submit("decrypt", (data, password))
+
+    def encrypt(self, data, password):
+        return self._submit("encrypt", (data, password))
+
+    def sign_transaction(self, tx, private_key):
+        return self._submit("sign", (tx, private_key))
+
+    def create_account(self):
+        return self._submit("create", None)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+crypto_pool = CryptoPool()
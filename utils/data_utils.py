@@ -1,8 +1,13 @@
 # utils/data_utils.py
 import os
 import json
+import tempfile
+import threading
 from pathlib import Path
-from utils.encryption_utils import encrypt, decrypt
+from contextlib import contextmanager
+from utils.metrics import timed_storage
+from utils.models import parse_users, iter_wallets, dump_users, address_bytes
+from utils.shared_store import shared_store
 
 try:
     from dotenv import load_dotenv
@@ -19,41 +24,46 @@ REFERRAL_CODES_DEFAULT = os.getenv("REFERRAL_CODES_DEFAULT", "{}")
 def _ensure_parent(path: str):
     Path(path).parent.mkdir(parents=True, exist_ok=True)
 
+@contextmanager
+def _atomic_open(path: str, encoding="utf-8"):
+    # Writes go to a uniquely named temp file beside `path`, renamed over it only once complete: a crash
+    # mid-write leaves the previous file, and concurrent writers (threads, other processes) never share a temp.
+    _ensure_parent(path)
+    fd, tmp = tempfile.mkstemp(dir=str(Path(path).parent), prefix=f".{Path(path).name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+
+@timed_storage("load_users")
 def load_users(filepath: str = None):
     fp = filepath or USERS_FILE
     if os.path.exists(fp):
         with open(fp, "r", encoding="utf-8") as f:
-            encrypted_users = json.load(f)
-        users = {}
-        for user_id, user_data in encrypted_users.items():
-            user_info = {"email": user_data.get("email"), "ip": user_data.get("ip"), "wallets": []}
-            for wallet in user_data.get("wallets", []):
-                decrypted_private_key = decrypt(wallet["private_key"], wallet["password"])
-                w = wallet.copy()
-                w["private_key"] = decrypted_private_key
-                user_info["wallets"].append(w)
-            users[user_id] = user_info
+            users = parse_users(json.load(f))
+        wallets = list(iter_wallets(users))
+        from utils.crypto_pool import crypto_pool  # loads eth_account; only needed once keys are touched
+        keys = crypto_pool.decrypt_many((w.private_key, w.password) for w in wallets)
+        for w, decrypted_private_key in zip(wallets, keys):
+            w.private_key = decrypted_private_key
         return users
     return {}
 
+@timed_storage("save_users")
 def save_users(users, filepath: str = None):
     fp = filepath or USERS_FILE
-    _ensure_parent(fp)
-    encrypted_users = {}
-    for user_id, user_info in users.items():
-        encrypted_wallets = []
-        for wallet in user_info.get("wallets", []):
-            encrypted_private_key = encrypt(wallet["private_key"], wallet["password"])
-            wallet_copy = wallet.copy()
-            wallet_copy["private_key"] = encrypted_private_key
-            encrypted_wallets.append(wallet_copy)
-        encrypted_users[user_id] = {
-            "email": user_info.get("email"),
-            "ip": user_info.get("ip"),
-            "wallets": encrypted_wallets,
-        }
-    with open(fp, "w", encoding="utf-8") as f:
-        json.dump(encrypted_users, f, indent=4)
+    from utils.crypto_pool import crypto_pool
+    encrypted_keys = iter(crypto_pool.encrypt_many((w.private_key, w.password) for w in iter_wallets(users)))
+    with _atomic_open(fp) as f:
+        dump_users(users, f, encrypted_keys)
 
 def reload_users():
     global users
@@ -65,6 +75,7 @@ def _parse_referral_default():
     except Exception:
         return {}
 
+@timed_storage("load_referral_codes")
 def load_referral_codes(filepath: str = None):
     fp = filepath or REFERRAL_CODES_FILE
     if os.path.exists(fp):
@@ -72,6 +83,7 @@ def load_referral_codes(filepath: str = None):
             return json.load(f)
     return _parse_referral_default()
 
+@timed_storage("load_transactions")
 def load_transactions(filepath: str = None):
     fp = filepath or TRANSACTIONS_FILE
     if os.path.exists(fp):
@@ -79,6 +91,7 @@ def load_transactions(filepath: str = None):
             return json.load(f)
     return {}
 
+@timed_storage("log_transaction")
 def log_transaction(user_id, tx_details, filepath: str = None):
     fp = filepath or TRANSACTIONS_FILE
     _ensure_parent(fp)
@@ -88,12 +101,33 @@ def log_transaction(user_id, tx_details, filepath: str = None):
         json.dump(transactions, f, indent=4)
 
 def get_user_id_by_address(address, users):
-    for user_id, user_info in users.items():
-        for wallet in user_info.get("wallets", []):
-            if wallet.get("address") == address:
+    try:
+        target = address_bytes(address)
+    except ValueError:
+        return None
+    for user_id, user in users.items():
+        for wallet in user.wallets:
+            if wallet.address_bytes == target:
                 return user_id
     return None
 
+def get_user_ids_by_addresses(addresses, users):
+    # One pass over the store for several lookups: {address: user id or None}.
+    wanted = {}
+    for address in addresses:
+        try:
+            wanted[address_bytes(address)] = address
+        except ValueError:
+            pass
+    found = dict.fromkeys(addresses)
+    for user_id, user in users.items():
+        for wallet in user.wallets:
+            address = wanted.get(wallet.address_bytes)
+            if address is not None:
+                found[address] = user_id
+    return found
+
+@timed_storage("has_user_been_notified")
 def has_user_been_notified(user_id, tx_hash, filepath: str = None):
     fp = filepath or NOTIFICATIONS_FILE
     if os.path.exists(fp):
@@ -102,6 +136,7 @@ def has_user_been_notified(user_id, tx_hash, filepath: str = None):
             return tx_hash in notifications.get(str(user_id), [])
     return False
 
+@timed_storage("log_notification")
 def log_notification(user_id, tx_hash, filepath: str = None):
     fp = filepath or NOTIFICATIONS_FILE
     _ensure_parent(fp)
@@ -114,3 +149,31 @@ def log_notification(user_id, tx_hash, filepath: str = None):
         notifications[str(user_id)].append(tx_hash)
     with open(fp, "w", encoding="utf-8") as f:
         json.dump(notifications, f, indent=4)
+
+_notification_lock = threading.Lock()
+
+def claim_notification(user_id, tx_hash):
+    # True for exactly one caller per (user, tx), across processes when a shared store is configured.
+    if shared_store is not None:
+        return shared_store.claim_notification(user_id, tx_hash)
+    with _notification_lock:
+        if has_user_been_notified(user_id, tx_hash):
+            return False
+        log_notification(user_id, tx_hash)
+        return True
+
+def release_notification(user_id, tx_hash):
+    # Undo a claim whose delivery failed, so a later attempt may send it.
+    if shared_store is not None:
+        shared_store.release_notification(user_id, tx_hash)
+        return
+    fp = NOTIFICATIONS_FILE
+    with _notification_lock:
+        if os.path.exists(fp):
+            with open(fp, "r", encoding="utf-8") as f:
+                notifications = json.load(f)
+            sent = notifications.get(str(user_id), [])
+            if tx_hash in sent:
+                sent.remove(tx_hash)
+                with open(fp, "w", encoding="utf-8") as f:
+                    json.dump(notifications, f, indent=4)
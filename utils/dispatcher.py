@@ -0,0 +1,212 @@
+# utils/dispatcher.py
+import os
+import time
+import asyncio
+import logging
+import discord
+from utils.data_utils import release_notification
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+DISPATCH_CONCURRENCY = int(os.getenv("DISPATCH_CONCURRENCY", "4"))
+# Messages to one route arriving within this long of its previous send are merged into the next one.
+DISPATCH_DM_COALESCE_SECONDS = float(os.getenv("DISPATCH_DM_COALESCE_SECONDS", "2"))
+DISPATCH_FEED_COALESCE_SECONDS = float(os.getenv("DISPATCH_FEED_COALESCE_SECONDS", "1"))
+DISPATCH_MAX_ATTEMPTS = int(os.getenv("DISPATCH_MAX_ATTEMPTS", "5"))
+DISPATCH_DRAIN_SECONDS = float(os.getenv("DISPATCH_DRAIN_SECONDS", "10"))
+
+EMBEDS_PER_MESSAGE = 10  # Discord's limit per message
+DIGEST_LINES = 20  # keeps a digest DM well under the 2000 character limit
+
+# Route priorities, lowest first: a user's DM goes out before the next feed post.
+DM, FEED = 0, 1
+
+DISPATCH_SENT = registry.counter("orvyn_dispatch_messages_total", "Discord messages sent by the dispatcher.", ("kind",))
+DISPATCH_ITEMS = registry.counter("orvyn_dispatch_items_total", "Notifications/embeds delivered, after coalescing.", ("kind",))
+DISPATCH_RETRIES = registry.counter("orvyn_dispatch_retries_total", "Sends retried after a 429 or server error.", ("kind",))
+DISPATCH_DROPPED = registry.counter("orvyn_dispatch_dropped_total", "Notifications/embeds given up on.", ("kind",))
+
+log = logging.getLogger(__name__)
+
+class _Route:
+    __slots__ = ("kind", "priority", "target_id", "items", "first_at", "last_sent_at", "blocked_until", "busy", "attempts")
+
+    def __init__(self, kind, priority, target_id):
+        self.kind = kind
+        self.priority = priority
+        self.target_id = target_id
+        self.items = []
+        self.first_at = 0.0
+        self.last_sent_at = float("-inf")
+        self.blocked_until = 0.0
+        self.busy = False
+        self.attempts = 0
+
+class Dispatcher:
+    """Single outlet for the bot's own messages: transfer DMs and the transaction feed channel.
+
+    Each DM recipient and channel is a route with its own queue and its own rate-limit state. A route's
+    first message goes out right away; whatever arrives while it is sending, or within the coalesce
+    window after, is merged: up to ten embeds per feed message, one digest DM per burst of transfers.
+    A 429 (or 5xx) pauses only that route, for the Retry-After Discord sent, and the batch is retried.
+    At most DISPATCH_CONCURRENCY sends are in flight, and DMs are picked before feed posts.
+    """
+
+    def __init__(self, bot, concurrency=DISPATCH_CONCURRENCY):
+        self.bot = bot
+        self.concurrency = concurrency
+        self._routes = {}
+        self._in_flight = 0
+        self._tasks = set()
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    # Producers. These run on the bot loop; the *_threadsafe variants may be called from job threads.
+
+    def notify_user(self, user_id, text, tx_hash=None):
+        self._enqueue(("dm", int(user_id)), "dm", DM, (text, tx_hash))
+
+    def post_embed(self, channel_id, embed):
+        self._enqueue(("channel", int(channel_id)), "feed", FEED, embed)
+
+    def notify_user_threadsafe(self, user_id, text, tx_hash=None):
+        self.bot.loop.call_soon_threadsafe(self.notify_user, user_id, text, tx_hash)
+
+    def post_embed_threadsafe(self, channel_id, embed):
+        self.bot.loop.call_soon_threadsafe(self.post_embed, channel_id, embed)
+
+    def pending(self):
+        return sum(len(r.items) for r in self._routes.values())
+
+    def _enqueue(self, key, kind, priority, item):
+        route = self._routes.get(key)
+        if route is None:
+            route = self._routes[key] = _Route(kind, priority, key[1])
+        if not route.items:
+            route.first_at = time.monotonic()
+        route.items.append(item)
+        self._idle.clear()
+        self._wake.set()
+
+    # Scheduling
+
+    def _due(self, route):
+        window = DISPATCH_DM_COALESCE_SECONDS if route.kind == "dm" else DISPATCH_FEED_COALESCE_SECONDS
+        due = max(route.first_at, route.last_sent_at + window, route.blocked_until)
+        if route.kind == "feed" and len(route.items) >= EMBEDS_PER_MESSAGE:
+            due = max(route.first_at, route.blocked_until)  # a full message has nothing left to wait for
+        return due
+
+    async def run(self):
+        while True:
+            self._wake.clear()
+            now = time.monotonic()
+            ready, next_due = [], None
+            for key, route in list(self._routes.items()):
+                if route.busy:
+                    continue
+                if not route.items:
+                    if now - route.last_sent_at > DISPATCH_DM_COALESCE_SECONDS + DISPATCH_FEED_COALESCE_SECONDS:
+                        del self._routes[key]  # nothing left to coalesce with
+                    continue
+                due = self._due(route)
+                if due <= now:
+                    ready.append(route)
+                elif next_due is None or due < next_due:
+                    next_due = due
+            ready.sort(key=lambda r: (r.priority, r.first_at))
+            for route in ready[:max(0, self.concurrency - self._in_flight)]:
+                self._start(route)
+            if not self._in_flight and not any(r.items for r in self._routes.values()):
+                self._idle.set()
+            timeout = None if next_due is None else max(0.0, next_due - now)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _start(self, route):
+        limit = DIGEST_LINES if route.kind == "dm" else EMBEDS_PER_MESSAGE
+        batch = route.items[:limit]
+        del route.items[:limit]
+        route.busy = True
+        self._in_flight += 1
+        self._spawn(self._deliver(route, batch))
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, route, batch):
+        try:
+            await self._send(route, batch)
+        except (discord.Forbidden, discord.NotFound) as e:
+            self._drop(route, batch, e)
+        except discord.RateLimited as e:
+            self._retry(route, batch, e.retry_after, e)
+        except discord.HTTPException as e:
+            if e.status == 429 or e.status >= 500:
+                retry_after = e.response.headers.get("Retry-After") if e.response is not None else None
+                self._retry(route, batch, float(retry_after) if retry_after else 2 ** route.attempts, e)
+            else:
+                self._drop(route, batch, e)
+        except Exception as e:
+            self._drop(route, batch, e)
+        else:
+            route.attempts = 0
+            route.last_sent_at = time.monotonic()
+            DISPATCH_SENT.inc(route.kind)
+            DISPATCH_ITEMS.inc(route.kind, amount=len(batch))
+        finally:
+            route.busy = False
+            self._in_flight -= 1
+            self._wake.set()
+
+    async def _send(self, route, batch):
+        if route.kind == "dm":
+            user = self.bot.get_user(route.target_id) or await self.bot.fetch_user(route.target_id)
+            if len(batch) == 1:
+                content = batch[0][0]
+            else:
+                content = f"{len(batch)} transfers arrived:\n" + "\n".join(f"• {text}" for text, _ in batch)
+            await user.send(content)
+        else:
+            channel = self.bot.get_channel(route.target_id) or await self.bot.fetch_channel(route.target_id)
+            await channel.send(embeds=batch)
+
+    def _retry(self, route, batch, retry_after, error):
+        route.attempts += 1
+        if route.attempts >= DISPATCH_MAX_ATTEMPTS:
+            route.attempts = 0
+            self._drop(route, batch, error)
+            return
+        route.items[:0] = batch  # back at the front, ahead of anything queued since
+        route.blocked_until = time.monotonic() + retry_after
+        DISPATCH_RETRIES.inc(route.kind)
+        log.info("Discord %s route %s limited, retrying %d item(s) in %.2fs: %s",
+                 route.kind, route.target_id, len(batch), retry_after, error)
+
+    def _drop(self, route, batch, error):
+        DISPATCH_DROPPED.inc(route.kind, amount=len(batch))
+        log.warning("Dropped %d %s item(s) for %s: %s", len(batch), route.kind, route.target_id, error)
+        if route.kind == "dm":
+            # Undelivered, so a later attempt (e.g. after a restart) may notify again.
+            hashes = [h for _, h in batch if h]
+            if hashes:
+                self._spawn(asyncio.to_thread(lambda: [release_notification(route.target_id, h) for h in hashes]))
+
+    async def drain(self, timeout=DISPATCH_DRAIN_SECONDS):
+        # On shutdown: give queued messages a chance to go out.
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            log.warning("Shutting down with %d undelivered Discord message(s)", self.pending())
+            return False
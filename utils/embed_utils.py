@@ -1,17 +1,25 @@
 import discord
-from utils.contract_utils import get_balances, get_total_balances
-from bot.bot import users, referral_codes
+from decimal import Decimal
+from datetime import datetime, timezone
+from web3 import Web3
+from utils.contract_utils import get_balances, get_total_balances, TOKEN_DECIMALS
+from bot.bot import users
+from utils.referrals import referrals
+from utils.leaderboards import leaderboards, BOARDS
+from utils.history_store import KINDS
 import logging
 
+log = logging.getLogger(__name__)
+
 def generate_wallet_embed(user_id, wallet_index):
     if user_id not in users:
-        logging.error(f"User {user_id} not found in user data.")
+        log.error("User %s not found in user data.", user_id)
         raise KeyError(f"User {user_id} not found in user data.")
 
-    user_info = users[user_id]['wallets'][wallet_index]
-    logging.debug(f"User {user_id} info: {user_info}")
-    address = user_info["address"]
-    name = user_info["name"]
+    wallet = users[user_id].wallets[wallet_index]
+    log.debug("Rendering wallet %d of user %s", wallet_index, user_id)
+    address = wallet.address
+    name = wallet.name
     orv_balance, eth_balance = get_balances(address)
     total_orv, total_eth = get_total_balances(user_id, users)
 
@@ -26,17 +34,80 @@ def generate_wallet_embed(user_id, wallet_index):
 
 def generate_settings_embed(user_id):
     if user_id not in users:
-        logging.error(f"User {user_id} not found in user data.")
+        log.error("User %s not found in user data.", user_id)
         raise KeyError(f"User {user_id} not found in user data.")
 
-    user_info = users[user_id]['wallets'][0]
-    referrer_code = None
-    for code, uid in referral_codes.items():
-        if uid == user_info["referrer"]:
-            referrer_code = code
-            break
+    wallet = users[user_id].wallets[0]
+    referrer_code = referrals.code_for(wallet.referrer) if wallet.referrer else None
 
     embed = discord.Embed(title=f"Settings — {user_id}", color=discord.Color.green())
     embed.add_field(name="Referrer", value=f"{referrer_code if referrer_code else 'None'}", inline=True)
     embed.set_footer(text="Use the buttons below to modify your settings.")
     return embed
+
+def generate_leaderboard_embed(board):
+    entries = leaderboards.top(board)
+    embed = discord.Embed(title=f"Leaderboard — {board.capitalize()}", description=BOARDS[board], color=discord.Color.gold())
+    if not entries:
+        embed.add_field(name="No entries yet", value="Nothing has been recorded for this board.", inline=False)
+    for rank, address, user_id, amount in entries:
+        who = f"<@{user_id}>" if user_id else f"`{address[:10]}…{address[-4:]}`"
+        embed.add_field(name=f"#{rank}", value=f"{who} — {amount:,.2f} ORV", inline=False)
+    embed.set_footer(text=f"Top {leaderboards.k}")
+    if leaderboards.updated_at:
+        embed.timestamp = datetime.fromtimestamp(leaderboards.updated_at, tz=timezone.utc)
+    return embed
+
+def generate_history_embed(page, kind=None):
+    title = f"Transaction History — {KINDS[kind]}" if kind else "Transaction History"
+    embed = discord.Embed(title=title, color=discord.Color.blue())
+    if not page.entries:
+        embed.description = "No transactions found."
+    for entry in page.entries:
+        when = f"<t:{int(entry['timestamp'])}:f>" if entry["timestamp"] is not None else "Date unknown (imported)"
+        embed.add_field(
+            name=f"{KINDS.get(entry['kind'], entry['kind'])} · {entry['hash'][:10]}…{entry['hash'][-6:]}",
+            value=f"From: {entry['from']}\nTo: {entry['to']}\nValue: {format_orv(entry['value'])} ORV\n{when}",
+            inline=False
+        )
+    embed.set_footer(text="Newest first. Use the buttons below to page through your history.")
+    return embed
+
+def generate_stats_embed(stats):
+    embed = discord.Embed(title=f"Stats — last {stats['days']} day(s)", color=discord.Color.purple())
+    embed.add_field(name="Transfer volume", value=f"{stats['volume']:,.2f} ORV", inline=True)
+    embed.add_field(name="Transfers", value=f"{stats['transfers']:,}", inline=True)
+    embed.add_field(name="Median transfer", value=f"{stats['median_transfer']:,.2f} ORV", inline=True)
+    embed.add_field(name="Purchased", value=f"{stats['purchase_inflow']:,.2f} ORV", inline=True)
+    embed.add_field(
+        name="Referral payouts",
+        value=f"{stats['referral_rewards']:,.2f} ORV ({stats['referral_share']:.2%})",
+        inline=True
+    )
+    embed.add_field(name="Active wallets", value=f"{stats['active_wallets']:,}", inline=True)
+    lines = [f"{d['date']}  {d['volume']:>14,.2f}  {d['active_wallets']:>6,}" for d in stats["daily"][-14:]]
+    embed.add_field(
+        name="Per day (UTC): volume, active wallets",
+        value="```\n" + "\n".join(reversed(lines)) + "\n```",
+        inline=False
+    )
+    embed.set_footer(text="From the bot's transaction history.")
+    embed.timestamp = stats["since"]
+    return embed
+
+def format_orv(units):
+    # Token base units as an exact decimal string.
+    return f"{Decimal(units).scaleb(-TOKEN_DECIMALS).normalize():f}"
+
+def generate_purchase_quote_embed(quote):
+    embed = discord.Embed(title="Purchase Quote", color=discord.Color.blue())
+    embed.add_field(name="You pay", value=f"{Web3.from_wei(quote.value, 'ether')} ETH + gas", inline=True)
+    embed.add_field(name="You receive", value=f"{format_orv(quote.tokens)} ORV", inline=True)
+    if quote.referrer:
+        embed.add_field(
+            name="Referral reward",
+            value=f"{format_orv(quote.reward)} ORV to {quote.referrer} (paid by the contract, not from your purchase)",
+            inline=False
+        )
+    embed.set_footer(text="Simulated against pending state. Nothing is sent until you confirm.")
+    return embed
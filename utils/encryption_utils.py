@@ -1,4 +1,5 @@
 import binascii
+import logging
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 from Crypto.Random import get_random_bytes
@@ -7,6 +8,8 @@ import hashlib
 import random
 import string
 
+log = logging.getLogger(__name__)
+
 
 def get_key_and_iv(password, salt, key_length=32, iv_length=16):
     d = d_i = b""
@@ -34,7 +37,7 @@ def decrypt(encrypted_data, password):
         decrypted_data = unpad(cipher.decrypt(encrypted_data[8:]), AES.block_size)
         return decrypted_data.decode('utf-8')
     except (ValueError, KeyError, binascii.Error) as e:
-        print(f"Error decrypting data: {e}")
+        log.warning("Error decrypting data: %s", e)
         return None
 
 
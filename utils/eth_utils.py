@@ -1,6 +1,16 @@
 # utils/eth_utils.py
 import os
+import time
+import logging
+import threading
+import requests
 from web3 import Web3
+from web3.exceptions import TransactionNotFound, TimeExhausted
+from utils.metrics import instrument_web3, timer, RPC_SECONDS, RPC_ERRORS
+from utils.tracing import trace_web3, span
+from utils.shared_store import shared_store
+from utils.crypto_pool import crypto_pool
+from utils.chain_events import chain_events, is_websocket_url, is_ipc_path
 
 try:
     from dotenv import load_dotenv
@@ -8,14 +18,111 @@ try:
 except Exception:
     pass
 
+log = logging.getLogger(__name__)
+
 WEB3_PROVIDER_URL = os.getenv("WEB3_PROVIDER_URL", "http://127.0.0.1:7545")
 CHAIN_ID = int(os.getenv("CHAIN_ID", "1337"))
 GAS_PRICE_GWEI = int(os.getenv("GAS_PRICE_GWEI", "50"))
 GAS_LIMIT_ETH_TRANSFER = int(os.getenv("GAS_LIMIT_ETH_TRANSFER", "21000"))
+# Calls per JSON-RPC batch request (bulk reads in admin tools).
+RPC_BATCH_SIZE = int(os.getenv("RPC_BATCH_SIZE", "500"))
+RECEIPT_TIMEOUT_SECONDS = float(os.getenv("RECEIPT_TIMEOUT_SECONDS", "120"))
+
+def make_provider(url: str):
+    # "eth-tester" runs an in-process py-evm chain (benchmarks, offline runs); needs eth-tester[py-evm].
+    if url == "eth-tester":
+        from web3 import EthereumTesterProvider
+        return EthereumTesterProvider()
+    # A persistent connection instead of one HTTP request per call; ws:// also serves the subscriptions.
+    if is_websocket_url(url):
+        return Web3.WebsocketProvider(url)
+    if is_ipc_path(url):
+        return Web3.IPCProvider(url)
+    return Web3.HTTPProvider(url)
+
+class LazyProxy:
+    # Builds the wrapped object on first attribute access, so importing a module never opens an RPC connection.
+    __slots__ = ("_factory", "_target", "_lock")
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if self._target is None:
+            with self._lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+def connect():
+    web3 = trace_web3(instrument_web3(Web3(make_provider(WEB3_PROVIDER_URL))))
+    if not web3.is_connected():
+        raise ConnectionError(f"Connection to provider failed: {WEB3_PROVIDER_URL}")
+    log.info("Connected to %s (chain id %s)", WEB3_PROVIDER_URL, web3.eth.chain_id)
+    return web3
+
+w3 = LazyProxy(connect)
 
-w3 = Web3(Web3.HTTPProvider(WEB3_PROVIDER_URL))
-if not w3.is_connected():
-    raise SystemExit("Connection to provider failed")
+_http = threading.local()
+
+def rpc_batch(calls):
+    # calls: [(method, params)] -> results in the same order. Over HTTP they go out RPC_BATCH_SIZE at a time
+    # as JSON-RPC batch requests; other providers (eth-tester) get them one by one. A failed call raises ValueError.
+    calls = list(calls)
+    if not WEB3_PROVIDER_URL.startswith(("http://", "https://")):
+        # Batches are sent over HTTP only; other transports go through web3 so its request formatters apply.
+        return [w3.manager.request_blocking(method, params) for method, params in calls]
+    session = getattr(_http, "session", None)
+    if session is None:
+        session = _http.session = requests.Session()
+    results = []
+    for start in range(0, len(calls), RPC_BATCH_SIZE):
+        chunk = calls[start:start + RPC_BATCH_SIZE]
+        payload = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params} for i, (method, params) in enumerate(chunk)]
+        with span("rpc_batch", count=len(payload)), timer(RPC_SECONDS, RPC_ERRORS, "batch"):
+            resp = session.post(WEB3_PROVIDER_URL, json=payload, timeout=60)
+            resp.raise_for_status()
+            by_id = {r.get("id"): r for r in resp.json()}  # servers may answer a batch in any order
+        for i, (method, _) in enumerate(chunk):
+            response = by_id.get(i) or {"error": {"message": "missing from batch response"}}
+            if response.get("error"):
+                RPC_ERRORS.inc(method)
+                raise ValueError(f"{method} failed: {response['error'].get('message', response['error'])}")
+            results.append(response["result"])
+    return results
+
+def wait_for_receipt(tx_hash, timeout=RECEIPT_TIMEOUT_SECONDS):
+    # With a live newHeads subscription the receipt is looked up once per new block; otherwise web3 polls.
+    if not chain_events.connected:
+        return w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout)
+    deadline = time.monotonic() + timeout
+    while True:
+        head = chain_events.head
+        try:
+            return w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeExhausted(f"Transaction {tx_hash!r} is not in the chain after {timeout} seconds")
+        # Capped, so a subscription that drops mid-wait degrades to a slow poll rather than a stall.
+        chain_events.wait_for_head(head, min(remaining, 2.0))
+
+def next_nonce(address: str, count: int = 1) -> int:
+    # First of `count` consecutive nonces for `address`. With a shared store, processes sending from the
+    # same account (cluster workers, the web tier) reserve nonces there instead of racing on the chain count.
+    if shared_store is None:
+        return w3.eth.get_transaction_count(address)
+    return shared_store.allocate_nonce(address, w3.eth.get_transaction_count(address, "pending"), count)
 
 def _checksum(addr: str) -> str:
     return Web3.to_checksum_address(addr)
@@ -24,19 +131,47 @@ def _normalize_privkey(pk: str) -> str:
     pk = pk.strip()
     return pk if pk.startswith("0x") else "0x" + pk
 
-def send_eth(sender_private_key: str, sender_address: str, recipient_address: str, amount_eth: float):
+def send_eth(sender_private_key: str, sender_address: str, recipient_address: str, amount_eth: float, on_sent=None):
+    # on_sent(tx_hash) runs once the transaction is broadcast, before the receipt wait.
     sender_checksum = _checksum(sender_address)
     recipient_checksum = _checksum(recipient_address)
     tx = {
-        "nonce": w3.eth.get_transaction_count(sender_checksum),
+        "nonce": next_nonce(sender_checksum),
         "to": recipient_checksum,
         "value": w3.to_wei(amount_eth, "ether"),
         "gas": GAS_LIMIT_ETH_TRANSFER,
         "gasPrice": w3.to_wei(GAS_PRICE_GWEI, "gwei"),
         "chainId": CHAIN_ID,
     }
-    signed_tx = w3.eth.account.sign_transaction(tx, _normalize_privkey(sender_private_key))
+    with span("sign"):
+        signed_tx = w3.eth.account.sign_transaction(tx, _normalize_privkey(sender_private_key))
     tx_hash = w3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    w3.eth.wait_for_transaction_receipt(tx_hash)
-    print(f"Sent {amount_eth} ETH to {recipient_checksum}")
+    if on_sent is not None:
+        on_sent(tx_hash)
+    with span("receipt_wait"):
+        wait_for_receipt(tx_hash)
+    log.info("Sent %s ETH to %s", amount_eth, recipient_checksum)
     return tx_hash
+
+def batch_send_eth(sender_private_key: str, sender_address: str, payouts):
+    # payouts: [(recipient_address, amount_eth)]; one nonce block, signing over the crypto pool, one batch of sends.
+    sender_checksum = _checksum(sender_address)
+    private_key = _normalize_privkey(sender_private_key)
+    nonce = next_nonce(sender_checksum, len(payouts))
+    gas_price = w3.to_wei(GAS_PRICE_GWEI, "gwei")
+    txs = [({
+        "nonce": nonce + i,
+        "to": _checksum(recipient_address),
+        "value": w3.to_wei(amount_eth, "ether"),
+        "gas": GAS_LIMIT_ETH_TRANSFER,
+        "gasPrice": gas_price,
+        "chainId": CHAIN_ID,
+    }, private_key) for i, (recipient_address, amount_eth) in enumerate(payouts)]
+    with span("sign", count=len(txs)):
+        signed = crypto_pool.sign_many(txs)
+    tx_hashes = rpc_batch(("eth_sendRawTransaction", ["0x" + raw.hex()]) for raw, _ in signed)
+    with span("receipt_wait", count=len(tx_hashes)):
+        for tx_hash in tx_hashes:
+            wait_for_receipt(tx_hash)
+    log.info("Batch ETH send: %d payouts from %s", len(tx_hashes), sender_checksum)
+    return tx_hashes
@@ -0,0 +1,105 @@
+# utils/event_utils.py
+import numpy as np
+from web3 import Web3
+
+TRANSFER_TOPIC = bytes(Web3.keccak(text="Transfer(address,address,uint256)"))
+REFERRAL_REWARD_TOPIC = bytes(Web3.keccak(text="ReferralReward(address,address,uint256)"))
+
+# topic0 -> (event name, field names). Both events are (address indexed, address indexed, uint256).
+EVENT_LAYOUTS = {
+    TRANSFER_TOPIC: ("Transfer", ("from", "to", "value")),
+    REFERRAL_REWARD_TOPIC: ("ReferralReward", ("referrer", "referee", "reward")),
+}
+
+_checksum_cache = {}
+
+def _as_bytes(v) -> bytes:
+    if isinstance(v, str):
+        return bytes.fromhex(v[2:] if v[:2] in ("0x", "0X") else v)
+    return bytes(v)
+
+def _as_hex(v):
+    if v is None or isinstance(v, str):
+        return v
+    return "0x" + bytes(v).hex()
+
+def _checksum(raw: bytes) -> str:
+    addr = _checksum_cache.get(raw)
+    if addr is None:
+        addr = Web3.to_checksum_address("0x" + raw.hex())
+        _checksum_cache[raw] = addr
+    return addr
+
+def _select(logs, topic0: bytes, address=None):
+    want = address.lower() if address else None
+    selected = []
+    for log in logs:
+        topics = log["topics"]
+        if len(topics) != 3:
+            continue
+        if _as_bytes(topics[0]) != topic0:
+            continue
+        if want and str(log.get("address", "")).lower() != want:
+            continue
+        selected.append(log)
+    return selected
+
+def _decode_fixed(logs, topic0: bytes, address=None):
+    _, (a_key, b_key, v_key) = EVENT_LAYOUTS[topic0]
+    selected = _select(logs, topic0, address)
+    n = len(selected)
+    if n == 0:
+        return []
+
+    topic_buf = b"".join(_as_bytes(log["topics"][1]) + _as_bytes(log["topics"][2]) for log in selected)
+    data_buf = b"".join(_as_bytes(log["data"])[:32] for log in selected)
+    if len(topic_buf) != n * 64 or len(data_buf) != n * 32:
+        raise ValueError("Malformed log: topics and data must be 32-byte words")
+
+    # Addresses are the low 20 bytes of each indexed topic word; checksum each distinct one once.
+    words = np.frombuffer(topic_buf, dtype=np.uint8).reshape(n * 2, 32)
+    addr_view = np.ascontiguousarray(words[:, 12:]).view("V20").ravel()
+    uniq, inverse = np.unique(addr_view, return_inverse=True)
+    names = np.array([_checksum(u.tobytes()) for u in uniq], dtype=object)
+    addrs = names[inverse.ravel()].reshape(n, 2)
+
+    # uint256 as four big-endian uint64 limbs, recombined into exact Python ints column-wise.
+    limbs = np.frombuffer(data_buf, dtype=">u8").reshape(n, 4).astype(object)
+    values = (limbs[:, 0] << 192) | (limbs[:, 1] << 128) | (limbs[:, 2] << 64) | limbs[:, 3]
+
+    records = []
+    for log, (a, b), v in zip(selected, addrs.tolist(), values.tolist()):
+        records.append({
+            a_key: a,
+            b_key: b,
+            v_key: v,
+            "hash": _as_hex(log.get("transactionHash")),
+            "logIndex": log.get("logIndex"),
+            "blockNumber": log.get("blockNumber"),
+        })
+    return records
+
+def decode_transfer_logs(logs, address=None):
+    return _decode_fixed(logs, TRANSFER_TOPIC, address)
+
+def decode_referral_reward_logs(logs, address=None):
+    return _decode_fixed(logs, REFERRAL_REWARD_TOPIC, address)
+
+def decode_receipt_transfers(receipt, address=None):
+    return decode_transfer_logs(receipt["logs"], address)
+
+def decode_receipt_events(logs, address=None):
+    """Transfers and ReferralRewards of one transaction.
+
+    Each Transfer gets a "reward" flag: True for the leg that pays out a ReferralReward in the same
+    transaction, so callers can count the payout once.
+    """
+    rewards = decode_referral_reward_logs(logs, address)
+    unpaid = [(r["referrer"], r["reward"]) for r in rewards]
+    transfers = decode_transfer_logs(logs, address)
+    for t in transfers:
+        leg = (t["to"], t["value"])
+        t["reward"] = leg in unpaid
+        if t["reward"]:
+            unpaid.remove(leg)
+    return transfers, rewards
@@ -1,9 +1,14 @@
 # oauth_server.py
 import os
+import time
+import logging
+import threading
 import requests
-from flask import Flask, request
-from utils.contract_utils import generate_user_account
-from utils.state_manager import state_manager
+from flask import Flask, Response, request
+from utils.signup_queue import signup_queue
+from utils.metrics import registry, timer, DISCORD_SECONDS, DISCORD_ERRORS
+from utils.tracing import traced, span
+from utils.log_utils import configure_logging
 
 try:
     from dotenv import load_dotenv
@@ -23,11 +28,52 @@ CLIENT_SECRET = require_env("DISCORD_CLIENT_SECRET")
 REDIRECT_URI = require_env("DISCORD_REDIRECT_URI")
 DISCORD_CHANNEL_ID = require_env("DISCORD_CHANNEL_ID")
 BOT_TOKEN = require_env("DISCORD_BOT_TOKEN")
+# 429s are retried after Discord's Retry-After, unless that is longer than the request can reasonably wait.
+DISCORD_REST_RETRIES = int(os.getenv("DISCORD_REST_RETRIES", "3"))
+DISCORD_REST_MAX_WAIT = float(os.getenv("DISCORD_REST_MAX_WAIT", "10"))
+
+configure_logging()
+log = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# bucket key (or "*" for the global limit) -> monotonic time it refills, learned from response headers
+_rate_limits = {}
+_rate_limits_lock = threading.Lock()
+
+def _limit(key, until):
+    with _rate_limits_lock:
+        if len(_rate_limits) > 1000:
+            now = time.monotonic()
+            for k in [k for k, t in _rate_limits.items() if t < now]:
+                del _rate_limits[k]
+        _rate_limits[key] = max(_rate_limits.get(key, 0), until)
+
+def discord_request(method, route, path, bucket=None, **kwargs):
+    # A Discord REST call that waits out a bucket the last response said was empty and retries 429s.
+    # bucket defaults to the path; calls made with a user's own token pass something per user.
+    url = f"{DISCORD_API_BASE}{path}"
+    bucket = bucket or path
+    for attempt in range(DISCORD_REST_RETRIES + 1):
+        with _rate_limits_lock:
+            wait = max(_rate_limits.get(bucket, 0), _rate_limits.get("*", 0)) - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, DISCORD_REST_MAX_WAIT))
+        with timer(DISCORD_SECONDS, DISCORD_ERRORS, method, route):
+            r = requests.request(method, url, timeout=20, **kwargs)
+        now = time.monotonic()
+        if r.headers.get("X-RateLimit-Remaining") == "0" and r.headers.get("X-RateLimit-Reset-After"):
+            _limit(bucket, now + float(r.headers["X-RateLimit-Reset-After"]))
+        if r.status_code != 429:
+            return r
+        retry_after = float(r.headers.get("Retry-After") or 1)
+        _limit("*" if r.headers.get("X-RateLimit-Global") == "true" else bucket, now + retry_after)
+        if attempt == DISCORD_REST_RETRIES or retry_after > DISCORD_REST_MAX_WAIT:
+            return r
+        log.info("Discord %s %s rate limited, retrying in %.2fs", method, route, retry_after)
+    return r
+
 def send_embed_to_discord(user_info, ip_address: str):
-    url = f"{DISCORD_API_BASE}/channels/{DISCORD_CHANNEL_ID}/messages"
     headers = {
         "Authorization": f"Bot {BOT_TOKEN}",
         "Content-Type": "application/json"
@@ -44,15 +90,21 @@ def send_embed_to_discord(user_info, ip_address: str):
         "color": 0x2C2F33
     }
     payload = {"content": "", "embeds": [embed]}
-    r = requests.post(url, headers=headers, json=payload, timeout=20)
+    r = discord_request("POST", "/channels/{channel_id}/messages", f"/channels/{DISCORD_CHANNEL_ID}/messages",
+                        headers=headers, json=payload)
     if not (200 <= r.status_code < 300):
-        print(f"Failed to send embed to Discord: {r.status_code}, {r.text}")
+        log.warning("Failed to send embed to Discord: %s, %s", r.status_code, r.text)
 
 @app.route("/")
 def home():
     return "Bot OAuth2"
 
+@app.route("/metrics")
+def metrics():
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/callback")
+@traced("oauth.callback", root=True)
 def callback():
     code = request.args.get("code")
     if not code:
@@ -66,7 +118,7 @@ def callback():
         "redirect_uri": REDIRECT_URI
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    token_res = requests.post(f"{DISCORD_API_BASE}/oauth2/token", data=data, headers=headers, timeout=20)
+    token_res = discord_request("POST", "/oauth2/token", "/oauth2/token", data=data, headers=headers)
 
     if token_res.status_code != 200:
         return f"Error obtaining token: {token_res.status_code}", 400
@@ -75,7 +127,9 @@ def callback():
     if not access_token:
         return "Access token not found", 400
 
-    user_res = requests.get(f"{DISCORD_API_BASE}/users/@me", headers={"Authorization": f"Bearer {access_token}"}, timeout=20)
+    # Each user's bearer token has its own bucket.
+    user_res = discord_request("GET", "/users/@me", "/users/@me", bucket=f"/users/@me {code}",
+                               headers={"Authorization": f"Bearer {access_token}"})
     if user_res.status_code != 200:
         return f"Error fetching user info: {user_res.status_code}", 400
     user_info = user_res.json()
@@ -85,15 +139,14 @@ def callback():
         return f"Error fetching IP: {ip_res.status_code}", 400
     user_ip = ip_res.json().get("origin", "unknown")
 
-    send_embed_to_discord(user_info, user_ip)
+    with span("discord.channel_post"):
+        send_embed_to_discord(user_info, user_ip)
 
     user_id = user_info.get("id")
     if user_id:
-        users = state_manager.get_users()
-        if user_id not in users or len(users[user_id].get("wallets", [])) == 0:
-            account = generate_user_account(user_id, users, email=user_info.get("email"), ip=user_ip)
-            state_manager.update_users(users)
-            state_manager.reload_users()
-            print(f"Generated account for user {user_id}: Address: {account['address']}")
-
-    return "Authorization complete. You can close this window."
+        # Wallet creation belongs to the bot process; the web tier only records the signup.
+        with span("signup_queue.put"):
+            signup_queue.put(user_id, email=user_info.get("email"), ip=user_ip)
+        log.info("Queued signup for user %s", user_id)
+
+    return "Authorization complete. Your wallet is being set up; use /wallet in Discord. You can close this window."
@@ -0,0 +1,259 @@
+# utils/history_store.py
+import os
+import time
+import base64
+import sqlite3
+import logging
+import threading
+from decimal import Decimal
+from utils.data_utils import TRANSACTIONS_FILE, load_transactions, _ensure_parent
+from utils.metrics import timed_storage
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+HISTORY_DB = os.getenv("HISTORY_DB", "data/history.db")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "10"))
+TOKEN_DECIMALS = int(os.getenv("TOKEN_DECIMALS", "18"))
+
+# kind -> label shown in /history filters and embeds.
+KINDS = {
+    "sent": "Sent",
+    "received": "Received",
+    "purchase": "Purchases",
+    "referral_reward": "Referral rewards",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    log_index INTEGER NOT NULL DEFAULT -1,
+    from_address TEXT,
+    to_address TEXT,
+    value TEXT NOT NULL,
+    created_at REAL,
+    UNIQUE (user_id, kind, tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS history_user ON history (user_id, id);
+CREATE INDEX IF NOT EXISTS history_user_kind ON history (user_id, kind, id);
+CREATE INDEX IF NOT EXISTS history_tx ON history (tx_hash, log_index);
+"""
+
+# value: token base units as a decimal string (a uint256 does not fit SQLite's INTEGER).
+# created_at: NULL for entries imported from transactions.json, which never recorded when they happened.
+INDEXES = ("history_user", "history_user_kind", "history_tx")
+
+log = logging.getLogger(__name__)
+
+def to_units(orv):
+    # An ORV amount as written in transactions.json (or a REAL column) -> exact base units.
+    return int(Decimal(str(orv or 0)).scaleb(TOKEN_DECIMALS))
+
+def encode_cursor(direction, row_id):
+    return base64.urlsafe_b64encode(f"{direction}{row_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    # -> ("before" | "after", row id); malformed cursors raise ValueError.
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    if raw[:1] not in ("b", "a"):
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+    return ("before" if raw[0] == "b" else "after"), int(raw[1:])
+
+class HistoryPage:
+    __slots__ = ("entries", "next_cursor", "prev_cursor")
+
+    def __init__(self, entries, next_cursor=None, prev_cursor=None):
+        self.entries = entries  # newest first: dicts with kind/from/to/value (base units)/hash/timestamp (or None)
+        self.next_cursor = next_cursor  # older entries
+        self.prev_cursor = prev_cursor  # newer entries
+
+class HistoryStore:
+    """Per-user transaction history in SQLite, read one page at a time.
+
+    Pages use keyset pagination over the (user_id[, kind], id) indexes, so a page costs the same
+    whether the user has ten entries or ten million. Each thread gets its own connection.
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or HISTORY_DB
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not self._initialized:
+                self._initialize()
+            conn = sqlite3.connect(self.filepath, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _initialize(self):
+        with self._init_lock:
+            if self._initialized:
+                return
+            _ensure_parent(self.filepath)
+            conn = sqlite3.connect(self.filepath, timeout=30)
+            try:
+                created = conn.execute("SELECT name FROM sqlite_master WHERE name = 'history'").fetchone() is None
+                if not created and self._needs_migration(conn):
+                    self._migrate(conn)
+                conn.executescript(SCHEMA)
+                if created and os.path.exists(TRANSACTIONS_FILE):
+                    # First run after the move off transactions.json: carry the old log over once.
+                    count = self._import(conn, load_transactions(TRANSACTIONS_FILE))
+                    log.info("Imported %d entries from %s into %s", count, TRANSACTIONS_FILE, self.filepath)
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    @staticmethod
+    def _needs_migration(conn):
+        columns = {row[1]: row for row in conn.execute("PRAGMA table_info(history)")}
+        return columns["value"][2].upper() != "TEXT" or columns["created_at"][3]
+
+    @staticmethod
+    def _migrate(conn, batch=50_000):
+        # Older files stored ORV as REAL and stamped imported rows with the import time. Rebuilt once, ids kept
+        # (cursors stay valid); imported rows are the ones with log_index -1, recorded ones always have an index.
+        conn.execute("BEGIN")
+        conn.execute("ALTER TABLE history RENAME TO history_v1")
+        for name in INDEXES:
+            conn.execute(f"DROP INDEX IF EXISTS {name}")
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                conn.execute(statement)
+        last = count = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, user_id, kind, tx_hash, log_index, from_address, to_address, value, created_at"
+                " FROM history_v1 WHERE id > ? ORDER BY id LIMIT ?", (last, batch)).fetchall()
+            if not rows:
+                break
+            conn.executemany(
+                "INSERT INTO history (id, user_id, kind, tx_hash, log_index, from_address, to_address, value, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((i, u, k, h, li, f, t, str(to_units(v)), None if li == -1 else ts) for i, u, k, h, li, f, t, v, ts in rows))
+            last = rows[-1][0]
+            count += len(rows)
+        conn.execute("DROP TABLE history_v1")
+        conn.commit()
+        log.info("Migrated %d history entries to base-unit values", count)
+
+    @staticmethod
+    def _import(conn, transactions):
+        # transactions.json entries were only ever logged for the sender of a transfer, and without a time.
+        rows = [
+            (str(user_id), "sent", tx["hash"], -1, tx.get("from"), tx.get("to"), str(to_units(tx.get("value"))), None)
+            for user_id, entries in transactions.items() for tx in entries if tx.get("hash")
+        ]
+        conn.executemany(
+            "INSERT OR IGNORE INTO history (user_id, kind, tx_hash, log_index, from_address, to_address, value, created_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def import_transactions(self, transactions):
+        conn = self._conn()
+        with conn:
+            return self._import(conn, transactions)
+
+    @timed_storage("history.record")
+    def record(self, entries):
+        # entries: iterable of (user_id, kind, tx_hash, log_index, from, to, base units); re-recording a tx is a no-op.
+        now = time.time()
+        rows = [(str(u), k, h, -1 if i is None else i, f, t, str(int(v)), now) for u, k, h, i, f, t, v in entries]
+        if not rows:
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO history (user_id, kind, tx_hash, log_index, from_address, to_address, value, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    @timed_storage("history.page")
+    def page(self, user_id, kind=None, cursor=None, limit=HISTORY_PAGE_SIZE):
+        where, params = ["user_id = ?"], [str(user_id)]
+        if kind:
+            where.append("kind = ?")
+            params.append(kind)
+        direction, row_id = decode_cursor(cursor) if cursor else ("before", None)
+        if row_id is not None:
+            where.append("id < ?" if direction == "before" else "id > ?")
+            params.append(row_id)
+        order = "DESC" if direction == "before" else "ASC"
+        rows = self._conn().execute(
+            "SELECT id, kind, tx_hash, from_address, to_address, value, created_at FROM history"
+            f" WHERE {' AND '.join(where)} ORDER BY id {order} LIMIT ?",
+            (*params, limit + 1),
+        ).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if direction == "after":
+            rows.reverse()
+        if not rows:
+            return HistoryPage([])
+        # One extra row tells us whether there is anything beyond this page in the direction we walked.
+        older = more if direction == "before" else True
+        newer = row_id is not None if direction == "before" else more
+        entries = [
+            {"kind": k, "hash": h, "from": f, "to": t, "value": int(v), "timestamp": ts}
+            for _, k, h, f, t, v, ts in rows
+        ]
+        return HistoryPage(
+            entries,
+            next_cursor=encode_cursor("b", rows[-1][0]) if older else None,
+            prev_cursor=encode_cursor("a", rows[0][0]) if newer else None,
+        )
+
+    def iter_kind(self, kind, batch=10_000):
+        # Streams (tx_hash, from, to, base units) for one kind in insertion order; used by rebuilds.
+        last = 0
+        conn = self._conn()
+        while True:
+            rows = conn.execute(
+                "SELECT id, tx_hash, from_address, to_address, value FROM history WHERE kind = ? AND id > ? ORDER BY id LIMIT ?",
+                (kind, last, batch),
+            ).fetchall()
+            if not rows:
+                return
+            for _, h, f, t, v in rows:
+                yield h, f, t, int(v)
+            last = rows[-1][0]
+
+    def batches_since(self, after_id=0, batch=50_000):
+        # Yields lists of (id, kind, from, to, base units, created_at or None, counted) in id order, for analytics.
+        # A transfer between two players is stored once per side; only the "sent" row of such a pair is
+        # counted, so volume sums don't double it while both wallets still show up as active.
+        last = after_id
+        conn = self._conn()
+        while True:
+            rows = conn.execute(
+                "SELECT id, kind, from_address, to_address, value, created_at,"
+                " NOT (kind = 'received' AND EXISTS (SELECT 1 FROM history s WHERE s.tx_hash = h.tx_hash"
+                "      AND s.log_index = h.log_index AND s.kind = 'sent'))"
+                " FROM history h WHERE id > ? ORDER BY id LIMIT ?",
+                (last, batch),
+            ).fetchall()
+            if not rows:
+                return
+            yield [(i, k, f, t, int(v), ts, c) for i, k, f, t, v, ts, c in rows]
+            last = rows[-1][0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+history_store = HistoryStore()
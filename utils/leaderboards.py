@@ -0,0 +1,263 @@
+# utils/leaderboards.py
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from utils.data_utils import _ensure_parent, get_user_ids_by_addresses
+from utils.event_utils import decode_receipt_events
+from utils.history_store import history_store
+from utils.models import address_bytes, checksum_address
+from utils.state_manager import state_manager
+from utils.shared_store import shared_store
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+LEADERBOARD_FILE = os.getenv("LEADERBOARD_FILE", "data/leaderboards.json")
+LEADERBOARD_SIZE = int(os.getenv("LEADERBOARD_SIZE", "10"))
+LEADERBOARD_SNAPSHOT_SECONDS = float(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "60"))
+# Treasury-style accounts that would otherwise top every board; the main account and the zero address always are.
+LEADERBOARD_EXCLUDE = os.getenv("LEADERBOARD_EXCLUDE", "")
+TOKEN_DECIMALS = int(os.getenv("TOKEN_DECIMALS", "18"))
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# board -> what it ranks; amounts are token base units.
+BOARDS = {
+    "referrers": "ORV earned from referral rewards",
+    "earners": "ORV received from other players, referral rewards included",
+    "volume": "ORV sent in transfers",
+}
+
+log = logging.getLogger(__name__)
+
+class TopK:
+    """Running totals for every address plus the K largest, kept sorted.
+
+    Totals only grow, so an address can only enter the top by overtaking the current K-th entry:
+    every update is a dict write plus, at most, a re-sort of K items.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self.totals = {}
+        self.top = []  # [(total, address)], largest first
+
+    def add(self, address, amount):
+        total = self.totals.get(address, 0) + amount
+        self.totals[address] = total
+        top = self.top
+        for i, (_, a) in enumerate(top):
+            if a == address:
+                top[i] = (total, address)
+                break
+        else:
+            if len(top) >= self.k and total <= top[-1][0]:
+                return False
+            top.append((total, address))
+        top.sort(key=lambda e: e[0], reverse=True)
+        del top[self.k:]
+        return True
+
+    def merge(self, totals):
+        # Adds a snapshot's totals onto whatever was observed before it finished loading.
+        for address, total in totals.items():
+            self.totals[address] = self.totals.get(address, 0) + total
+        self.top = heapq.nlargest(self.k, ((t, a) for a, t in self.totals.items()), key=lambda e: e[0])
+
+class Leaderboards:
+    def __init__(self, filepath=None, k=LEADERBOARD_SIZE, exclude=(), shared=False):
+        self.filepath = filepath or LEADERBOARD_FILE
+        self.k = k
+        # Shared: totals come from the history.db every process writes to, not from a per-process snapshot.
+        self.shared = shared
+        self.exclude = {address_bytes(a) for a in exclude}
+        self.boards = {name: TopK(k) for name in BOARDS}
+        self._owners = {}  # address -> user id; unowned addresses are looked up again, they may sign up later
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.updated_at = None
+
+    def observe_logs(self, logs):
+        # A receipt's logs: each Transfer and ReferralReward in it is credited to its board(s).
+        transfers, rewards = decode_receipt_events(logs)
+        with self._lock:
+            for r in rewards:
+                self._observe_reward(r["referrer"], r["reward"])
+            for t in transfers:
+                if not t["reward"]:  # the payout leg was credited through its ReferralReward event
+                    self._observe_transfer(t["from"], t["to"], t["value"])
+            self._touch()
+
+    def observe_receipt(self, receipt):
+        self.observe_logs(receipt["logs"])
+
+    def observe_transfer(self, sender, recipient, value):
+        with self._lock:
+            self._observe_transfer(sender, recipient, value)
+            self._touch()
+
+    def observe_reward(self, referrer, reward):
+        with self._lock:
+            self._observe_reward(referrer, reward)
+            self._touch()
+
+    def _observe_reward(self, referrer, reward):
+        self._credit("referrers", referrer, reward)
+        self._credit("earners", referrer, reward)
+
+    def _observe_transfer(self, sender, recipient, value):
+        sender_b = address_bytes(sender)
+        if sender_b in self.exclude:
+            return  # purchases and grants from the treasury are not earnings or player volume
+        self._credit("volume", sender_b, value)
+        self._credit("earners", recipient, value)
+
+    def _credit(self, board, address, amount):
+        address = address if isinstance(address, bytes) else address_bytes(address)
+        if address in self.exclude or amount <= 0:
+            return
+        self.boards[board].add(address, amount)
+
+    def _touch(self):
+        self._dirty = True
+        self.updated_at = time.time()
+
+    def top(self, board):
+        # (rank, address, user id or None, amount in ORV); K entries, independent of how many addresses are tracked.
+        # Blocking: an address without a cached owner costs a pass over the user store, so call it off the loop.
+        entries = list(self.boards[board].top)
+        missing = {a for _, a in entries if a not in self._owners}
+        if missing:
+            self._resolve_owners(missing)
+        scale = 10 ** TOKEN_DECIMALS
+        return [
+            (rank, checksum_address(a), self._owners.get(a), total / scale)
+            for rank, (total, a) in enumerate(entries, 1)
+        ]
+
+    def _resolve_owners(self, addresses):
+        # One pass over a copy of the store (the loop may add users meanwhile) for every uncached address.
+        found = get_user_ids_by_addresses(addresses, dict(state_manager.users))
+        self._owners.update((a, user_id) for a, user_id in found.items() if user_id is not None)
+
+    def total_for(self, board, address):
+        total = self.boards[board].totals.get(address_bytes(address), 0)
+        return total / 10 ** TOKEN_DECIMALS
+
+    def reset(self):
+        with self._lock:
+            self.boards = {name: TopK(self.k) for name in BOARDS}
+            self._owners = {}
+            self._touch()
+
+    def rebuild_from_history(self, store=None):
+        # Replays the history store: a transfer between two players is stored once per side, so dedupe it.
+        # Only transactions the bot recorded are there; rebuild_from_chain() also sees everything else.
+        # Boards are built aside and swapped in, so /leaderboard never renders a half-replayed board.
+        store = store or history_store
+        fresh = Leaderboards(self.filepath, self.k)
+        fresh.exclude = self.exclude
+        seen = set()
+        count = 0
+        for kind in ("sent", "received"):
+            for tx_hash, sender, recipient, value in store.iter_kind(kind):
+                key = (tx_hash, sender, recipient, value)
+                if key in seen or not sender or not recipient:
+                    continue
+                seen.add(key)
+                fresh._observe_transfer(sender, recipient, value)
+                count += 1
+        for _, _, referrer, reward in store.iter_kind("referral_reward"):
+            fresh._observe_reward(referrer, reward)
+            count += 1
+        with self._lock:
+            self.boards = fresh.boards
+            self._touch()
+        log.info("Rebuilt leaderboards from %d stored history entries", count)
+        return count
+
+    def rebuild_from_chain(self, w3, token_address, from_block=0, to_block="latest", step=10_000):
+        self.reset()
+        last = w3.eth.block_number if to_block == "latest" else to_block
+        count = 0
+        for start in range(from_block, last + 1, step):
+            logs = w3.eth.get_logs({"address": token_address, "fromBlock": start, "toBlock": min(start + step - 1, last)})
+            # Rewards are matched to their Transfer leg within one transaction.
+            by_tx = {}
+            for entry in logs:
+                by_tx.setdefault(entry["transactionHash"], []).append(entry)
+            for tx_logs in by_tx.values():
+                self.observe_logs(tx_logs)
+            count += len(logs)
+        log.info("Rebuilt leaderboards from %d logs in blocks %d..%d", count, from_block, last)
+        return count
+
+    def load(self):
+        if self.shared:
+            # Cluster workers each see only their own guilds' transfers; the history store has everyone's.
+            self.rebuild_from_history()
+            return True
+        try:
+            with open(self.filepath, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            for name, totals in snapshot.get("boards", {}).items():
+                if name in self.boards:
+                    self.boards[name].merge({address_bytes(a): int(t) for a, t in totals.items()})
+            self.updated_at = self.updated_at or snapshot.get("updated_at")
+        return True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return False
+            boards = {name: {"0x" + a.hex(): t for a, t in board.totals.items()} for name, board in self.boards.items()}
+            updated_at = self.updated_at
+            self._dirty = False
+        _ensure_parent(self.filepath)
+        tmp = f"{self.filepath}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": updated_at, "boards": boards}, f)
+        os.replace(tmp, self.filepath)
+        return True
+
+    async def snapshot_loop(self, interval=LEADERBOARD_SNAPSHOT_SECONDS):
+        # Shared boards are re-read from the history store instead, picking up the other processes' transfers.
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.rebuild_from_history if self.shared else self.save)
+            except Exception as e:
+                log.error("Leaderboard snapshot failed: %s", e)
+
+leaderboards = Leaderboards(exclude=[
+    a.strip() for a in [ZERO_ADDRESS, os.getenv("MAIN_ACCOUNT_ADDRESS", ""), *LEADERBOARD_EXCLUDE.split(",")] if a.strip()
+], shared=shared_store is not None)
+
+registry.gauge_func("orvyn_leaderboard_addresses", "Addresses with a running volume total.",
+                    lambda: len(leaderboards.boards["volume"].totals))
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Rebuild the leaderboard snapshot")
+    parser.add_argument("--from-chain", action="store_true", help="replay Transfer/ReferralReward logs instead of the history store")
+    parser.add_argument("--from-block", type=int, default=0)
+    args = parser.parse_args()
+    state_manager.ensure_loaded()
+    if args.from_chain:
+        from utils.eth_utils import w3
+        from utils.token_reads import CONTRACT_ADDRESS
+        leaderboards.rebuild_from_chain(w3, CONTRACT_ADDRESS, args.from_block)
+    else:
+        leaderboards.rebuild_from_history()
+    leaderboards.save()
+    print(f"Wrote {leaderboards.filepath}")
@@ -0,0 +1,160 @@
+# utils/log_utils.py
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from utils.tracing import current_trace_id
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")  # per-logger overrides: "bot.commands=DEBUG,web3=WARNING"
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")  # per-logger DEBUG sample rates: "bot.commands=0.01"
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text | json
+LOG_FILE = os.getenv("LOG_FILE", "")  # empty -> stderr
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REDACT_KEYS = frozenset(
+    k.strip().lower()
+    for k in os.getenv("LOG_REDACT_KEYS", "private_key,password,secret,client_secret,bot_token,access_token,refresh_token").split(",")
+    if k.strip()
+)
+
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(name)s [%(trace_id)s] %(message)s"
+REDACTED = "***"
+
+_SECRET_PATTERN = re.compile(
+    r"""(?i)(["']?(?:%s)["']?\s*[:=]\s*)(["']?)[^"'\s,}]+""" % "|".join(map(re.escape, sorted(LOG_REDACT_KEYS)))
+) if LOG_REDACT_KEYS else None
+# Private keys revealed through the "Show private key" modal are wrapped in a Discord spoiler.
+_SPOILER_KEY = re.compile(r"\|\|(?:0x)?[0-9a-fA-F]{64}\|\|")
+
+LOG_DROPPED = registry.counter("orvyn_log_dropped_total", "Log records dropped because the log queue was full.")
+
+_STANDARD_ATTRS = frozenset(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime", "trace_id"}
+
+def redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if str(k).lower() in LOG_REDACT_KEYS else redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(redact(v) for v in value)
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+def redact_text(text):
+    if _SECRET_PATTERN is not None:
+        text = _SECRET_PATTERN.sub(lambda m: m.group(1) + m.group(2) + REDACTED, text)
+    return _SPOILER_KEY.sub("||" + REDACTED + "||", text)
+
+def _render(record):
+    # Runs on the listener thread: arguments are redacted and interpolated here, never on the caller's thread.
+    if record.args:
+        record.args = redact(record.args)
+    return redact_text(record.getMessage())
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record):
+        if not hasattr(record, "trace_id"):
+            record.trace_id = "-"
+        record.message = _render(record)
+        record.asctime = self.formatTime(record, self.datefmt)
+        s = self.formatMessage(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            s = f"{s}\n{redact_text(record.exc_text)}"
+        if record.stack_info:
+            s = f"{s}\n{self.formatStack(record.stack_info)}"
+        return s
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": _render(record),
+            "trace_id": getattr(record, "trace_id", None),
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS:
+                entry[key] = redact(value)
+        if record.exc_info:
+            entry["exc"] = redact_text(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+class SampleFilter(logging.Filter):
+    # Keeps a fraction of records at or below `level`; anything more severe always passes.
+    def __init__(self, rate, level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+
+    def filter(self, record):
+        return record.levelno > self.level or random.random() < self.rate
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock prepare() formats msg % args on the calling thread; hand the raw record over instead.
+        record.trace_id = current_trace_id() or "-"
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_DROPPED.inc()
+
+def _pairs(spec):
+    for part in spec.split(","):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            yield name.strip(), value.strip()
+
+_listener = None
+_queue_handler = None
+
+def configure_logging():
+    # Idempotent: every entry point calls this, the first call wins.
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    handler = logging.FileHandler(LOG_FILE, encoding="utf-8") if LOG_FILE else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else RedactingFormatter(TEXT_FORMAT))
+
+    _queue_handler = _QueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in _pairs(LOG_LEVELS):
+        logging.getLogger(name).setLevel(level.upper())
+    for name, rate in _pairs(LOG_SAMPLE):
+        logging.getLogger(name).addFilter(SampleFilter(float(rate)))
+
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _listener
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
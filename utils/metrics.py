@@ -0,0 +1,214 @@
+# utils/metrics.py
+import time
+import bisect
+import functools
+import threading
+from utils.tracing import span
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _label_str(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, labels)} {value}" for labels, value in items]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_label_str(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class GaugeFunc:
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+
+    def render(self):
+        return [f"{self.name} {self.fn()}"]
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        self._metrics.setdefault(metric.name, metric)
+        return self._metrics[metric.name]
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge_func(self, name, help_text, fn):
+        return self._register(GaugeFunc(name, help_text, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+RPC_SECONDS = registry.histogram("orvyn_rpc_request_seconds", "JSON-RPC request latency by method.", ("method",))
+RPC_ERRORS = registry.counter("orvyn_rpc_errors_total", "JSON-RPC requests that raised or returned an error.", ("method",))
+DISCORD_SECONDS = registry.histogram("orvyn_discord_api_seconds", "Discord REST/webhook request latency.", ("method", "route"))
+DISCORD_ERRORS = registry.counter("orvyn_discord_api_errors_total", "Failed Discord REST/webhook requests.", ("method", "route"))
+STORAGE_SECONDS = registry.histogram("orvyn_storage_seconds", "Local store load/save latency.", ("op",))
+STORAGE_ERRORS = registry.counter("orvyn_storage_errors_total", "Local store operations that raised.", ("op",))
+COMMAND_SECONDS = registry.histogram("orvyn_command_seconds", "Slash command latency, end to end.", ("command",))
+COMMAND_ERRORS = registry.counter("orvyn_command_errors_total", "Slash commands that raised.", ("command",))
+
+class timer:
+    def __init__(self, histogram, errors, *labels):
+        self.histogram = histogram
+        self.errors = errors
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc(*self.labels)
+        return False
+
+def timed_storage(op):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"storage.{op}"), timer(STORAGE_SECONDS, STORAGE_ERRORS, op):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def web3_metrics_middleware(make_request, w3):
+    def middleware(method, params):
+        start = time.perf_counter()
+        try:
+            response = make_request(method, params)
+        except Exception:
+            RPC_ERRORS.inc(method)
+            raise
+        finally:
+            RPC_SECONDS.observe(time.perf_counter() - start, method)
+        if isinstance(response, dict) and response.get("error"):
+            RPC_ERRORS.inc(method)
+        return response
+    return middleware
+
+def instrument_web3(w3):
+    if "metrics" not in w3.middleware_onion:
+        w3.middleware_onion.add(web3_metrics_middleware, "metrics")
+    return w3
+
+_discord_instrumented = False
+
+def instrument_discord():
+    # Bot REST calls go through HTTPClient.request; interaction responses and followups through the webhook adapter.
+    global _discord_instrumented
+    if _discord_instrumented:
+        return
+    from discord.http import HTTPClient
+    from discord.webhook.async_ import AsyncWebhookAdapter
+
+    def wrap(original):
+        @functools.wraps(original)
+        async def request(self, route, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await original(self, route, *args, **kwargs)
+            except Exception:
+                DISCORD_ERRORS.inc(route.method, route.path)
+                raise
+            finally:
+                DISCORD_SECONDS.observe(time.perf_counter() - start, route.method, route.path)
+        return request
+
+    HTTPClient.request = wrap(HTTPClient.request)
+    AsyncWebhookAdapter.request = wrap(AsyncWebhookAdapter.request)
+    _discord_instrumented = True
+
+def serve_metrics(port, host="0.0.0.0"):
+    # A /metrics listener on its own thread, for a process that does not run the web app (the bot, when the
+    # web tier runs separately). Each process exposes only its own registry.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
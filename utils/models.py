@@ -0,0 +1,162 @@
+# utils/models.py
+import sys
+import json
+import functools
+from eth_utils import to_checksum_address
+
+DEFAULT_WALLET_NAME = "Wallet 1"
+
+# One bytes object per distinct address for the whole process; wallets, indexes and lookups share it.
+_addresses = {}
+
+def address_bytes(address) -> bytes:
+    if isinstance(address, str):
+        raw = bytes.fromhex(address[2:] if address[:2] in ("0x", "0X") else address)
+    else:
+        raw = bytes(address)
+    if len(raw) != 20:
+        raise ValueError(f"Invalid address: {address!r}")
+    return raw
+
+def intern_address(address) -> bytes:
+    raw = address_bytes(address)
+    return _addresses.setdefault(raw, raw)
+
+@functools.lru_cache(maxsize=65536)
+def checksum_address(raw: bytes) -> str:
+    return to_checksum_address(raw)
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+class Wallet:
+    __slots__ = ("_address", "private_key", "password", "name", "referrer")
+
+    def __init__(self, address, private_key, password, name=DEFAULT_WALLET_NAME, referrer=None):
+        self._address = intern_address(address)
+        self.private_key = private_key
+        self.password = password
+        self.name = _intern(name)
+        self.referrer = _intern(referrer)
+
+    @property
+    def address(self) -> str:
+        return checksum_address(self._address)
+
+    @address.setter
+    def address(self, value):
+        self._address = intern_address(value)
+
+    @property
+    def address_bytes(self) -> bytes:
+        return self._address
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["address"], data["private_key"], data["password"],
+                   data.get("name") or DEFAULT_WALLET_NAME, data.get("referrer"))
+
+    def to_dict(self, private_key=None):
+        return {
+            "private_key": self.private_key if private_key is None else private_key,
+            "address": self.address,
+            "name": self.name,
+            "referrer": self.referrer,
+            "password": self.password,
+        }
+
+    def __repr__(self):
+        return f"Wallet(address={self.address!r}, name={self.name!r}, referrer={self.referrer!r})"
+
+class User:
+    __slots__ = ("email", "ip", "wallets")
+
+    def __init__(self, email=None, ip=None, wallets=None):
+        self.email = email
+        self.ip = _intern(ip)
+        self.wallets = wallets if wallets is not None else []
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("email"), data.get("ip"), [Wallet.from_dict(w) for w in data.get("wallets", [])])
+
+    def to_dict(self):
+        return {"email": self.email, "ip": self.ip, "wallets": [w.to_dict() for w in self.wallets]}
+
+    def __repr__(self):
+        return f"User(email={self.email!r}, wallets={len(self.wallets)})"
+
+def parse_users(raw):
+    # raw: {user_id: {"email", "ip", "wallets": [...]}} as stored on disk.
+    return {sys.intern(user_id): User.from_dict(data) for user_id, data in raw.items()}
+
+def iter_wallets(users):
+    for user in users.values():
+        yield from user.wallets
+
+def dump_users(users, f, private_keys=None):
+    # Streams the store straight from the records, one user at a time, without building a copy of it.
+    # private_keys optionally yields the stored form of each wallet key, in iter_wallets() order.
+    enc = json.dumps
+    f.write("{")
+    for i, (user_id, user) in enumerate(users.items()):
+        if i:
+            f.write(",")
+        f.write(f'\n{enc(user_id)}:{{"email":{enc(user.email)},"ip":{enc(user.ip)},"wallets":[')
+        for j, w in enumerate(user.wallets):
+            key = w.private_key if private_keys is None else next(private_keys)
+            f.write(
+                f'{"," if j else ""}{{"private_key":{enc(key)},"address":"{w.address}",'
+                f'"name":{enc(w.name)},"referrer":{enc(w.referrer)},"password":{enc(w.password)}}}'
+            )
+        f.write("]}")
+    f.write("\n}\n")
+
+def iter_stored_users(f, chunk_size=1 << 20):
+    # Reads users.json back one user at a time: yields (user_id, stored dict) with keys still encrypted.
+    # Works on any JSON object layout, not just the one-user-per-line form dump_users writes.
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+
+    def more():
+        nonlocal buf, pos
+        chunk = f.read(chunk_size)
+        buf, pos = buf[pos:] + chunk, 0
+        return bool(chunk)
+
+    def skip_ws():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n":
+                pos += 1
+            if pos < len(buf) or not more():
+                return buf[pos:pos + 1]
+
+    def expect(ch):
+        nonlocal pos
+        if skip_ws() != ch:
+            raise ValueError(f"Malformed users file: expected {ch!r} at {buf[pos:pos + 20]!r}")
+        pos += 1
+
+    def decode():
+        nonlocal pos
+        skip_ws()
+        while True:
+            try:
+                value, pos = decoder.raw_decode(buf, pos)
+                return value
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+
+    if skip_ws() == "":
+        return
+    expect("{")
+    first = True
+    while skip_ws() != "}":
+        if not first:
+            expect(",")
+        first = False
+        user_id = decode()
+        expect(":")
+        yield sys.intern(user_id), decode()
@@ -0,0 +1,131 @@
+# utils/referrals.py
+import os
+import sys
+import json
+import asyncio
+import logging
+import threading
+from collections.abc import Mapping
+from utils.data_utils import REFERRAL_CODES_FILE, load_referral_codes, _atomic_open
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+REFERRAL_RELOAD_SECONDS = float(os.getenv("REFERRAL_RELOAD_SECONDS", "2"))
+
+log = logging.getLogger(__name__)
+
+def _file_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+class ReferralRegistry(Mapping):
+    """code -> user id, plus the reverse user id -> codes index, kept in sync.
+
+    Reads never take the lock: the maps are never mutated, reload and add() build new ones and replace
+    both together with a single assignment.
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or REFERRAL_CODES_FILE
+        self._lock = threading.Lock()
+        self._maps = ({}, {})
+        self._version = ()  # never equal to a real file version, so the first check loads
+        self.reloads = 0
+
+    # Mapping interface: `code in referrals`, `referrals[code]`, iteration over codes.
+    def __getitem__(self, code):
+        return self._maps[0][code]
+
+    def __iter__(self):
+        return iter(self._maps[0])
+
+    def __len__(self):
+        return len(self._maps[0])
+
+    @property
+    def loaded(self):
+        return self._version != ()
+
+    def user_for(self, code):
+        return self._maps[0].get(code)
+
+    def codes_for(self, user_id):
+        return tuple(self._maps[1].get(str(user_id), ()))
+
+    def code_for(self, user_id):
+        codes = self._maps[1].get(str(user_id))
+        return codes[0] if codes else None
+
+    @staticmethod
+    def _index(codes):
+        by_code, by_user = {}, {}
+        for code, user_id in codes.items():
+            code, user_id = sys.intern(str(code)), sys.intern(str(user_id))
+            by_code[code] = user_id
+            by_user.setdefault(user_id, []).append(code)
+        return by_code, by_user
+
+    def reload_if_changed(self):
+        version = _file_version(self.filepath)
+        if version == self._version:
+            return False
+        try:
+            codes = load_referral_codes(self.filepath)
+        except ValueError as e:
+            # Caught mid-write by another process; the next check picks it up once the file is complete.
+            log.warning("Skipping referral codes reload, %s is not valid JSON: %s", self.filepath, e)
+            return False
+        maps = self._index(codes)
+        with self._lock:
+            if _file_version(self.filepath) != version:
+                return False  # rewritten meanwhile (possibly by add()); the next check loads the newer file
+            self._maps = maps
+            self._version = version
+            self.reloads += 1
+        log.info("Loaded %d referral codes from %s", len(maps[0]), self.filepath)
+        return True
+
+    def add(self, code, user_id):
+        # Saving writes the whole mapping, so start from the file as it is now, edits by hand or other processes included.
+        self.reload_if_changed()
+        code, user_id = sys.intern(str(code)), sys.intern(str(user_id))
+        with self._lock:
+            by_code, by_user = self._maps
+            owner = by_code.get(code)
+            if owner is not None:
+                if owner != user_id:
+                    raise ValueError(f"Referral code {code!r} already belongs to another user")
+                return False
+            by_code = {**by_code, code: user_id}
+            by_user = {**by_user, user_id: [*by_user.get(user_id, ()), code]}
+            self._save(by_code)
+            self._maps = (by_code, by_user)
+        log.info("Added referral code %s for user %s", code, user_id)
+        return True
+
+    def _save(self, by_code):
+        # Atomic replace so readers (and other processes polling the file) never see a partial write.
+        with _atomic_open(self.filepath) as f:
+            json.dump(by_code, f, indent=4)
+        self._version = _file_version(self.filepath)
+
+    async def watch(self, interval=REFERRAL_RELOAD_SECONDS):
+        # Polls the file's mtime/size off the event loop; a change is parsed and indexed in the thread as well.
+        while True:
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                log.error("Referral codes reload failed: %s", e)
+            await asyncio.sleep(interval)
+
+referrals = ReferralRegistry()
+
+registry.gauge_func("orvyn_referral_codes", "Referral codes currently loaded.", lambda: len(referrals))
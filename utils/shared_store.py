@@ -0,0 +1,198 @@
+# utils/shared_store.py
+import os
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# "json" keeps users.json / notifications.json and per-process nonces; "sqlite" shares them between processes.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json").lower()
+STATE_DB = os.getenv("STATE_DB", "data/state.db")
+# Reservations ahead of the account's pending count while that count has not moved for this long are treated
+# as lost (a send that failed after reserving), and allocation restarts from the pending count.
+NONCE_RESYNC_SECONDS = float(os.getenv("NONCE_RESYNC_SECONDS", "30"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nonces (
+    address TEXT PRIMARY KEY,
+    next_nonce INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    chain_nonce INTEGER,
+    chain_moved_at REAL
+);
+CREATE TABLE IF NOT EXISTS notifications (
+    user_id TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    PRIMARY KEY (user_id, tx_hash)
+);
+CREATE TABLE IF NOT EXISTS identify_slots (
+    bucket INTEGER PRIMARY KEY,
+    last_identify REAL NOT NULL
+);
+"""
+
+log = logging.getLogger(__name__)
+
+class SharedStore:
+    """State several bot processes (shards) and the web tier must agree on, in one SQLite file.
+
+    Writes that read-then-update (nonces, identify slots) run inside BEGIN IMMEDIATE, which takes
+    SQLite's write lock up front, so two processes never hand out the same value.
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or STATE_DB
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.filepath).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.filepath, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(nonces)")}
+                    for column, kind in (("chain_nonce", "INTEGER"), ("chain_moved_at", "REAL")):
+                        if column not in columns:  # state files from before pending-count tracking
+                            conn.execute(f"ALTER TABLE nonces ADD COLUMN {column} {kind}")
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    # Users: one row per user holding the stored (encrypted) JSON form of utils.models.User.
+
+    def load_users(self):
+        return dict(self._conn().execute("SELECT user_id, data FROM users"))
+
+    def load_user(self, user_id):
+        row = self._conn().execute("SELECT data FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+        return row[0] if row else None
+
+    def iter_users(self, batch=1000):
+        # Streams (user_id, data) in user_id order, a batch per query, for scans that must not load the table.
+        conn = self._conn()
+        last = ""
+        while True:
+            rows = conn.execute(
+                "SELECT user_id, data FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?", (last, batch)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def save_users(self, rows):
+        # rows: iterable of (user_id, data)
+        now = time.time()
+        return self._write(lambda conn: conn.executemany(
+            "INSERT INTO users (user_id, data, updated_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(user_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            ((str(u), d, now) for u, d in rows),
+        ).rowcount)
+
+    # Nonces: reserved here so processes sending from the same account never reuse one.
+
+    def allocate_nonce(self, address, on_chain, count=1):
+        # on_chain: the account's pending transaction count, read by the caller before the write lock is taken
+        # (an RPC inside BEGIN IMMEDIATE would stall every process's writes). A gap left by a reserved nonce that
+        # was never sent holds back every later transaction, so the pending count stops moving; the gap is
+        # detected by that, not by a pause in allocations, which steady traffic never has. Counts read a moment
+        # earlier by another process may arrive out of order, so only a higher count counts as movement.
+        def allocate(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT next_nonce, chain_nonce, chain_moved_at FROM nonces WHERE address = ?", (address,)).fetchone()
+            seen = on_chain
+            if row is None or row[0] <= on_chain:
+                first, moved_at = on_chain, now
+            else:
+                moved = row[1] is None or on_chain > row[1] or row[2] is None
+                moved_at = now if moved else row[2]
+                seen = on_chain if moved else row[1]
+                if now - moved_at > NONCE_RESYNC_SECONDS:
+                    log.warning("Nonces %d..%d for %s were reserved but never mined; resyncing to %d",
+                                on_chain, row[0] - 1, address, on_chain)
+                    first, moved_at = on_chain, now
+                else:
+                    first = row[0]
+            conn.execute(
+                "INSERT INTO nonces (address, next_nonce, updated_at, chain_nonce, chain_moved_at) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(address) DO UPDATE SET next_nonce = excluded.next_nonce, updated_at = excluded.updated_at,"
+                " chain_nonce = excluded.chain_nonce, chain_moved_at = excluded.chain_moved_at",
+                (address, first + count, now, seen, moved_at),
+            )
+            return first
+        return self._write(allocate)
+
+    # Notifications: the first process to claim (user, tx) delivers it.
+
+    def claim_notification(self, user_id, tx_hash):
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO notifications (user_id, tx_hash) VALUES (?, ?)", (str(user_id), tx_hash))
+        return cur.rowcount == 1
+
+    def release_notification(self, user_id, tx_hash):
+        self._conn().execute("DELETE FROM notifications WHERE user_id = ? AND tx_hash = ?", (str(user_id), tx_hash))
+
+    def save_notifications(self, rows):
+        # rows: iterable of (user_id, tx_hash) already delivered; used when importing notifications.json.
+        return self._write(lambda conn: conn.executemany(
+            "INSERT OR IGNORE INTO notifications (user_id, tx_hash) VALUES (?, ?)",
+            ((str(u), h) for u, h in rows),
+        ).rowcount)
+
+    def load_notifications(self):
+        # -> {user_id: [tx_hash, ...]}, the notifications.json layout.
+        notifications = {}
+        for user_id, tx_hash in self._conn().execute("SELECT user_id, tx_hash FROM notifications ORDER BY rowid"):
+            notifications.setdefault(user_id, []).append(tx_hash)
+        return notifications
+
+    # Gateway identify rate limit: one IDENTIFY per bucket per interval, across every process of the bot.
+
+    def wait_identify_slot(self, bucket, interval):
+        while True:
+            def reserve(conn):
+                now = time.time()
+                row = conn.execute("SELECT last_identify FROM identify_slots WHERE bucket = ?", (bucket,)).fetchone()
+                wait = 0.0 if row is None else row[0] + interval - now
+                if wait <= 0:
+                    conn.execute(
+                        "INSERT INTO identify_slots (bucket, last_identify) VALUES (?, ?)"
+                        " ON CONFLICT(bucket) DO UPDATE SET last_identify = excluded.last_identify",
+                        (bucket, now),
+                    )
+                return wait
+            wait = self._write(reserve)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+shared_store = SharedStore() if STATE_BACKEND == "sqlite" else None
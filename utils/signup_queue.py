@@ -0,0 +1,190 @@
+# utils/signup_queue.py
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from utils.metrics import registry
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+SIGNUP_QUEUE_DB = os.getenv("SIGNUP_QUEUE_DB", "data/signups.db")
+SIGNUP_POLL_SECONDS = float(os.getenv("SIGNUP_POLL_SECONDS", "0.5"))
+# A claimed signup with no progress for this long (consumer died mid-way) is handed out again. Each recorded
+# step renews it, so it only has to outlast one grant's receipt wait (RECEIPT_TIMEOUT_SECONDS).
+SIGNUP_LEASE_SECONDS = float(os.getenv("SIGNUP_LEASE_SECONDS", "300"))
+SIGNUP_MAX_ATTEMPTS = int(os.getenv("SIGNUP_MAX_ATTEMPTS", "5"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    email TEXT,
+    ip TEXT,
+    created_at REAL NOT NULL,
+    available_at REAL NOT NULL,
+    claimed_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    failed_at REAL,
+    last_error TEXT,
+    wallet_address TEXT,
+    eth_tx TEXT,
+    orv_tx TEXT
+);
+CREATE INDEX IF NOT EXISTS signups_pending ON signups (failed_at, available_at, id);
+"""
+
+# Progress of a signup, recorded on its row as each step happens: the wallet created for it, then the hash of
+# each grant as soon as it is sent.
+STEPS = ("wallet_address", "eth_tx", "orv_tx")
+
+log = logging.getLogger(__name__)
+
+class Signup:
+    __slots__ = ("id", "user_id", "email", "ip", "attempts", "steps", "_queue")
+
+    def __init__(self, queue, signup_id, user_id, email, ip, attempts, steps):
+        self._queue = queue
+        self.id = signup_id
+        self.user_id = user_id
+        self.email = email
+        self.ip = ip
+        self.attempts = attempts
+        self.steps = steps  # step -> value, for the steps an earlier attempt already recorded
+
+    def record(self, step, value):
+        # Persisted before the caller moves on, and renews the lease.
+        if value is None:
+            self.steps.pop(step, None)
+        else:
+            self.steps[step] = value
+        self._queue.record(self.id, step, value)
+
+class SignupQueue:
+    """OAuth signups handed from the web tier to the bot, through a SQLite file both can open.
+
+    The web tier only appends; the bot claims signups one at a time, creates the wallets and deletes what it
+    finished. A claim is a lease, so a signup whose consumer crashed is picked up again once the lease runs
+    out, and several consumers (cluster workers) never process the same signup at the same time. Steps
+    recorded on the row let a retry resume a signup instead of starting it over.
+    """
+
+    def __init__(self, filepath=None):
+        self.filepath = filepath or SIGNUP_QUEUE_DB
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.filepath).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.filepath, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    columns = {row[1] for row in conn.execute("PRAGMA table_info(signups)")}
+                    for step in STEPS:
+                        if step not in columns:  # queue files from before steps were recorded
+                            conn.execute(f"ALTER TABLE signups ADD COLUMN {step} TEXT")
+                    self._schema_ready = True
+            self._local.conn = conn
+        return conn
+
+    def put(self, user_id, email=None, ip=None):
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO signups (user_id, email, ip, created_at, available_at) VALUES (?, ?, ?, ?, ?)",
+            (str(user_id), email, ip, now, now))
+        return cur.lastrowid
+
+    def claim(self, limit=1, lease=SIGNUP_LEASE_SECONDS):
+        # -> [Signup] now leased to the caller.
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                f"SELECT id, user_id, email, ip, attempts + 1, {', '.join(STEPS)} FROM signups"
+                " WHERE failed_at IS NULL AND available_at <= ? AND (claimed_at IS NULL OR claimed_at < ?)"
+                " ORDER BY id LIMIT ?",
+                (now, now - lease, limit),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE signups SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?", ((now, r[0]) for r in rows))
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return [
+            Signup(self, *row[:5], {step: value for step, value in zip(STEPS, row[5:]) if value is not None})
+            for row in rows
+        ]
+
+    def record(self, signup_id, step, value):
+        if step not in STEPS:
+            raise ValueError(f"Unknown signup step {step!r}")
+        self._conn().execute(
+            f"UPDATE signups SET {step} = ?, claimed_at = ? WHERE id = ?", (value, time.time(), signup_id))
+
+    def complete(self, signup_id):
+        self._conn().execute("DELETE FROM signups WHERE id = ?", (signup_id,))
+
+    def retry(self, signup_id, attempts, error):
+        # Backs off 2, 4, 8... seconds; after SIGNUP_MAX_ATTEMPTS the row is kept, marked failed, for inspection.
+        now = time.time()
+        if attempts >= SIGNUP_MAX_ATTEMPTS:
+            self._conn().execute(
+                "UPDATE signups SET failed_at = ?, claimed_at = NULL, last_error = ? WHERE id = ?", (now, error, signup_id))
+            return False
+        self._conn().execute(
+            "UPDATE signups SET available_at = ?, claimed_at = NULL, last_error = ? WHERE id = ?",
+            (now + 2 ** attempts, error, signup_id))
+        return True
+
+    def pending(self):
+        return self._conn().execute("SELECT COUNT(*) FROM signups WHERE failed_at IS NULL").fetchone()[0]
+
+    def process(self, handler, limit=10):
+        # Runs handler(signup) for up to `limit` signups, claiming each only when its turn comes, so a lease
+        # never has to cover time spent on the signups ahead of it; returns how many completed.
+        done = 0
+        for _ in range(limit):
+            claimed = self.claim()
+            if not claimed:
+                break
+            signup = claimed[0]
+            try:
+                handler(signup)
+            except Exception as e:
+                retried = self.retry(signup.id, signup.attempts, str(e))
+                log.error("Signup for user %s failed (attempt %d%s): %s",
+                          signup.user_id, signup.attempts, "" if retried else ", giving up", e)
+                continue
+            self.complete(signup.id)
+            done += 1
+        return done
+
+    async def consume(self, handler, interval=SIGNUP_POLL_SECONDS):
+        # Bot side: drains the queue off the event loop, polling while it is empty.
+        while True:
+            try:
+                done = await asyncio.to_thread(self.process, handler)
+            except Exception as e:
+                log.error("Signup queue poll failed: %s", e)
+                done = 0
+            if not done:
+                await asyncio.sleep(interval)
+
+signup_queue = SignupQueue()
+
+registry.gauge_func("orvyn_signups_pending", "OAuth signups waiting for the bot to create their wallet.",
+                    signup_queue.pending)
@@ -1,56 +1,129 @@
 import json
 import os
-from utils.encryption_utils import encrypt, decrypt
+import threading
+from utils.metrics import timed_storage
+from utils.data_utils import _atomic_open
+from utils.models import parse_users, iter_wallets, dump_users, iter_stored_users
+from utils.shared_store import shared_store
 
 class StateManager:
-    def __init__(self, filepath="data/users.json"):
-        self.filepath = filepath
-        self.users = self.load_users()
+    def __init__(self, filepath=None, store=None):
+        self.filepath = filepath or os.getenv("USERS_FILE", "data/users.json")
+        # With a shared store (STATE_BACKEND=sqlite) users live there, one row each, instead of in users.json.
+        self.store = store if store is not None else shared_store
+        # One dict for the life of the process: modules bind it at import, loads refill it in place.
+        self.users = {}
+        self._loaded = threading.Event()
+        self._load_lock = threading.Lock()
+        self._file_version = None
 
+    @property
+    def loaded(self):
+        return self._loaded.is_set()
+
+    def ensure_loaded(self):
+        if not self._loaded.is_set():
+            with self._load_lock:
+                if not self._loaded.is_set():
+                    self._replace(self.load_users())
+                    self._loaded.set()
+        return self.users
+
+    def _replace(self, new_users):
+        if new_users is not self.users:
+            self.users.clear()
+            self.users.update(new_users)
+
+    @staticmethod
+    def _decrypt(users):
+        wallets = list(iter_wallets(users))
+        from utils.crypto_pool import crypto_pool  # loads eth_account; export and other key-free reads never get here
+        keys = crypto_pool.decrypt_many((w.private_key, w.password) for w in wallets)
+        for wallet, decrypted_private_key in zip(wallets, keys):
+            wallet.private_key = decrypted_private_key
+        return users
+
+    def _stored_rows(self, user_ids):
+        # (user_id, stored JSON) with each wallet key encrypted, as load_users expects to find it.
+        users = [(user_id, self.users[user_id]) for user_id in user_ids if user_id in self.users]
+        from utils.crypto_pool import crypto_pool
+        keys = iter(crypto_pool.encrypt_many((w.private_key, w.password) for _, u in users for w in u.wallets))
+        return [
+            (user_id, json.dumps(
+                {"email": u.email, "ip": u.ip, "wallets": [w.to_dict(next(keys)) for w in u.wallets]},
+                separators=(",", ":"),
+            ))
+            for user_id, u in users
+        ]
+
+    @timed_storage("state_manager.load_users")
     def load_users(self):
+        if self.store is not None:
+            rows = self.store.load_users()
+            if not rows and os.path.exists(self.filepath):
+                # First start on the shared store: carry users.json over once, keys still encrypted.
+                with open(self.filepath, "r") as file:
+                    stored = json.load(file)
+                self.store.save_users((u, json.dumps(d, separators=(",", ":"))) for u, d in stored.items())
+                rows = self.store.load_users()
+            return self._decrypt(parse_users({u: json.loads(d) for u, d in rows.items()}))
         if os.path.exists(self.filepath):
+            self._file_version = os.stat(self.filepath).st_mtime_ns
             with open(self.filepath, "r") as file:
-                encrypted_users = json.load(file)
-                users = {}
-                for user_id, user_data in encrypted_users.items():
-                    user_info = {
-                        "email": user_data.get("email"),
-                        "ip": user_data.get("ip"),
-                        "wallets": []
-                    }
-                    for wallet in user_data.get("wallets", []):
-                        decrypted_private_key = decrypt(wallet['private_key'], wallet['password'])
-                        wallet['private_key'] = decrypted_private_key
-                        user_info["wallets"].append(wallet)
-                    users[user_id] = user_info
-                return users
+                users = parse_users(json.load(file))
+            return self._decrypt(users)
         return {}
 
+    @timed_storage("state_manager.save_users")
     def save_users(self):
-        encrypted_users = {}
-        for user_id, user_info in self.users.items():
-            encrypted_wallets = []
-            for wallet in user_info["wallets"]:
-                encrypted_private_key = encrypt(wallet['private_key'], wallet['password'])
-                wallet_copy = wallet.copy()
-                wallet_copy['private_key'] = encrypted_private_key
-                encrypted_wallets.append(wallet_copy)
-            encrypted_users[user_id] = {
-                "email": user_info["email"],
-                "ip": user_info["ip"],
-                "wallets": encrypted_wallets
-            }
-        with open(self.filepath, "w") as file:
-            json.dump(encrypted_users, file, indent=4)
+        if self.store is not None:
+            self.store.save_users(self._stored_rows(list(self.users)))
+            return
+        from utils.crypto_pool import crypto_pool
+        encrypted_keys = iter(crypto_pool.encrypt_many((w.private_key, w.password) for w in iter_wallets(self.users)))
+        with _atomic_open(self.filepath) as file:  # the only copy of every wallet key: never truncate it in place
+            dump_users(self.users, file, encrypted_keys)
+        self._file_version = os.stat(self.filepath).st_mtime_ns
+
+    @timed_storage("state_manager.save_user")
+    def save_user(self, user_id):
+        # Persists one user's change; with the JSON file that still means rewriting the whole file.
+        if self.store is not None:
+            self.store.save_users(self._stored_rows([user_id]))
+        else:
+            self.save_users()
+
+    def refresh_user(self, user_id):
+        # Picks up a user created or changed by another process (the web tier, another shard).
+        if self.store is not None:
+            data = self.store.load_user(user_id)
+            if data is not None:
+                self.users[user_id] = self._decrypt(parse_users({user_id: json.loads(data)}))[user_id]
+        elif os.path.exists(self.filepath) and os.stat(self.filepath).st_mtime_ns != self._file_version:
+            self.reload_users()
+        return user_id in self.users
+
+    def iter_stored(self):
+        # (user_id, stored dict) read straight from disk, one user at a time, keys left encrypted.
+        # For admin scans that must not decrypt or hold every user; the bot itself uses ensure_loaded().
+        if self.store is not None:
+            for user_id, data in self.store.iter_users():
+                yield user_id, json.loads(data)
+        elif os.path.exists(self.filepath):
+            with open(self.filepath, "r") as file:
+                yield from iter_stored_users(file)
 
     def reload_users(self):
-        self.users = self.load_users()
+        with self._load_lock:
+            self._replace(self.load_users())
+            self._loaded.set()
 
     def get_users(self):
-        return self.users
+        return self.ensure_loaded()
 
     def update_users(self, new_users):
-        self.users = new_users
+        self._replace(new_users)
+        self._loaded.set()
         self.save_users()
 
 state_manager = StateManager()
@@ -0,0 +1,59 @@
+# utils/token_reads.py
+# Read-only token lookups. Unlike contract_utils this needs no treasury account, so admin commands that only
+# read (orvyn.py balances, reindex --from-chain) run with just the provider and the contract address set.
+import os
+import json
+from web3 import Web3
+from utils.eth_utils import rpc_batch
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+TOKEN_DECIMALS = int(os.getenv("TOKEN_DECIMALS", "18"))
+CONTRACT_NAME = os.getenv("CONTRACT_NAME", "OrvynToken")
+CONTRACT_ARTIFACT_PATH = os.getenv("CONTRACT_ARTIFACT_PATH", f"abi/{CONTRACT_NAME}.json")
+BALANCE_OF_SELECTOR = "0x70a08231"  # balanceOf(address)
+
+def load_artifact():
+    # Slim {abi, address, chainId} artifact written by deploy/deploy.py; None when only the full build exists.
+    try:
+        with open(CONTRACT_ARTIFACT_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _contract_address():
+    address = os.getenv("CONTRACT_ADDRESS") or (_artifact or {}).get("address")
+    if not address:
+        raise SystemExit("Missing env var: CONTRACT_ADDRESS")
+    try:
+        return Web3.to_checksum_address(address)
+    except Exception:
+        raise SystemExit(f"Invalid address: {address}")
+
+_artifact = load_artifact()
+CONTRACT_ADDRESS = _contract_address()
+
+def _quantity(value):
+    # JSON-RPC hex quantity / eth_call word, or the int/bytes web3 hands back for in-process providers.
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        return int.from_bytes(value, "big")
+    return int(value, 16) if value not in ("", "0x") else 0
+
+def get_balances_many(addresses, block="latest"):
+    # [(orv, eth)] per address: two calls each, sent as JSON-RPC batches rather than two round trips per wallet.
+    calls = []
+    for address in addresses:
+        data = BALANCE_OF_SELECTOR + address[2:].lower().rjust(64, "0")
+        calls.append(("eth_call", [{"to": CONTRACT_ADDRESS, "data": data}, block]))
+        calls.append(("eth_getBalance", [address, block]))
+    results = rpc_batch(calls)
+    return [
+        (_quantity(results[i]) / (10 ** TOKEN_DECIMALS), _quantity(results[i + 1]) / (10 ** 18))
+        for i in range(0, len(results), 2)
+    ]
@@ -0,0 +1,214 @@
+# utils/tracing.py
+import os
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:
+    pass
+
+# Fraction of new traces that are recorded; unsampled traces cost one contextvar lookup per span.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "file").lower()  # file | otlp | none
+TRACE_FILE = os.getenv("TRACE_FILE", "data/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "orvyn")
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+
+log = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("orvyn_span", default=None)
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def to_dict(self):
+        return {
+            "trace_id": f"{self.trace_id:032x}",
+            "span_id": f"{self.span_id:016x}",
+            "parent_id": f"{self.parent_id:016x}" if self.parent_id else None,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+class _NoopSpan:
+    __slots__ = ()
+    trace_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class _Exporter:
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, span):
+        if TRACE_EXPORTER == "none":
+            return
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="orvyn-trace-export", daemon=True)
+                    self._thread.start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + 1.0
+            while len(batch) < 512:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                if TRACE_EXPORTER == "otlp":
+                    self._export_otlp(batch)
+                else:
+                    self._export_file(batch)
+            except Exception as e:
+                log.warning("Trace export failed: %s", e)
+
+    def _export_file(self, batch):
+        Path(TRACE_FILE).parent.mkdir(parents=True, exist_ok=True)
+        with open(TRACE_FILE, "a", encoding="utf-8") as f:
+            for span in batch:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def _export_otlp(self, batch):
+        import requests
+        spans = []
+        for span in batch:
+            spans.append({
+                "traceId": f"{span.trace_id:032x}",
+                "spanId": f"{span.span_id:016x}",
+                "parentSpanId": f"{span.parent_id:016x}" if span.parent_id else "",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns),
+                "endTimeUnixNano": str(span.end_ns),
+                "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in span.attributes.items()],
+                "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+            })
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": TRACE_SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "orvyn"}, "spans": spans}],
+        }]}
+        requests.post(TRACE_OTLP_ENDPOINT, json=payload, timeout=5)
+
+_exporter = _Exporter()
+
+def current_trace_id():
+    parent = _current.get()
+    if parent is None or parent is NOOP_SPAN:
+        return None
+    return f"{parent.trace_id:032x}"
+
+@contextmanager
+def _activate(s):
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.end_ns = time.time_ns()
+        _exporter.submit(s)
+
+@contextmanager
+def start_trace(name, sampled=None, **attributes):
+    if sampled is None:
+        sampled = TRACE_SAMPLE_RATE >= 1.0 or random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        # Mark the context as unsampled so nested spans stay no-ops instead of opening their own traces.
+        token = _current.set(NOOP_SPAN)
+        try:
+            yield NOOP_SPAN
+        finally:
+            _current.reset(token)
+        return
+    with _activate(Span(name, random.getrandbits(128), attributes=attributes)) as s:
+        yield s
+
+@contextmanager
+def span(name, **attributes):
+    parent = _current.get()
+    if parent is None or parent is NOOP_SPAN:
+        yield NOOP_SPAN
+        return
+    with _activate(Span(name, parent.trace_id, parent.span_id, attributes)) as s:
+        yield s
+
+def traced(name, root=False):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with (start_trace(name) if root else span(name)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def traced_interaction(name):
+    # Opens a trace per Discord interaction; the interaction is found among the callback's arguments.
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            interaction = next((a for a in args if hasattr(a, "response") and hasattr(a, "user")), None)
+            attributes = {"user_id": str(interaction.user.id)} if interaction is not None else {}
+            with start_trace(name, **attributes):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def web3_tracing_middleware(make_request, w3):
+    def middleware(method, params):
+        if _current.get() is None:
+            return make_request(method, params)
+        with span(f"rpc.{method}"):
+            return make_request(method, params)
+    return middleware
+
+def trace_web3(w3):
+    if "tracing" not in w3.middleware_onion:
+        w3.middleware_onion.add(web3_tracing_middleware, "tracing")
+    return w3
@@ -0,0 +1,22 @@
+# web.py
+# Production entry point for the OAuth web tier, run separately from the bot (set WEB_EMBEDDED=false for main.py).
+# Signups are handed to the bot through utils/signup_queue.py, so any number of web workers can run.
+# Usage:
+#   python web.py                                   # waitress, WEB_THREADS threads
+#   gunicorn -w 4 -b 0.0.0.0:5000 web:app           # or any other WSGI server
+import os
+from utils.flask_app import app
+
+WEB_THREADS = int(os.getenv("WEB_THREADS", "8"))
+
+def serve():
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        raise SystemExit("waitress is not installed: pip install waitress, or run `gunicorn web:app`")
+    host = os.getenv("FLASK_HOST", "0.0.0.0")
+    port = int(os.getenv("FLASK_PORT", "5000"))
+    waitress_serve(app, host=host, port=port, threads=WEB_THREADS, ident="orvyn")
+
+if __name__ == "__main__":
+    serve()